@@ -0,0 +1,97 @@
+"""
+Full-text search benchmark on a large seeded chat_messages table.
+
+Seeds a SQLite database (FTS5 index kept in sync by triggers) and compares
+search_chat_messages against an unindexed LIKE scan of the same user's rows.
+
+Run from the repo root with: python -m benchmarks.chat_search --rows 500000
+"""
+import argparse
+import itertools
+import os
+import random
+import statistics
+import tempfile
+import time
+
+TOPIC_WORDS = (
+    "exam study class homework friend family work sleep tired happy sad stress "
+    "anxious weekend project deadline coffee music game movie dinner walk run "
+    "gym teacher grade test paper essay lab roommate party trip holiday rain math"
+).split()
+
+QUERIES = ["exam", "math exam", "roommate party", "deadline stress", "holiday trip"]
+
+def make_vocabulary(rng, size=20000):
+    """Filler words plus topic words, drawn with a Zipf-like skew"""
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    filler = ["".join(rng.choices(letters, k=rng.randint(3, 9))) for _ in range(size)]
+    words = filler + TOPIC_WORDS
+    rng.shuffle(words)
+    cum_weights = list(itertools.accumulate(1.0 / (rank + 1) for rank in range(len(words))))
+    return words, cum_weights
+
+def seed(db, rows, users):
+    from sqlalchemy import text
+
+    rng = random.Random(42)
+    words, cum_weights = make_vocabulary(rng)
+    batch = []
+    insert = text(
+        "INSERT INTO chat_messages (user_id, message, response, sentiment, timestamp) "
+        "VALUES (:user_id, :message, :response, 'neutral', CURRENT_TIMESTAMP)"
+    )
+    for i in range(rows):
+        batch.append({
+            "user_id": i % users,
+            "message": " ".join(rng.choices(words, cum_weights=cum_weights, k=12)),
+            "response": " ".join(rng.choices(words, cum_weights=cum_weights, k=30)),
+        })
+        if len(batch) == 10000:
+            db.execute(insert, batch)
+            batch.clear()
+    if batch:
+        db.execute(insert, batch)
+    db.commit()
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=500000)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        from sqlalchemy import text
+        from src.database import SessionLocal, init_db, search_chat_messages
+
+        init_db()
+        db = SessionLocal()
+        start = time.perf_counter()
+        seed(db, args.rows, args.users)
+        print(f"Seeded {args.rows} rows for {args.users} users in {time.perf_counter() - start:.1f}s")
+
+        like = text(
+            "SELECT id FROM chat_messages WHERE user_id = :user_id "
+            "AND (message LIKE :q OR response LIKE :q) ORDER BY id DESC LIMIT 20"
+        )
+        print(f"{'query':<18} {'fts ms':>8} {'like ms':>8}")
+        for query in QUERIES:
+            fts_ms = timed(lambda: search_chat_messages(db, 7, query, limit=20), args.repeat)
+            like_ms = timed(
+                lambda: db.execute(like, {"user_id": 7, "q": f"%{query}%"}).all(), args.repeat
+            )
+            print(f"{query:<18} {fts_ms:8.2f} {like_ms:8.2f}")
+        db.close()
+
+if __name__ == "__main__":
+    main()
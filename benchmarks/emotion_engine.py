@@ -0,0 +1,187 @@
+"""
+Speed and agreement report: NumPy emotion lexicon engine vs VADER.
+
+Uses two built-in sets of student-style messages, or --corpus pointing at
+a plain-text file (one message per line) or an NDJSON export from
+/chat/export (the "message" field is used). SAMPLE_MESSAGES share
+vocabulary with EMOTION_TAGS; HELD_OUT_MESSAGES were written without
+looking at either lexicon. Agreement on an export of real conversations
+is the figure to trust before switching SENTIMENT_ENGINE.
+
+Run from the repo root with: python -m benchmarks.emotion_engine [--corpus FILE]
+"""
+import argparse
+import json
+import time
+from collections import Counter
+
+import numpy as np
+from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+
+from src.emotion import EmotionLexiconAnalyzer
+
+SAMPLE_MESSAGES = [
+    "I'm so happy, I finally passed my calculus exam!",
+    "I am really anxious about my presentation tomorrow",
+    "My roommate keeps stealing my food and I'm furious",
+    "I feel lonely since my friends went home for the break",
+    "What time does the library close on Sundays?",
+    "I'm not sure what to do about my major",
+    "Thanks so much, that was really helpful",
+    "I failed my midterm and I feel like a failure",
+    "I can't sleep because I keep worrying about grades",
+    "The weather is nice today",
+    "I'm exhausted and overwhelmed with assignments",
+    "My professor was unfair and I'm frustrated",
+    "I got the internship!!! I'm so excited",
+    "Nothing feels good anymore, I'm empty",
+    "Can you help me plan a study schedule?",
+    "I'm not happy with how the group project is going",
+    "I love my new dorm, everyone is so kind",
+    "I'm scared I won't find a job after graduation",
+    "That movie was disgusting, I hated it",
+    "Wow, I did not expect to get an A",
+    "I miss my family a lot",
+    "I'm stressed but hopeful things will get better",
+    "My friend lied to me and I feel hurt and angry",
+    "Today was boring, nothing happened",
+    "I'm proud of myself for going to the gym every day",
+    "I don't hate it, it's just not for me",
+    "I had a terrible day and everything went wrong",
+    "I'm grateful for my supportive friends",
+    "How do I reset my password?",
+    "I feel hopeless about my future",
+    "I'm nervous but ready for my interview",
+    "Honestly this semester has been amazing",
+    "I keep crying and I don't know why",
+    "I'm annoyed that the bus was late again",
+    "I'm confused about the assignment instructions",
+    "I feel safe talking to you",
+    "I'm worried my parents will be disappointed",
+    "I won the scholarship, I can't believe it",
+    "I'm tired of feeling this way",
+    "It's fine, just another day",
+]
+
+HELD_OUT_MESSAGES = [
+    "I'm devastated, my grandma passed away last night",
+    "I got into a car accident and I'm really upset",
+    'This whole week has been a disaster',
+    "My back is in agony and I can't focus on anything",
+    'Everything sucks right now',
+    'I feel like a burden to everyone around me',
+    'My girlfriend dumped me over text',
+    "I bombed the interview, I'm such an idiot",
+    'I finally finished my thesis, what a relief',
+    'The professor praised my essay in front of the class',
+    "I'm dreading going back home for the holidays",
+    'My roommate stole my laptop charger again',
+    "I'm not sure anyone would notice if I disappeared",
+    "I can't stop shaking after that phone call",
+    'Got a free coffee this morning, small win',
+    'My parents keep fighting and I hate being home',
+    'I was robbed on the way back from campus',
+    "I'm thrilled my sister is visiting this weekend",
+    'The dining hall food made me ill',
+    'I feel numb, like nothing matters',
+    'I aced my chemistry final',
+    'The rejection email crushed me',
+    'Nobody showed up to my birthday dinner',
+    'My lab partner is so rude and lazy',
+    "I'm kind of nervous about moving out",
+    'This class is a nightmare',
+    'I adore my new cat, she is adorable',
+    "I'm homesick and miserable here",
+    'I keep procrastinating and hating myself for it',
+    'Our team won the debate tournament',
+    "The exam was unfair and I'm livid",
+    "I'm so lonely I talk to my plants",
+    "It's raining and my umbrella broke, ugh",
+    'My therapist helped me a lot today',
+    'I feel trapped in this major',
+    'I was bullied again in the locker room',
+    "I'm content with how things are going",
+    'The hospital called about my dad',
+    "I think I'm getting sick, my throat is sore",
+    'I just want to sleep forever',
+]
+
+def load_corpus(path):
+    messages = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("{"):
+                line = json.loads(line).get("message") or ""
+            messages.append(line)
+    return messages
+
+def vader_label(compound):
+    if compound >= 0.05:
+        return "positive"
+    if compound <= -0.05:
+        return "negative"
+    return "neutral"
+
+def report_agreement(name, messages, vader, emotion):
+    vader_scores = [vader.polarity_scores(m)["compound"] for m in messages]
+    emotion_results = emotion.analyze_batch(messages)
+    emotion_scores = [r["score"] for r in emotion_results]
+    pairs = Counter((vader_label(v), r["sentiment"]) for v, r in zip(vader_scores, emotion_results))
+    agree = sum(count for (a, b), count in pairs.items() if a == b)
+    correlation = np.corrcoef(vader_scores, emotion_scores)[0, 1] if len(messages) > 1 else float("nan")
+
+    print(f"Agreement on {len(messages)} messages ({name})")
+    print(f"  label agreement: {agree / len(messages):.1%}")
+    print(f"  compound score correlation (Pearson): {correlation:.3f}")
+    print("  confusion (rows = VADER, columns = emotion engine):")
+    labels = ["positive", "neutral", "negative"]
+    print(" " * 14 + "".join(f"{label:>10}" for label in labels))
+    for a in labels:
+        print(f"    {a:<10}" + "".join(f"{pairs[(a, b)]:>10}" for b in labels))
+    dominant = Counter(r["dominant_emotion"] or "none" for r in emotion_results)
+    print("  dominant emotions: " + ", ".join(f"{k}={v}" for k, v in dominant.most_common()) + "\n")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--corpus", help="text or NDJSON file of messages")
+    parser.add_argument("--repeat", type=int, default=500, help="times the corpus is replicated for timing")
+    args = parser.parse_args()
+
+    if args.corpus:
+        sets = {"corpus": load_corpus(args.corpus)}
+    else:
+        sets = {"built-in sample": SAMPLE_MESSAGES, "held-out": HELD_OUT_MESSAGES}
+    vader = SentimentIntensityAnalyzer()
+    emotion = EmotionLexiconAnalyzer()
+
+    # ---- agreement ----
+    for name, messages in sets.items():
+        report_agreement(name, messages, vader, emotion)
+
+    # ---- speed ----
+    corpus = [m for messages in sets.values() for m in messages] * args.repeat
+    start = time.perf_counter()
+    for m in corpus:
+        vader.polarity_scores(m)
+    vader_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for m in corpus:
+        emotion.analyze(m)
+    single_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(0, len(corpus), 1024):
+        emotion.analyze_batch(corpus[i:i + 1024])
+    batch_s = time.perf_counter() - start
+
+    print(f"\nThroughput on {len(corpus)} messages")
+    print(f"  VADER polarity_scores:      {len(corpus) / vader_s:10.0f} msg/s  ({vader_s * 1e6 / len(corpus):6.1f} us/msg)")
+    print(f"  emotion engine (one by one): {len(corpus) / single_s:9.0f} msg/s  ({single_s * 1e6 / len(corpus):6.1f} us/msg)")
+    print(f"  emotion engine (batch 1024): {len(corpus) / batch_s:9.0f} msg/s  ({batch_s * 1e6 / len(corpus):6.1f} us/msg)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Latency and memory of /chat/history serialization, before and after the lean path.
+
+"before" replays the original endpoint: ORM objects -> dicts with isoformat()
+-> ChatHistoryResponse validation -> standard JSON response. "after" is the
+current endpoint: column tuples -> dicts -> FastJSONResponse (orjson when
+installed). Both are served through the same FastAPI test client so HTTP
+overhead is identical; results are reported per 1,000 rows.
+
+Run from the repo root with: python -m benchmarks.history_serialization
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+_tmp = tempfile.mkdtemp(prefix="history-bench-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp, 'history.db')}"
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark")  # no model is called
+
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from src.database import SessionLocal, ChatMessage, User, get_db, get_user_chat_history, init_db
+from src.fastjson import FastJSONResponse, orjson
+from src.server import ChatHistoryResponse, _history_page
+
+WORDS = ("exam stress sleep friends class project deadline happy tired worried grade library "
+         "roommate family weekend anxious excited lonely professor internship campus").split()
+
+bench_app = FastAPI()
+
+@bench_app.get("/before/{user_id}", response_model=ChatHistoryResponse)
+def history_before(user_id: int, limit: int = 100, db: Session = Depends(get_db)):
+    messages = get_user_chat_history(db, user_id, limit)
+    formatted_messages = [
+        {
+            "id": msg.id,
+            "message": msg.message,
+            "response": msg.response,
+            "sentiment": msg.sentiment,
+            "severity": msg.severity,
+            "tier": msg.tier,
+            "timestamp": msg.timestamp.isoformat() if msg.timestamp else None
+        }
+        for msg in messages
+    ]
+    return ChatHistoryResponse(messages=formatted_messages)
+
+@bench_app.get("/after/{user_id}", response_model=ChatHistoryResponse)
+def history_after(user_id: int, limit: int = 100, db: Session = Depends(get_db)):
+    return FastJSONResponse({"messages": _history_page(db, user_id, limit)})
+
+def seed(rows: int):
+    rng = random.Random(7)
+    now = datetime.utcnow()
+    with SessionLocal() as db:
+        db.execute(insert(User), [{"username": "bench", "email": "bench@example.com", "hashed_password": "x"}])
+        batch = []
+        for i in range(rows):
+            batch.append({
+                "user_id": 1,
+                "message": " ".join(rng.choices(WORDS, k=rng.randint(8, 40))),
+                "response": " ".join(rng.choices(WORDS, k=rng.randint(60, 140))),
+                "sentiment": rng.choice(["positive", "negative", "neutral"]),
+                "severity": rng.choice(["normal", "moderate", "severe"]),
+                "tier": rng.choice(["positive", "negative", "neutral"]),
+                "timestamp": now - timedelta(minutes=rows - i),
+            })
+            if len(batch) == 5000:
+                db.execute(insert(ChatMessage), batch)
+                batch.clear()
+        if batch:
+            db.execute(insert(ChatMessage), batch)
+        db.commit()
+
+def measure(client: TestClient, path: str, limit: int, repeat: int):
+    """Median latency (ms) and peak traced allocation (bytes) for one request size"""
+    url = f"{path}/1?limit={limit}"
+    body = client.get(url).content  # warm caches
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        client.get(url)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    tracemalloc.start()
+    client.get(url)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(timings), peak, len(body)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=20000, help="messages seeded for the user")
+    parser.add_argument("--limits", default="100,1000,5000,20000", help="comma-separated page sizes")
+    parser.add_argument("--repeat", type=int, default=7)
+    args = parser.parse_args()
+
+    init_db()
+    seed(args.rows)
+    client = TestClient(bench_app)
+    print(f"Encoder for the lean path: {'orjson' if orjson else 'json (orjson not installed)'}")
+    print(f"{'limit':>7} {'path':>7} {'median ms':>10} {'ms/1k rows':>11} {'peak MB':>8} {'MB/1k rows':>11} {'body MB':>8}")
+
+    for limit in (int(x) for x in args.limits.split(",")):
+        results = {}
+        for name in ("before", "after"):
+            ms, peak, size = measure(client, f"/{name}", limit, args.repeat)
+            rows = min(limit, args.rows)
+            results[name] = ms
+            print(f"{limit:>7} {name:>7} {ms:>10.1f} {ms * 1000 / rows:>11.2f} "
+                  f"{peak / 1e6:>8.1f} {peak / 1e6 * 1000 / rows:>11.2f} {size / 1e6:>8.2f}")
+        print(f"{'':>7} speedup {results['before'] / results['after']:>9.1f}x")
+
+if __name__ == "__main__":
+    main()
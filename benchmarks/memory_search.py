@@ -0,0 +1,72 @@
+"""
+Long-term memory retrieval latency at large per-user index sizes.
+
+Builds a user's vector index from synthetic messages (in bulk, then a run
+of single-message appends as /chat does), and times MemoryIndex.search,
+embedding of the query included, with a warm page cache. Index size counts
+the row-major, column-major and id files.
+
+Run from the repo root with: python -m benchmarks.memory_search [--rows 100000] [--dims 128,256]
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark")  # no model is called
+
+from src.memory import HashingEmbedder, MemoryIndex
+
+from .chat_search import QUERIES, make_vocabulary
+
+def make_messages(rows: int):
+    rng = random.Random(11)
+    words, cum_weights = make_vocabulary(rng)
+    return [" ".join(rng.choices(words, cum_weights=cum_weights, k=rng.randint(6, 30))) for _ in range(rows)]
+
+def run_dim(dim: int, messages: list, appends: int, repeat: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        index = MemoryIndex(tmp, HashingEmbedder(dim))
+        start = time.perf_counter()
+        for offset in range(0, len(messages), 5000):
+            chunk = messages[offset:offset + 5000]
+            index.add(1, list(range(offset, offset + len(chunk))), chunk)
+        build_s = time.perf_counter() - start
+
+        append_ms = []
+        for i in range(appends):
+            start = time.perf_counter()
+            index.add(1, [len(messages) + i], [messages[i]])
+            append_ms.append((time.perf_counter() - start) * 1000)
+
+        index.search(1, QUERIES[0])  # warm the page cache
+        search_ms = []
+        for _ in range(repeat):
+            for query in QUERIES:
+                start = time.perf_counter()
+                index.search(1, query, k=5, skip_recent=10)
+                search_ms.append((time.perf_counter() - start) * 1000)
+        search_ms.sort()
+        size_mb = sum(os.path.getsize(path) for path in index._paths(1)) / 1e6
+        return build_s, statistics.median(append_ms), statistics.median(search_ms), \
+            search_ms[int(len(search_ms) * 0.95)], size_mb
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000, help="messages in the user's index")
+    parser.add_argument("--dims", default="128,256", help="comma-separated hashed embedding sizes")
+    parser.add_argument("--appends", type=int, default=200, help="single-message appends timed")
+    parser.add_argument("--repeat", type=int, default=40)
+    args = parser.parse_args()
+
+    messages = make_messages(args.rows)
+    print(f"{args.rows} messages for one user")
+    print(f"{'dim':>5} {'index MB':>9} {'build s':>8} {'append ms':>10} {'search p50 ms':>14} {'search p95 ms':>14}")
+    for dim in (int(x) for x in args.dims.split(",")):
+        build_s, append_ms, p50, p95, size_mb = run_dim(dim, messages, args.appends, args.repeat)
+        print(f"{dim:>5} {size_mb:>9.1f} {build_s:>8.1f} {append_ms:>10.2f} {p50:>14.2f} {p95:>14.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Chat-message write throughput versus the number of chat shards.
+
+Spawns several worker processes (standing in for uvicorn workers), each with
+a few threads saving messages for random users through save_chat_message,
+with CHAT_SHARD_URLS pointing at 1, 2, 4, ... SQLite files. Each shard has
+its own write lock, so throughput grows with the shard count until the disk
+or CPU becomes the limit.
+
+Run from the repo root with: python -m benchmarks.shard_writes [--shards 1,2,4,8]
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+import threading
+import time
+
+def _env(tmp, shards):
+    urls = [f"sqlite:///{os.path.join(tmp, f'chat{i}.db')}" for i in range(shards)]
+    return {
+        "DATABASE_URL": f"sqlite:///{os.path.join(tmp, 'primary.db')}",
+        "CHAT_SHARD_URLS": ",".join(urls),
+    }
+
+def _init(env):
+    os.environ.update(env)
+    from src.database import init_db
+    init_db()
+
+def _worker(env, threads, messages, users, ready, go, results):
+    """Save messages for random users from several threads inside one process"""
+    os.environ.update(env)
+    from src.database import SessionLocal, save_chat_message, shutdown_db
+
+    # Imports and engine setup are not part of the measurement
+    ready.release()
+    go.wait()
+
+    errors = 0
+    lock = threading.Lock()
+
+    def run(seed):
+        nonlocal errors
+        rng = random.Random(seed)
+        db = SessionLocal()
+        try:
+            for i in range(messages):
+                try:
+                    save_chat_message(
+                        db,
+                        user_id=rng.randint(1, users),
+                        message=f"benchmark message {i} " * 8,
+                        response=f"benchmark response {i} " * 16,
+                        sentiment="neutral",
+                        severity="normal",
+                        score=0.0,
+                        tier="neutral"
+                    )
+                except Exception as e:
+                    if "locked" not in str(e):
+                        raise
+                    with lock:
+                        errors += 1
+        finally:
+            db.close()
+
+    pool = [threading.Thread(target=run, args=(os.getpid() * 100 + n,)) for n in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    shutdown_db()
+    results.put(errors)
+
+def run_config(shards, workers, threads, messages, users):
+    with tempfile.TemporaryDirectory() as tmp:
+        env = _env(tmp, shards)
+        ctx = multiprocessing.get_context("spawn")
+        setup = ctx.Process(target=_init, args=(env,))
+        setup.start()
+        setup.join()
+
+        results, ready, go = ctx.Queue(), ctx.Semaphore(0), ctx.Event()
+        procs = [
+            ctx.Process(target=_worker, args=(env, threads, messages, users, ready, go, results))
+            for _ in range(workers)
+        ]
+        for p in procs:
+            p.start()
+        for _ in procs:
+            ready.acquire()
+
+        start = time.perf_counter()
+        go.set()
+        errors = sum(results.get() for _ in procs)
+        elapsed = time.perf_counter() - start
+        for p in procs:
+            p.join()
+
+        total = workers * threads * messages - errors
+        return total, elapsed, errors
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--shards", default="1,2,4,8", help="comma-separated shard counts to compare")
+    parser.add_argument("--workers", type=int, default=8, help="worker processes")
+    parser.add_argument("--threads", type=int, default=2, help="threads per worker")
+    parser.add_argument("--messages", type=int, default=300, help="messages per thread")
+    parser.add_argument("--users", type=int, default=1000, help="distinct user ids written to")
+    args = parser.parse_args()
+
+    print(f"{args.workers} workers x {args.threads} threads x {args.messages} messages, {args.users} users")
+    baseline = None
+    for shards in (int(x) for x in args.shards.split(",")):
+        total, elapsed, errors = run_config(shards, args.workers, args.threads, args.messages, args.users)
+        rate = total / elapsed
+        baseline = baseline or rate
+        print(f"{shards:>3} shard(s)  {total:>7} rows  {elapsed:7.2f}s  {rate:9.0f} rows/s  "
+              f"{rate / baseline:5.2f}x  {errors:>5} locked")
+
+if __name__ == "__main__":
+    main()
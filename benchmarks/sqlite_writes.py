@@ -0,0 +1,110 @@
+"""
+Concurrent chat-message write benchmark for the SQLite profile.
+
+Spawns several worker processes (standing in for uvicorn workers), each with
+a few threads saving chat messages through save_chat_message, and reports
+throughput and "database is locked" failures for each configuration.
+
+Run from the repo root with: python -m benchmarks.sqlite_writes
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+
+CONFIGS = {
+    "rollback-journal": {"SQLITE_PRAGMAS": "0", "SQLITE_WRITE_QUEUE": "0"},
+    "wal-profile": {"SQLITE_PRAGMAS": "1", "SQLITE_WRITE_QUEUE": "0"},
+    "wal-profile+write-queue": {"SQLITE_PRAGMAS": "1", "SQLITE_WRITE_QUEUE": "1"},
+}
+
+def _init(db_url, env):
+    os.environ.update(env)
+    os.environ["DATABASE_URL"] = db_url
+    from src.database import init_db
+    init_db()
+
+def _worker(db_url, env, threads, messages, results):
+    """Save messages from several threads inside one process"""
+    os.environ.update(env)
+    os.environ["DATABASE_URL"] = db_url
+    from src.database import SessionLocal, save_chat_message, shutdown_db
+
+    errors = 0
+    lock = threading.Lock()
+
+    def run(thread_no):
+        nonlocal errors
+        db = SessionLocal()
+        try:
+            for i in range(messages):
+                try:
+                    save_chat_message(
+                        db,
+                        user_id=thread_no,
+                        message=f"benchmark message {i} " * 8,
+                        response=f"benchmark response {i} " * 16,
+                        sentiment="neutral"
+                    )
+                except Exception as e:
+                    db.rollback()
+                    if "locked" not in str(e):
+                        raise
+                    with lock:
+                        errors += 1
+        finally:
+            db.close()
+
+    pool = [threading.Thread(target=run, args=(n,)) for n in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    shutdown_db()
+    results.put(errors)
+
+def run_config(name, env, workers, threads, messages):
+    with tempfile.TemporaryDirectory() as tmp:
+        db_url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        os.environ.update(env)
+        os.environ["DATABASE_URL"] = db_url
+
+        ctx = multiprocessing.get_context("spawn")
+        setup = ctx.Process(target=_init, args=(db_url, env))
+        setup.start()
+        setup.join()
+
+        results = ctx.Queue()
+        procs = [
+            ctx.Process(target=_worker, args=(db_url, env, threads, messages, results))
+            for _ in range(workers)
+        ]
+        start = time.perf_counter()
+        for p in procs:
+            p.start()
+        for p in procs:
+            p.join()
+        elapsed = time.perf_counter() - start
+
+        errors = sum(results.get() for _ in procs)
+        total = workers * threads * messages
+        print(
+            f"{name:<26} {total - errors:>7} rows  {elapsed:7.2f}s  "
+            f"{(total - errors) / elapsed:9.0f} rows/s  {errors:>5} locked"
+        )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4, help="worker processes")
+    parser.add_argument("--threads", type=int, default=4, help="threads per worker")
+    parser.add_argument("--messages", type=int, default=250, help="messages per thread")
+    args = parser.parse_args()
+
+    print(f"{args.workers} workers x {args.threads} threads x {args.messages} messages")
+    for name, env in CONFIGS.items():
+        run_config(name, env, args.workers, args.threads, args.messages)
+
+if __name__ == "__main__":
+    main()
@@ -10,6 +10,9 @@ console.log('App.js loaded - Starting initialization...');
 
 (() => {
     const CONVO_KEY = "chatui_convos_v2";
+    const HISTORY_SYNC_KEY = "chatui_history_sync_v1"; // { userId, latestId, etag, epoch } of the last delta sync
+    const HISTORY_CONVO_ID = "db-history";
+    const HISTORY_PAGE_SIZE = 200;
     const MAX_CONVOS = 50;
     const SUBMIT_THROTTLE_MS = 120;
     const now = () => Date.now();
@@ -70,64 +73,6 @@ console.log('App.js loaded - Starting initialization...');
         return true;
     }
 
-    // ---------- Load Chat History from Database ----------
-    async function loadChatHistoryFromDB() {
-        const userId = localStorage.getItem('user_id');
-        if (!userId) return;
-
-        try {
-            const response = await fetch(`${API_BASE}/chat/history/${userId}?limit=50`, {
-                method: 'GET',
-                headers: {
-                    'Content-Type': 'application/json'
-                }
-            });
-
-            if (!response.ok) {
-                console.warn('Could not load chat history from database');
-                return;
-            }
-
-            const data = await response.json();
-            console.log(`📚 Loaded ${data.messages.length} messages from database`);
-
-            // Convert database messages to conversations
-            // Group messages into a single conversation for now
-            if (data.messages.length > 0) {
-                const existingConvo = convos.find(c => c.title === "Previous Chats");
-                
-                if (!existingConvo) {
-                    // Create a conversation from database history
-                    const dbConvo = {
-                        id: "db-history",
-                        title: "Previous Chats",
-                        createdAt: new Date(data.messages[data.messages.length - 1].timestamp).getTime(),
-                        updatedAt: new Date(data.messages[0].timestamp).getTime(),
-                        messages: []
-                    };
-
-                    // Add messages in chronological order (oldest first)
-                    data.messages.reverse().forEach(msg => {
-                        dbConvo.messages.push({
-                            role: "user",
-                            text: msg.message
-                        });
-                        dbConvo.messages.push({
-                            role: "assistant",
-                            text: msg.response
-                        });
-                    });
-
-                    convos.unshift(dbConvo); // Add to beginning
-                    saveConvos();
-                    console.log('Created conversation from database history');
-                }
-            }
-        } catch (error) {
-            console.error('Error loading chat history:', error);
-        }
-    }
-
     // ---------- Logout Function ----------
     function logout() {
         localStorage.removeItem('access_token');
@@ -236,8 +181,8 @@ console.log('App.js loaded - Starting initialization...');
         let activeId = null;
         let lastSubmitAt = 0;
 
-        // Load chat history from database
-        loadChatHistoryFromDB().then(() => {
+        // Sync chat history from the database (only messages we don't have yet)
+        syncChatHistoryFromDB().then(() => {
             console.log('Chat history loaded from database');
             if (convos.length === 0) {
                 createConversation();
@@ -351,6 +296,87 @@ console.log('App.js loaded - Starting initialization...');
             }
         }
 
+        // ---------- history delta sync ----------
+        function loadSyncState(userId) {
+            const state = safeParse(localStorage.getItem(HISTORY_SYNC_KEY), null);
+            const historyConvo = findConvo(HISTORY_CONVO_ID);
+            // Start over if another account synced last or the local copy was deleted/trimmed
+            if (!state || state.userId !== userId || !historyConvo) {
+                return { userId, latestId: null, etag: null, epoch: null };
+            }
+            return state;
+        }
+
+        function mergeHistoryMessages(messages) {
+            let historyConvo = findConvo(HISTORY_CONVO_ID);
+            if (!historyConvo) {
+                historyConvo = {
+                    id: HISTORY_CONVO_ID,
+                    title: "Previous Chats",
+                    createdAt: new Date(messages[0].timestamp).getTime(),
+                    updatedAt: now(),
+                    messages: []
+                };
+                convos.unshift(historyConvo);
+            }
+
+            const seen = new Set(historyConvo.messages.map(m => m.dbId).filter(Boolean));
+            messages.forEach(msg => {
+                if (seen.has(msg.id)) return;
+                historyConvo.messages.push({ role: "user", text: msg.message, dbId: msg.id });
+                historyConvo.messages.push({ role: "assistant", text: msg.response });
+            });
+            historyConvo.updatedAt = new Date(messages[messages.length - 1].timestamp).getTime();
+        }
+
+        async function syncChatHistoryFromDB() {
+            const userId = localStorage.getItem('user_id');
+            if (!userId) return;
+
+            const state = loadSyncState(userId);
+            let received = 0;
+            try {
+                for (;;) {
+                    const params = new URLSearchParams({ limit: HISTORY_PAGE_SIZE });
+                    if (state.latestId !== null) params.set("after_id", state.latestId);
+                    const headers = {};
+                    if (state.etag && state.latestId !== null) headers['If-None-Match'] = state.etag;
+
+                    const response = await fetch(`${API_BASE}/chat/history/${userId}/delta?${params}`, { headers });
+                    if (response.status === 304) break; // nothing new since the last sync
+                    if (!response.ok) {
+                        console.warn('Could not sync chat history from database');
+                        return;
+                    }
+
+                    const data = await response.json();
+                    if (state.latestId !== null && data.epoch !== state.epoch) {
+                        // Message ids were reassigned (storage resharded): reseed from scratch
+                        const historyConvo = findConvo(HISTORY_CONVO_ID);
+                        if (historyConvo) historyConvo.messages = [];
+                        Object.assign(state, { latestId: null, etag: null, epoch: data.epoch });
+                        continue;
+                    }
+                    state.epoch = data.epoch;
+                    if (data.messages.length > 0) {
+                        mergeHistoryMessages(data.messages);
+                        received += data.messages.length;
+                        state.latestId = data.messages[data.messages.length - 1].id;
+                    } else if (data.latest_id !== null) {
+                        state.latestId = data.latest_id;
+                    }
+                    state.etag = data.has_more ? null : response.headers.get('ETag');
+                    if (!data.has_more) break;
+                }
+
+                if (received > 0) saveConvos();
+                localStorage.setItem(HISTORY_SYNC_KEY, JSON.stringify(state));
+                console.log(`📚 Synced ${received} new messages from database`);
+            } catch (error) {
+                console.error('Error syncing chat history:', error);
+            }
+        }
+
         function findConvo(id) {
             return convos.find(c => c.id === id);
         }
@@ -589,7 +615,21 @@ console.log('App.js loaded - Starting initialization...');
         }
 
         // ---------- API call with JWT ----------
-        async function sendToBackend(userText) {
+        // Retries reuse the message's Idempotency-Key, so the server answers a
+        // repeat with the original reply instead of a second LLM call
+        const CHAT_MAX_ATTEMPTS = 3;
+        const RETRYABLE_STATUSES = [409, 502, 503, 504];
+        let failedSend = null; // { text, key } of the last message that didn't get a reply
+
+        const sleep = (ms) => new Promise(resolve => setTimeout(resolve, ms));
+
+        function retryDelayMs(res, attempt) {
+            const retryAfter = res ? parseInt(res.headers.get("Retry-After"), 10) : NaN;
+            if (!isNaN(retryAfter)) return Math.min(retryAfter, 10) * 1000;
+            return 1000 * attempt;
+        }
+
+        async function sendToBackend(userText, idempotencyKey) {
             const userId = localStorage.getItem('user_id');
             
             if (!userId) {
@@ -603,17 +643,30 @@ console.log('App.js loaded - Starting initialization...');
                 content: m.text
             })) : [];
 
-            const res = await fetch(CHAT_URL, {
-                method: "POST",
-                headers: { 
-                    "Content-Type": "application/json"
-                },
-                body: JSON.stringify({ 
-                    message: userText,
-                    user_id: parseInt(userId),
-                    chat_history: chatHistory
-                }),
-            });
+            let res;
+            for (let attempt = 1; ; attempt++) {
+                try {
+                    res = await fetch(CHAT_URL, {
+                        method: "POST",
+                        headers: { 
+                            "Content-Type": "application/json",
+                            "Idempotency-Key": idempotencyKey
+                        },
+                        body: JSON.stringify({ 
+                            message: userText,
+                            user_id: parseInt(userId),
+                            chat_history: chatHistory
+                        }),
+                    });
+                } catch (err) {
+                    // Network error or dropped connection: the server may still be working on it
+                    if (attempt >= CHAT_MAX_ATTEMPTS) throw err;
+                    await sleep(retryDelayMs(null, attempt));
+                    continue;
+                }
+                if (!RETRYABLE_STATUSES.includes(res.status) || attempt >= CHAT_MAX_ATTEMPTS) break;
+                await sleep(retryDelayMs(res, attempt));
+            }
 
             if (res.status === 401 || res.status === 403) {
                 logout();
@@ -656,8 +709,13 @@ console.log('App.js loaded - Starting initialization...');
 
             const placeholder = addMessage("", "bot", true);
 
+            // Re-sending a message that just failed counts as a retry of it
+            const key = failedSend && failedSend.text === text ? failedSend.key : uuid();
+            failedSend = { text, key };
+
             try {
-                const reply = await sendToBackend(text);
+                const reply = await sendToBackend(text, key);
+                failedSend = null;
                 appendMessage("assistant", reply);
                 setBotStage("writing");
                 streamBotReplyInto(placeholder, reply);
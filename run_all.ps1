@@ -21,6 +21,10 @@ if (-not (Test-Path $venvPython)) {
 
 Write-Host " Using venv Python at: $venvPython" -ForegroundColor Green
 
+# --- Create missing indexes before the server starts ---
+Write-Host " Applying schema migrations ..." -ForegroundColor Cyan
+& $venvPython -m src.migrate
+
 # --- Start backend (FastAPI + uvicorn) ---
 Write-Host " Starting backend on port $BackendPort ..." -ForegroundColor Cyan
 $backend = Start-Process `
@@ -9,6 +9,9 @@ PORT="8000"
 
 source "$VENV_DIR/bin/activate"
 
+echo "Applying schema migrations..."
+python -m src.migrate
+
 echo "Starting FastAPI server..."
 uvicorn "$APP_MODULE" --host "$HOST" --port "$PORT" > uvicorn.log 2>&1 &
 
@@ -2,11 +2,21 @@
 set -e
 
 PID_FILE="uvicorn_pid.txt"
+# Seconds to wait for in-flight chats to drain (match DRAIN_GRACE_SECONDS, plus a margin)
+STOP_TIMEOUT="${STOP_TIMEOUT:-40}"
 
 if [ -f "$PID_FILE" ]; then
     PID=$(cat "$PID_FILE")
-    echo "Stopping server with PID $PID..."
-    kill "$PID" || echo "Failed to kill PID $PID"
+    echo "Stopping server with PID $PID (waiting up to ${STOP_TIMEOUT}s to drain)..."
+    kill -TERM "$PID" || echo "Failed to kill PID $PID"
+    for _ in $(seq "$STOP_TIMEOUT"); do
+        kill -0 "$PID" 2>/dev/null || break
+        sleep 1
+    done
+    if kill -0 "$PID" 2>/dev/null; then
+        echo "Server did not exit in time — forcing"
+        kill -9 "$PID" || true
+    fi
     rm -f "$PID_FILE"
 else
     echo "No PID file — killing any uvicorn processes"
@@ -0,0 +1,277 @@
+# src/archive.py
+"""
+Hot/cold tiering for chat_messages.
+
+Messages older than a configurable age are packed per user into compressed
+batches (zstd when the zstandard package is installed, zlib otherwise),
+written to chat_message_archive and deleted from the hot table. History
+paging and exports read the archive transparently once they run past the
+hot rows. Archived messages no longer appear in /chat/search results or
+long-term memory recall (they are blanked out of the memory index); the
+mood rollups already hold their aggregates, and rebuild_mood_rollups reads
+the archive batches as well as the hot rows.
+
+Run with: python -m src.archive --older-than-days 180 [--batch-size 500]
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+import zlib
+from datetime import datetime, timedelta
+from typing import Iterator, Optional
+
+from sqlalchemy import select, delete, distinct, func
+from sqlalchemy.orm import Session
+
+from . import memory
+from .database import (
+    SessionLocal,
+    ChatMessage,
+    ChatMessageArchive,
+    CHAT_DATA_VERSION,
+    bump_data_version,
+    shard_engines,
+    shard_sessions,
+    chat_session,
+    init_db,
+    to_naive_utc,
+    get_user_chat_history
+)
+
+try:
+    import zstandard
+except ImportError:  # zlib fallback keeps archiving available without the extra package
+    zstandard = None
+
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "180"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "500"))
+
+ARCHIVE_COLUMNS = [
+    ChatMessage.id,
+    ChatMessage.timestamp,
+    ChatMessage.message,
+    ChatMessage.response,
+    ChatMessage.sentiment,
+    ChatMessage.severity,
+    ChatMessage.sentiment_score,
+    ChatMessage.tier,
+]
+
+# ============ CODECS ============
+
+def compress(data: bytes):
+    """Compress with the best available codec and return (codec, payload)"""
+    if zstandard is not None:
+        return "zstd", zstandard.ZstdCompressor(level=10).compress(data)
+    return "zlib", zlib.compress(data, 9)
+
+def decompress(codec: str, payload: bytes) -> bytes:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd archive batches")
+        return zstandard.ZstdDecompressor().decompress(payload)
+    if codec == "zlib":
+        return zlib.decompress(payload)
+    raise ValueError(f"Unknown archive codec: {codec}")
+
+def decode_batch(batch: ChatMessageArchive) -> list:
+    """Rows of an archive batch, oldest first, as dicts"""
+    return json.loads(decompress(batch.codec, batch.payload))
+
+# ============ READING ============
+
+def read_archived_messages(db: Session, user_id: int, limit: int, before_id: int = None) -> list:
+    """Archived messages newest first, continuing a cursor past the hot rows"""
+    with chat_session(db, user_id) as chat_db:
+        query = chat_db.query(ChatMessageArchive).filter(ChatMessageArchive.user_id == user_id)
+        if before_id is not None:
+            query = query.filter(ChatMessageArchive.first_message_id < before_id)
+
+        messages = []
+        for batch in query.order_by(ChatMessageArchive.last_message_id.desc()).yield_per(4):
+            for row in reversed(decode_batch(batch)):
+                if before_id is not None and row["id"] >= before_id:
+                    continue
+                messages.append(row)
+                if len(messages) >= limit:
+                    return messages
+        return messages
+
+def iter_archived_rows(db: Session, user_id: int, start: Optional[datetime] = None,
+                       end: Optional[datetime] = None, after_id: Optional[int] = None) -> Iterator[dict]:
+    """Archived messages oldest first, one batch in memory at a time"""
+    start, end = to_naive_utc(start), to_naive_utc(end)
+    start_iso = start.isoformat() if start else None
+    end_iso = end.isoformat() if end else None
+
+    with chat_session(db, user_id) as chat_db:
+        query = chat_db.query(ChatMessageArchive).filter(ChatMessageArchive.user_id == user_id)
+        if after_id is not None:
+            query = query.filter(ChatMessageArchive.last_message_id > after_id)
+        if start:
+            query = query.filter(ChatMessageArchive.last_timestamp >= start)
+        if end:
+            query = query.filter(ChatMessageArchive.first_timestamp < end)
+
+        for batch in query.order_by(ChatMessageArchive.first_message_id).yield_per(4):
+            for row in decode_batch(batch):
+                if after_id is not None and row["id"] <= after_id:
+                    continue
+                if start_iso and (row["timestamp"] or "") < start_iso:
+                    continue
+                if end_iso and (row["timestamp"] or "") >= end_iso:
+                    continue
+                yield row
+
+# ============ ARCHIVING ============
+
+def _archive_user(db: Session, user_id: int, cutoff: datetime, batch_size: int) -> dict:
+    """Move one user's old messages into compressed batches"""
+    stats = {"rows": 0, "batches": 0, "raw_bytes": 0, "stored_bytes": 0}
+    while True:
+        rows = db.execute(
+            select(*ARCHIVE_COLUMNS)
+            .where(ChatMessage.user_id == user_id, ChatMessage.timestamp < cutoff)
+            .order_by(ChatMessage.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            return stats
+
+        records = []
+        for row in rows:
+            record = row._asdict()
+            record["timestamp"] = record["timestamp"].isoformat() if record["timestamp"] else None
+            records.append(record)
+        raw = json.dumps(records, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        codec, payload = compress(raw)
+
+        db.add(ChatMessageArchive(
+            user_id=user_id,
+            first_message_id=rows[0].id,
+            last_message_id=rows[-1].id,
+            first_timestamp=rows[0].timestamp,
+            last_timestamp=rows[-1].timestamp,
+            row_count=len(rows),
+            codec=codec,
+            raw_bytes=len(raw),
+            payload=payload
+        ))
+        db.execute(delete(ChatMessage).where(ChatMessage.id.in_([row.id for row in rows])))
+        bump_data_version(db, CHAT_DATA_VERSION)
+        db.commit()
+        # Recall only reads hot rows; stale vectors would take its top-k slots
+        if memory.memory_index is not None:
+            memory.memory_index.remove(user_id, [row.id for row in rows])
+
+        stats["rows"] += len(rows)
+        stats["batches"] += 1
+        stats["raw_bytes"] += len(raw)
+        stats["stored_bytes"] += len(payload)
+
+def archive_messages(session_factory=None, older_than_days: int = ARCHIVE_AFTER_DAYS,
+                     batch_size: int = ARCHIVE_BATCH_SIZE) -> dict:
+    """
+    Archive every message older than the cutoff and return totals.
+    Covers every chat shard unless a single session_factory is given.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    totals = {"users": 0, "rows": 0, "batches": 0, "raw_bytes": 0, "stored_bytes": 0}
+
+    for factory in [session_factory] if session_factory else shard_sessions:
+        db = factory()
+        try:
+            user_ids = db.execute(
+                select(distinct(ChatMessage.user_id)).where(ChatMessage.timestamp < cutoff)
+            ).scalars().all()
+            for user_id in user_ids:
+                stats = _archive_user(db, user_id, cutoff, batch_size)
+                totals["users"] += 1
+                for key, value in stats.items():
+                    totals[key] += value
+        finally:
+            db.close()
+    return totals
+
+# ============ REPORTING ============
+
+def _history_latency_ms(session_factory, user_ids: list, repeat: int = 5) -> float:
+    """Median time to load the first history page for a sample of users"""
+    if not user_ids:
+        return 0.0
+    db = session_factory()
+    try:
+        samples = []
+        for user_id in user_ids:
+            for _ in range(repeat):
+                start = time.perf_counter()
+                get_user_chat_history(db, user_id, 50)
+                samples.append((time.perf_counter() - start) * 1000)
+        return statistics.median(samples)
+    finally:
+        db.close()
+
+def _sample_users(count: int = 20) -> list:
+    """The users with the most hot rows, per shard"""
+    users = []
+    for factory in shard_sessions:
+        db = factory()
+        try:
+            users += db.execute(
+                select(ChatMessage.user_id)
+                .group_by(ChatMessage.user_id)
+                .order_by(func.count(ChatMessage.id).desc())
+                .limit(count)
+            ).scalars().all()
+        finally:
+            db.close()
+    return users
+
+def _hot_row_count() -> int:
+    total = 0
+    for factory in shard_sessions:
+        db = factory()
+        try:
+            total += db.execute(select(func.count(ChatMessage.id))).scalar()
+        finally:
+            db.close()
+    return total
+
+def main():
+    parser = argparse.ArgumentParser(description="Move old chat messages into compressed archive batches")
+    parser.add_argument("--older-than-days", type=int, default=ARCHIVE_AFTER_DAYS)
+    parser.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH_SIZE, help="messages per archive batch")
+    parser.add_argument("--vacuum", action="store_true", help="VACUUM afterwards so SQLite returns the space")
+    args = parser.parse_args()
+
+    init_db()
+    users = _sample_users()
+    hot_before = _hot_row_count()
+    latency_before = _history_latency_ms(SessionLocal, users)
+
+    started = time.perf_counter()
+    totals = archive_messages(older_than_days=args.older_than_days, batch_size=args.batch_size)
+    elapsed = time.perf_counter() - started
+
+    if args.vacuum:
+        for shard_engine in shard_engines:
+            if shard_engine.dialect.name == "sqlite":
+                with shard_engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                    conn.exec_driver_sql("VACUUM")
+
+    hot_after = _hot_row_count()
+    latency_after = _history_latency_ms(SessionLocal, users)
+    saved = totals["raw_bytes"] - totals["stored_bytes"]
+    ratio = totals["raw_bytes"] / totals["stored_bytes"] if totals["stored_bytes"] else 0
+
+    print(f"Archived {totals['rows']} messages for {totals['users']} users "
+          f"into {totals['batches']} batches in {elapsed:.1f}s")
+    print(f"Hot table rows: {hot_before} -> {hot_after}")
+    print(f"Payload bytes: {totals['raw_bytes']} raw -> {totals['stored_bytes']} stored "
+          f"({saved} bytes saved, {ratio:.1f}x)")
+    print(f"History page latency (median): {latency_before:.2f} ms -> {latency_after:.2f} ms")
+
+if __name__ == "__main__":
+    main()
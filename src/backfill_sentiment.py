@@ -0,0 +1,179 @@
+# src/backfill_sentiment.py
+"""
+Recompute the stored routing outcome (sentiment, severity, score, tier) for
+existing chat messages.
+
+Rows are streamed in id order with a server-side cursor, scored in parallel
+across worker processes and written back with bulk UPDATEs. Progress is saved
+to a checkpoint file after every window so an interrupted run resumes where it
+stopped.
+
+Run with: python -m src.backfill_sentiment [--workers 4] [--chunk-size 1000] [--rebuild-rollups]
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from sqlalchemy import select, update, or_, true
+
+from .database import (
+    SessionLocal,
+    ChatMessage,
+    CHAT_DATA_VERSION,
+    shard_sessions,
+    init_db,
+    bump_data_version,
+    rebuild_mood_rollups
+)
+
+DEFAULT_CHECKPOINT = "backfill_sentiment.checkpoint.json"
+
+# ============ CHECKPOINT ============
+
+def load_checkpoint(path: str) -> dict:
+    """Load the last processed id and row count, or start from scratch"""
+    if not os.path.exists(path):
+        return {"last_id": 0, "rows": 0}
+    with open(path) as f:
+        return json.load(f)
+
+def save_checkpoint(path: str, last_id: int, rows: int):
+    """Atomically record progress"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"last_id": last_id, "rows": rows, "updated_at": time.time()}, f)
+    os.replace(tmp_path, path)
+
+def shard_checkpoint(path: str, shard: int) -> str:
+    """Separate checkpoint per chat shard, since message ids are per shard"""
+    if len(shard_sessions) == 1:
+        return path
+    if ".checkpoint" in path:
+        return path.replace(".checkpoint", f".shard{shard}.checkpoint", 1)
+    return f"{path}.shard{shard}"
+
+# ============ SCORING ============
+
+def score_chunk(rows: list) -> list:
+    """Classify (id, message) pairs; runs inside a worker process"""
+    # Imported here so the parent process doesn't need the analyzer loaded
+    from .sentiment_bot import classify_message
+
+    results = []
+    for row_id, message in rows:
+        outcome = classify_message(message or "")
+        results.append({
+            "id": row_id,
+            "sentiment": outcome["sentiment"],
+            "severity": outcome["severity"],
+            "sentiment_score": outcome["score"],
+            "tier": outcome["tier"]
+        })
+    return results
+
+# ============ BACKFILL ============
+
+def _pending_filter(rescore_all: bool):
+    if rescore_all:
+        return true()
+    return or_(
+        ChatMessage.sentiment.is_(None),
+        ChatMessage.sentiment == "auto",
+        ChatMessage.sentiment_score.is_(None)
+    )
+
+def backfill(session_factory=SessionLocal, workers: int = None, chunk_size: int = 1000,
+             checkpoint_path: str = DEFAULT_CHECKPOINT, rescore_all: bool = False) -> int:
+    """Backfill routing outcomes and return the number of rows updated"""
+    workers = workers or os.cpu_count() or 1
+    window = chunk_size * workers * 2
+    state = load_checkpoint(checkpoint_path)
+    last_id, total = state["last_id"], state["rows"]
+    started, done = time.perf_counter(), 0
+
+    print(f"Backfilling sentiment from id > {last_id} with {workers} workers")
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while True:
+            # Read one window with a server-side cursor, chunk_size rows at a time
+            db = session_factory()
+            try:
+                stmt = (
+                    select(ChatMessage.id, ChatMessage.message)
+                    .where(ChatMessage.id > last_id, _pending_filter(rescore_all))
+                    .order_by(ChatMessage.id)
+                    .limit(window)
+                )
+                result = db.execute(
+                    stmt, execution_options={"stream_results": True, "yield_per": chunk_size}
+                )
+                futures = []
+                for partition in result.partitions():
+                    chunk = [tuple(row) for row in partition]
+                    last_id = chunk[-1][0]
+                    futures.append(pool.submit(score_chunk, chunk))
+            finally:
+                db.close()
+
+            if not futures:
+                break
+
+            db = session_factory()
+            try:
+                for future in futures:
+                    scored = future.result()
+                    db.execute(update(ChatMessage), scored)
+                    done += len(scored)
+                # Cached history pages carry the old sentiment; change their ETag
+                bump_data_version(db, CHAT_DATA_VERSION)
+                db.commit()
+            finally:
+                db.close()
+
+            total = state["rows"] + done
+            save_checkpoint(checkpoint_path, last_id, total)
+
+            elapsed = time.perf_counter() - started
+            print(f"  {total} rows (last id {last_id}), {done / elapsed:.0f} rows/s")
+
+    elapsed = time.perf_counter() - started
+    print(f"Backfill complete: {done} rows in {elapsed:.1f}s ({done / max(elapsed, 1e-9):.0f} rows/s)")
+    return done
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute stored sentiment for chat messages")
+    parser.add_argument("--workers", type=int, default=None, help="scoring processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="rows per cursor fetch and per worker task")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT, help="checkpoint file used to resume")
+    parser.add_argument("--all", action="store_true", help="rescore every row, not only unscored ones")
+    parser.add_argument("--restart", action="store_true", help="ignore an existing checkpoint")
+    parser.add_argument("--rebuild-rollups", action="store_true", help="recompute daily mood rollups afterwards")
+    args = parser.parse_args()
+
+    init_db()
+    for shard, session_factory in enumerate(shard_sessions):
+        checkpoint = shard_checkpoint(args.checkpoint, shard)
+        if args.restart and os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        if len(shard_sessions) > 1:
+            print(f"Shard {shard + 1}/{len(shard_sessions)}")
+        backfill(
+            session_factory,
+            workers=args.workers,
+            chunk_size=args.chunk_size,
+            checkpoint_path=checkpoint,
+            rescore_all=args.all
+        )
+
+    if args.rebuild_rollups:
+        db = SessionLocal()
+        try:
+            days = rebuild_mood_rollups(db)
+            print(f"Rebuilt {days} daily mood rollups")
+        finally:
+            db.close()
+
+if __name__ == "__main__":
+    main()
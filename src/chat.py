@@ -2,14 +2,30 @@
 """
 Interactive command-line chat interface for the sentiment chatbot.
 Run with: python chat.py
+
+Batch mode runs JSONL prompts concurrently and writes JSONL results in input order:
+    python chat.py --batch prompts.jsonl --output results.jsonl --concurrency 8 [--resume]
+Each input line is an object with a "message" (or "prompt") field and an optional "id".
+A line that is not a JSON object gets an error result in its place.
 """
 
-from sentiment_bot import route_by_sentiment
+import argparse
+import json
+import os
+import statistics
+import time
+from collections import Counter, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+try:
+    from .sentiment_bot import route_by_sentiment, route_message
+except ImportError:  # run as a script: python chat.py
+    from sentiment_bot import route_by_sentiment, route_message
 from dotenv import load_dotenv
 
 load_dotenv()
 
-def main():
+def interactive():
     """Main chat loop"""
     print("\n" + "="*60)
     print("    Sentiment-Aware Chatbot")
@@ -34,7 +50,7 @@ def main():
 
             # Get bot response
             response = route_by_sentiment(user_input)
-            
+
             # Display response
             print(f"\nKnight Bot: {response}\n")
 
@@ -44,5 +60,132 @@ def main():
         except Exception as e:
             print(f"\nError: {str(e)}\n")
 
+# ============ BATCH MODE ============
+
+def failed_result(index: int, error: str, item_id=None, message: str = None) -> dict:
+    return {"index": index, "id": item_id, "message": message, "reply": None, "tier": None,
+            "sentiment": None, "severity": None, "score": None, "crisis": None, "error": error,
+            "latency_ms": 0.0}
+
+def run_item(index: int, item: dict) -> dict:
+    """Route one prompt and time it; errors are recorded rather than raised"""
+    message = item.get("message", item.get("prompt", ""))
+    start = time.perf_counter()
+    try:
+        outcome = route_message(message)
+        result = {
+            "index": index,
+            "id": item.get("id"),
+            "message": message,
+            "reply": outcome["reply"],
+            "tier": outcome["tier"],
+            "sentiment": outcome["sentiment"],
+            "severity": outcome["severity"],
+            "score": outcome["score"],
+            "crisis": outcome["tier"] == "crisis",
+            "error": None
+        }
+    except Exception as e:
+        result = failed_result(index, str(e), item.get("id"), message)
+    result["latency_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    return result
+
+def completed_count(output_path: str) -> int:
+    """Number of finished results; drops a trailing partial line left by an interruption"""
+    if not os.path.exists(output_path):
+        return 0
+    with open(output_path, "rb+") as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            cut = data.rfind(b"\n") + 1
+            f.truncate(cut)
+            data = data[:cut]
+    return data.count(b"\n")
+
+def read_prompts(input_path: str):
+    """Prompt objects from a JSONL file; a malformed line yields a ValueError in its place"""
+    with open(input_path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield ValueError(f"line {line_number}: invalid JSON ({e})")
+                continue
+            if not isinstance(item, dict):
+                yield ValueError(f"line {line_number}: expected a JSON object")
+                continue
+            yield item
+
+def run_batch(input_path: str, output_path: str, concurrency: int = 4, resume: bool = False):
+    """Run JSONL prompts with bounded concurrency, writing results in input order"""
+    skip = completed_count(output_path) if resume else 0
+    if skip:
+        print(f"Resuming after {skip} completed items")
+
+    window = concurrency * 4  # results buffered while waiting for the slowest earlier item
+    latencies, tiers, errors, done = [], Counter(), 0, 0
+    start = time.perf_counter()
+
+    with open(output_path, "a" if resume else "w", encoding="utf-8") as out, \
+            ThreadPoolExecutor(max_workers=concurrency) as pool:
+        pending = deque()
+
+        def write_next():
+            nonlocal errors, done
+            result = pending.popleft().result()
+            out.write(json.dumps(result, ensure_ascii=False) + "\n")
+            out.flush()
+            done += 1
+            latencies.append(result["latency_ms"])
+            tiers[result["tier"] or "error"] += 1
+            if result["error"]:
+                errors += 1
+
+        try:
+            for index, item in enumerate(read_prompts(input_path)):
+                if index < skip:
+                    continue
+                if isinstance(item, ValueError):
+                    future = Future()
+                    future.set_result(failed_result(index, str(item)))
+                else:
+                    future = pool.submit(run_item, index, item)
+                pending.append(future)
+                while pending and (len(pending) >= window or pending[0].done()):
+                    write_next()
+            while pending:
+                write_next()
+        except KeyboardInterrupt:
+            for future in pending:
+                future.cancel()
+            print(f"\nInterrupted after {skip + done} items. Re-run with --resume to continue.")
+            raise
+
+    elapsed = time.perf_counter() - start
+    print(f"\nProcessed {done} items in {elapsed:.1f}s ({done / max(elapsed, 1e-9):.2f} items/s), {errors} errors")
+    if latencies:
+        ordered = sorted(latencies)
+        p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+        print(f"Latency p50 {statistics.median(ordered):.0f} ms, p95 {p95:.0f} ms")
+    print("Tiers: " + ", ".join(f"{tier}={count}" for tier, count in tiers.most_common()))
+
+def main():
+    parser = argparse.ArgumentParser(description="Sentiment-aware chatbot CLI")
+    parser.add_argument("--batch", metavar="INPUT", help="JSONL file of prompts to run instead of chatting")
+    parser.add_argument("--output", default="batch_results.jsonl", help="JSONL results file (batch mode)")
+    parser.add_argument("--concurrency", type=int, default=4, help="prompts in flight at once (batch mode)")
+    parser.add_argument("--resume", action="store_true", help="skip items already written to --output")
+    args = parser.parse_args()
+
+    if args.batch:
+        try:
+            run_batch(args.batch, args.output, max(args.concurrency, 1), args.resume)
+        except KeyboardInterrupt:
+            pass
+    else:
+        interactive()
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,21 +1,208 @@
 # src/database.py
 import os
-from datetime import datetime
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Boolean, Text
+import queue
+import re
+import threading
+import zlib
+from concurrent.futures import Future
+from contextlib import contextmanager
+from datetime import datetime, date, timezone
+from sqlalchemy import (
+    create_engine, event, inspect, text, func, case, select, insert, update, delete,
+    Column, Index, Integer, String, DateTime, Date, Boolean, Text, Float, LargeBinary
+)
+from sqlalchemy.exc import DBAPIError, IntegrityError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
 
 # Database setup
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./chatbot.db")
 
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {}
-)
+# SQLite performance profile (applied to every new connection)
+SQLITE_PRAGMAS = os.getenv("SQLITE_PRAGMAS", "1") == "1"
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+SQLITE_WRITE_QUEUE = os.getenv("SQLITE_WRITE_QUEUE", "0") == "1"
+SQLITE_WRITE_BATCH_SIZE = int(os.getenv("SQLITE_WRITE_BATCH_SIZE", "64"))
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """Switch a fresh SQLite connection to WAL and the tuned pragmas"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    # Negative cache_size is in KiB rather than pages
+    cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+def create_db_engine(url: str):
+    """Create an engine, applying the SQLite profile when the URL is SQLite"""
+    is_sqlite = url.startswith("sqlite")
+    db_engine = create_engine(
+        url,
+        connect_args={"check_same_thread": False} if is_sqlite else {}
+    )
+    if is_sqlite and SQLITE_PRAGMAS:
+        event.listen(db_engine, "connect", _apply_sqlite_pragmas)
+    return db_engine
+
+engine = create_db_engine(DATABASE_URL)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# ============ SQLITE WRITE QUEUE ============
+
+class SQLiteWriteQueue:
+    """
+    Funnel writes through one background thread.
+
+    SQLite allows a single writer at a time. Instead of every request thread
+    racing for the lock, jobs are queued and the writer commits them in
+    small batches, so one fsync covers many inserts. Jobs are callables that
+    take a session and add/return ORM objects; they must not commit.
+    Across uvicorn worker processes, WAL and busy_timeout handle contention.
+    """
+
+    def __init__(self, session_factory, batch_size: int = SQLITE_WRITE_BATCH_SIZE):
+        self._session_factory = session_factory
+        self._batch_size = batch_size
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._worker, name="sqlite-writer", daemon=True
+                )
+                self._thread.start()
+
+    def submit(self, job) -> Future:
+        """Queue a write job and return a future for its result"""
+        future = Future()
+        self._ensure_started()
+        self._queue.put((job, future))
+        return future
+
+    def run(self, job, timeout: float = None):
+        """Queue a write job and block until it is committed"""
+        return self.submit(job).result(timeout)
+
+    def close(self, timeout: float = None):
+        """Flush pending jobs and stop the writer thread"""
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join(timeout)
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            stop = False
+            while len(batch) < self._batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+
+            batch = [(job, f) for job, f in batch if f.set_running_or_notify_cancel()]
+            if len(batch) == 1:
+                self._run_batch(batch, report_errors=True)
+            elif batch and not self._run_batch(batch):
+                # One job failed: retry individually so the others still land
+                for job, future in batch:
+                    self._run_batch([(job, future)], report_errors=True)
+            if stop:
+                return
+
+    def _run_batch(self, batch, report_errors: bool = False) -> bool:
+        db = self._session_factory()
+        try:
+            results = [job(db) for job, _ in batch]
+            db.commit()
+            db.expunge_all()
+        except Exception as e:
+            db.rollback()
+            if report_errors:
+                batch[0][1].set_exception(e)
+            return False
+        finally:
+            db.close()
+
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+        return True
+
+def _make_write_queue(url: str, db_engine):
+    """A write queue for a SQLite database when SQLITE_WRITE_QUEUE is on, else None"""
+    if not (SQLITE_WRITE_QUEUE and url.startswith("sqlite")):
+        return None
+    # expire_on_commit=False keeps committed objects readable once detached
+    return SQLiteWriteQueue(
+        sessionmaker(autoflush=False, bind=db_engine, expire_on_commit=False)
+    )
+
+write_queue = _make_write_queue(DATABASE_URL, engine)
+
+# ============ CHAT SHARDING ============
+
+# Optional comma-separated database URLs that hold chat data (messages, archive
+# batches, mood rollups), split by hashed user_id. users and reset tokens always
+# stay on DATABASE_URL. Unset means everything lives on DATABASE_URL.
+CHAT_SHARD_URLS = [url.strip() for url in os.getenv("CHAT_SHARD_URLS", "").split(",") if url.strip()]
+
+if CHAT_SHARD_URLS:
+    shard_engines = [create_db_engine(url) for url in CHAT_SHARD_URLS]
+    shard_sessions = [
+        sessionmaker(autocommit=False, autoflush=False, bind=shard_engine)
+        for shard_engine in shard_engines
+    ]
+    shard_write_queues = [
+        _make_write_queue(url, shard_engine) for url, shard_engine in zip(CHAT_SHARD_URLS, shard_engines)
+    ]
+else:
+    shard_engines, shard_sessions, shard_write_queues = [engine], [SessionLocal], [write_queue]
+
+def shard_for_user(user_id: int, shard_count: int = None) -> int:
+    """Shard index for a user; crc32 keeps it stable across processes and restarts"""
+    shard_count = shard_count or len(shard_engines)
+    return zlib.crc32(str(int(user_id)).encode()) % shard_count
+
+def chat_sessionmaker(user_id: int):
+    """Session factory for the database holding user_id's chat data"""
+    return shard_sessions[shard_for_user(user_id)]
+
+@contextmanager
+def chat_session(db: Session, user_id: int):
+    """
+    Session for user_id's chat data. Without sharding (or when db is already on
+    the right shard) this is the caller's session; otherwise a shard session is
+    opened for the duration of the block.
+    """
+    shard = shard_for_user(user_id)
+    if not CHAT_SHARD_URLS or db.get_bind() is shard_engines[shard]:
+        yield db
+        return
+    shard_db = shard_sessions[shard]()
+    try:
+        yield shard_db
+    finally:
+        shard_db.close()
+
 # ============ DATABASE MODELS ============
 
 class User(Base):
@@ -28,6 +215,11 @@ class User(Base):
     is_verified = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        # Finds stale unverified accounts for the maintenance purge
+        Index("ix_users_verified_created", "is_verified", "created_at"),
+    )
 
 class ChatMessage(Base):
     __tablename__ = "chat_messages"
@@ -37,7 +229,49 @@ class ChatMessage(Base):
     message = Column(Text, nullable=False)
     response = Column(Text, nullable=False)
     sentiment = Column(String(20))
+    severity = Column(String(20))
+    sentiment_score = Column(Float)
+    tier = Column(String(20))
     timestamp = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        # History pages are "newest first" per user; without this SQLite sorts every row
+        Index("ix_chat_messages_user_timestamp", "user_id", "timestamp"),
+    )
+
+class ChatMessageArchive(Base):
+    """A compressed batch of one user's messages moved out of chat_messages"""
+    __tablename__ = "chat_message_archive"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, nullable=False)
+    first_message_id = Column(Integer, nullable=False)
+    last_message_id = Column(Integer, nullable=False)
+    first_timestamp = Column(DateTime)
+    last_timestamp = Column(DateTime)
+    row_count = Column(Integer, nullable=False)
+    codec = Column(String(10), nullable=False)
+    raw_bytes = Column(Integer, nullable=False)
+    payload = Column(LargeBinary, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index("ix_chat_message_archive_user_last", "user_id", "last_message_id"),
+    )
+
+class MoodDailyRollup(Base):
+    __tablename__ = "mood_daily_rollups"
+    
+    user_id = Column(Integer, primary_key=True)
+    day = Column(Date, primary_key=True)
+    message_count = Column(Integer, nullable=False, default=0)
+    scored_count = Column(Integer, nullable=False, default=0)
+    compound_sum = Column(Float, nullable=False, default=0.0)
+    compound_min = Column(Float)
+    normal_count = Column(Integer, nullable=False, default=0)
+    moderate_count = Column(Integer, nullable=False, default=0)
+    severe_count = Column(Integer, nullable=False, default=0)
+    crisis_count = Column(Integer, nullable=False, default=0)
 
 class PasswordResetToken(Base):
     __tablename__ = "password_reset_tokens"
@@ -48,14 +282,225 @@ class PasswordResetToken(Base):
     expires_at = Column(DateTime, nullable=False)
     used = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        # Lookups by token already use the unique index; this one serves the expiry purge
+        Index("ix_password_reset_tokens_expires_at", "expires_at"),
+    )
+
+class IdempotencyKey(Base):
+    """A client-supplied Idempotency-Key for /chat and the reply it produced"""
+    __tablename__ = "idempotency_keys"
+    
+    user_id = Column(Integer, primary_key=True)
+    key = Column(String(255), primary_key=True)
+    request_hash = Column(String(64), nullable=False)
+    status = Column(String(20), nullable=False, default="in_progress")
+    reply = Column(Text)
+    message_id = Column(Integer)
+    claimed_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index("ix_idempotency_keys_created_at", "created_at"),
+    )
+
+class MaintenanceLock(Base):
+    """A lease on a maintenance job so only one worker runs it at a time"""
+    __tablename__ = "maintenance_locks"
+    
+    name = Column(String(100), primary_key=True)
+    owner = Column(String(100), nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+
+class DataVersion(Base):
+    """A named counter bumped when stored data changes in ways new message ids don't show"""
+    __tablename__ = "data_versions"
+    
+    name = Column(String(50), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+# Tables that live on the chat shards (everything else stays on DATABASE_URL)
+CHAT_TABLES = [
+    ChatMessage.__table__, ChatMessageArchive.__table__, MoodDailyRollup.__table__, DataVersion.__table__
+]
 
 # ============ DATABASE FUNCTIONS ============
 
+# Workers wait this long for another worker's schema upgrade to finish
+SCHEMA_LOCK_TIMEOUT_MS = int(os.getenv("SCHEMA_LOCK_TIMEOUT_MS", "300000"))
+# Arbitrary key for the Postgres advisory lock held during schema upgrades
+SCHEMA_LOCK_KEY = 4827001
+
+@contextmanager
+def _schema_upgrade(db_engine):
+    """
+    Connection for schema changes that holds a database-wide lock until it
+    commits, so uvicorn workers starting together take turns: the first one
+    upgrades and the others find nothing left to do. SQLite DDL is
+    transactional, so BEGIN IMMEDIATE is the lock; Postgres takes an
+    advisory lock.
+    """
+    dialect = db_engine.dialect.name
+    with db_engine.connect() as conn:
+        try:
+            if dialect == "sqlite":
+                conn.exec_driver_sql(f"PRAGMA busy_timeout={SCHEMA_LOCK_TIMEOUT_MS}")
+                conn.exec_driver_sql("BEGIN IMMEDIATE")
+            elif dialect == "postgresql":
+                conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": SCHEMA_LOCK_KEY})
+            yield conn
+            conn.commit()
+        finally:
+            if dialect == "sqlite":
+                # The connection goes back to the pool; restore the normal timeout
+                conn.rollback()
+                conn.exec_driver_sql(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+
+def _already_exists(error: DBAPIError) -> bool:
+    """True when DDL failed because another process already made the change"""
+    message = str(error.orig).lower()
+    return "already exists" in message or "duplicate column" in message
+
+def _add_missing_columns(conn):
+    """Add columns introduced after a table was first created (create_all skips them)"""
+    inspector = inspect(conn)
+    existing_tables = set(inspector.get_table_names())
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {col["name"] for col in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            column_type = column.type.compile(dialect=conn.dialect)
+            try:
+                with conn.begin_nested():
+                    conn.execute(text(
+                        f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"
+                    ))
+            except DBAPIError as e:
+                if not _already_exists(e):
+                    raise
+                continue
+            print(f"Added column {table.name}.{column.name}")
+
+def _declared_indexes() -> dict:
+    """Every index declared on the models, by name"""
+    return {index.name: index for table in Base.metadata.sorted_tables for index in table.indexes}
+
+def _create_index_sql(name: str, dialect: str) -> str:
+    # Postgres builds concurrently so writes carry on while a large table is indexed
+    concurrently = "CONCURRENTLY " if dialect == "postgresql" else ""
+    if name == PG_FTS_INDEX:
+        return f"CREATE INDEX {concurrently}IF NOT EXISTS {name} ON chat_messages USING GIN ({_PG_DOCUMENT})"
+    index = _declared_indexes()[name]
+    unique = "UNIQUE " if index.unique else ""
+    columns = ", ".join(column.name for column in index.columns)
+    return f"CREATE {unique}INDEX {concurrently}IF NOT EXISTS {name} ON {index.table.name} ({columns})"
+
+def missing_indexes(conn) -> list:
+    """Names of indexes declared on existing tables but absent from the database (create_all skips them)"""
+    inspector = inspect(conn)
+    tables = set(inspector.get_table_names()) & set(Base.metadata.tables)
+    wanted = sorted(index.name for index in _declared_indexes().values() if index.table.name in tables)
+    if conn.dialect.name == "postgresql":
+        if "chat_messages" in tables:
+            wanted.append(PG_FTS_INDEX)
+        # An interrupted concurrent build leaves an invalid index behind; count it as missing
+        existing = set(conn.execute(text(
+            "SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "JOIN pg_namespace n ON n.oid = c.relnamespace WHERE n.nspname = current_schema() AND i.indisvalid"
+        )).scalars())
+    else:
+        existing = {index["name"] for table in tables for index in inspector.get_indexes(table)}
+    return [name for name in wanted if name not in existing]
+
+def create_missing_indexes(db_engine) -> list:
+    """
+    Create the missing indexes and return their names. Run it as a one-off
+    migration (python -m src.migrate), not from every worker: on a large
+    table the build takes a while. Postgres builds CONCURRENTLY so writes are
+    not blocked; SQLite holds its write lock for the build either way.
+    """
+    dialect = db_engine.dialect.name
+    created = []
+    if dialect == "sqlite":
+        # The schema lock lets a second run wait for the first, then find nothing to do
+        with _schema_upgrade(db_engine) as conn:
+            for name in missing_indexes(conn):
+                conn.execute(text(_create_index_sql(name, dialect)))
+                created.append(name)
+    elif dialect == "postgresql":
+        # CREATE INDEX CONCURRENTLY can't run inside a transaction
+        with db_engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            # Not a blocking lock: a concurrent build waits for every open transaction, including a waiter's
+            if not conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": SCHEMA_LOCK_KEY}).scalar():
+                print("Another migration is running; skipping index creation")
+                return created
+            try:
+                for name in missing_indexes(conn):
+                    conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+                    conn.execute(text(_create_index_sql(name, dialect)))
+                    created.append(name)
+            finally:
+                conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": SCHEMA_LOCK_KEY})
+    else:
+        # No IF NOT EXISTS for indexes elsewhere; losing a race to another run is fine
+        with db_engine.connect() as conn:
+            missing = missing_indexes(conn)
+        for name in missing:
+            try:
+                _declared_indexes()[name].create(bind=db_engine)
+            except DBAPIError as e:
+                if not _already_exists(e):
+                    raise
+                continue
+            created.append(name)
+    for name in created:
+        print(f"Added index {name}")
+    return created
+
+def upgrade_schema(db_engine, tables=None) -> list:
+    """
+    Create missing tables and columns under the schema lock. Indexes on
+    existing tables are left to create_missing_indexes; their names are
+    returned.
+    """
+    with _schema_upgrade(db_engine) as conn:
+        Base.metadata.create_all(bind=conn, tables=tables)
+        _add_missing_columns(conn)
+        if conn.dialect.name == "sqlite":
+            _init_sqlite_fulltext_search(conn)
+        return missing_indexes(conn)
+
+def init_chat_shard(db_engine):
+    """Create the chat tables, indexes and search index on one shard"""
+    upgrade_schema(db_engine, tables=CHAT_TABLES)
+    create_missing_indexes(db_engine)
+
 def init_db():
-    """Initialize database tables"""
-    Base.metadata.create_all(bind=engine)
+    """Create missing tables and columns on the main database and every chat shard"""
+    missing = upgrade_schema(engine)
+    if CHAT_SHARD_URLS:
+        for shard_engine in shard_engines:
+            missing += upgrade_schema(shard_engine, tables=CHAT_TABLES)
+        print(f"Chat data sharded across {len(shard_engines)} databases")
+    if missing:
+        # Building them here would race across workers and block writes on a large table
+        print(f"Missing indexes: {', '.join(sorted(set(missing)))}; run python -m src.migrate")
     print("Database initialized")
 
+def shutdown_db():
+    """Flush queued writes and release pooled connections"""
+    # Without sharding the shard lists just alias the primary, so dedupe by identity
+    queues = {id(q): q for q in [write_queue, *shard_write_queues] if q is not None}
+    for pending in queues.values():
+        pending.close(timeout=10)
+    for db_engine in {id(e): e for e in [engine, *shard_engines]}.values():
+        db_engine.dispose()
+
 def get_db():
     """Dependency to get database session"""
     db = SessionLocal()
@@ -102,29 +547,411 @@ def verify_user(db: Session, email: str):
 
 # ============ CHAT MESSAGE OPERATIONS ============
 
-def save_chat_message(db: Session, user_id: int, message: str, response: str, sentiment: str = None):
-    """Save a chat message to the database"""
+def to_naive_utc(value: datetime = None):
+    """Stored timestamps are naive UTC; convert an offset-aware bound to match"""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def _add_chat_message(db: Session, user_id: int, message: str, response: str, sentiment: str = None,
+                      severity: str = None, score: float = None, tier: str = None):
+    """Stage a chat message and its mood rollup update on the session without committing"""
+    timestamp = datetime.utcnow()
     chat_msg = ChatMessage(
         user_id=user_id,
         message=message,
         response=response,
-        sentiment=sentiment
+        sentiment=sentiment,
+        severity=severity,
+        sentiment_score=score,
+        tier=tier,
+        timestamp=timestamp
     )
     db.add(chat_msg)
-    db.commit()
-    db.refresh(chat_msg)
+    _bump_mood_rollup(db, user_id, timestamp.date(), score, severity, tier)
     return chat_msg
 
-def get_user_chat_history(db: Session, user_id: int, limit: int = 50):
-    """Get chat history for a user"""
-    return (
-        db.query(ChatMessage)
-        .filter(ChatMessage.user_id == user_id)
-        .order_by(ChatMessage.timestamp.desc())
-        .limit(limit)
-        .all()
+def save_chat_message(db: Session, user_id: int, message: str, response: str, sentiment: str = None,
+                      severity: str = None, score: float = None, tier: str = None):
+    """Save a chat message and its routing outcome to the user's chat database"""
+    shard_queue = shard_write_queues[shard_for_user(user_id)]
+    if shard_queue is not None:
+        return shard_queue.run(
+            lambda session: _add_chat_message(
+                session, user_id, message, response, sentiment, severity, score, tier
+            )
+        )
+
+    with chat_session(db, user_id) as chat_db:
+        chat_msg = _add_chat_message(chat_db, user_id, message, response, sentiment, severity, score, tier)
+        chat_db.commit()
+        chat_db.refresh(chat_msg)
+    return chat_msg
+
+def get_user_chat_history(db: Session, user_id: int, limit: int = 50, before_id: int = None):
+    """Get chat history for a user, newest first, optionally older than before_id"""
+    with chat_session(db, user_id) as chat_db:
+        query = chat_db.query(ChatMessage).filter(ChatMessage.user_id == user_id)
+        if before_id is not None:
+            query = query.filter(ChatMessage.id < before_id)
+        return (
+            query
+            .order_by(ChatMessage.timestamp.desc())
+            .limit(limit)
+            .all()
+        )
+
+# Columns served by the history endpoints, in response field order
+HISTORY_COLUMNS = [
+    ChatMessage.id,
+    ChatMessage.message,
+    ChatMessage.response,
+    ChatMessage.sentiment,
+    ChatMessage.severity,
+    ChatMessage.tier,
+    ChatMessage.timestamp,
+]
+
+def get_user_chat_history_rows(db: Session, user_id: int, limit: int = 50, before_id: int = None):
+    """Same page as get_user_chat_history, as plain HISTORY_COLUMNS tuples instead of ORM objects"""
+    stmt = select(*HISTORY_COLUMNS).where(ChatMessage.user_id == user_id)
+    if before_id is not None:
+        stmt = stmt.where(ChatMessage.id < before_id)
+    with chat_session(db, user_id) as chat_db:
+        return chat_db.execute(stmt.order_by(ChatMessage.timestamp.desc()).limit(limit)).all()
+
+def get_chat_messages_after(db: Session, user_id: int, after_id: int = None, since: datetime = None,
+                            limit: int = 200):
+    """Hot messages newer than after_id and/or since, oldest first, as HISTORY_COLUMNS tuples"""
+    stmt = select(*HISTORY_COLUMNS).where(ChatMessage.user_id == user_id)
+    if after_id is not None:
+        stmt = stmt.where(ChatMessage.id > after_id)
+    if since is not None:
+        stmt = stmt.where(ChatMessage.timestamp > since)
+    with chat_session(db, user_id) as chat_db:
+        return chat_db.execute(stmt.order_by(ChatMessage.id).limit(limit)).all()
+
+def get_latest_chat_message_id(db: Session, user_id: int):
+    """Newest message id for a user (hot or archived); None if there are none"""
+    with chat_session(db, user_id) as chat_db:
+        latest = chat_db.query(func.max(ChatMessage.id)).filter(ChatMessage.user_id == user_id).scalar()
+        if latest is None:
+            latest = (
+                chat_db.query(func.max(ChatMessageArchive.last_message_id))
+                .filter(ChatMessageArchive.user_id == user_id)
+                .scalar()
+            )
+    return latest
+
+# ============ FULL-TEXT SEARCH ============
+
+# Postgres searches this expression; the GIN index must be built on exactly the same one
+_PG_DOCUMENT = "to_tsvector('english', coalesce(message, '') || ' ' || coalesce(response, ''))"
+# GIN index over _PG_DOCUMENT, created with the other indexes by create_missing_indexes
+PG_FTS_INDEX = "ix_chat_messages_fts"
+
+_SQLITE_FTS_DDL = [
+    # user_id is indexed too so a user's matches are intersected inside the index
+    """CREATE VIRTUAL TABLE chat_messages_fts USING fts5(
+        message, response, user_id, content='chat_messages', content_rowid='id',
+        tokenize='porter unicode61'
+    )""",
+    """CREATE TRIGGER chat_messages_fts_ai AFTER INSERT ON chat_messages BEGIN
+        INSERT INTO chat_messages_fts(rowid, message, response, user_id)
+        VALUES (new.id, new.message, new.response, new.user_id);
+    END""",
+    """CREATE TRIGGER chat_messages_fts_ad AFTER DELETE ON chat_messages BEGIN
+        INSERT INTO chat_messages_fts(chat_messages_fts, rowid, message, response, user_id)
+        VALUES ('delete', old.id, old.message, old.response, old.user_id);
+    END""",
+    """CREATE TRIGGER chat_messages_fts_au AFTER UPDATE OF message, response, user_id ON chat_messages BEGIN
+        INSERT INTO chat_messages_fts(chat_messages_fts, rowid, message, response, user_id)
+        VALUES ('delete', old.id, old.message, old.response, old.user_id);
+        INSERT INTO chat_messages_fts(rowid, message, response, user_id)
+        VALUES (new.id, new.message, new.response, new.user_id);
+    END""",
+    # Index any rows that existed before the FTS table was created
+    "INSERT INTO chat_messages_fts(chat_messages_fts) VALUES ('rebuild')",
+]
+
+def _init_sqlite_fulltext_search(conn):
+    exists = conn.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'chat_messages_fts'"
+    )).first()
+    if exists:
+        return
+    try:
+        with conn.begin_nested():
+            for statement in _SQLITE_FTS_DDL:
+                conn.execute(text(statement))
+    except Exception as e:
+        # SQLite builds without FTS5 fall back to LIKE search
+        print(f"Full-text search unavailable: {e}")
+
+
+def _has_sqlite_fts(db: Session) -> bool:
+    return db.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'chat_messages_fts'"
+    )).first() is not None
+
+def _fts5_query(user_id: int, query: str) -> str:
+    """Quote each word so user input can't inject FTS5 syntax; words are ANDed"""
+    words = " ".join(f'"{word}"' for word in re.findall(r"\w+", query))
+    if not words:
+        return ""
+    return f'user_id:"{int(user_id)}" AND {{message response}}: ({words})'
+
+def _like_pattern(query: str) -> str:
+    """Substring pattern with the user's % and _ matched literally"""
+    escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+def search_chat_messages(db: Session, user_id: int, query: str, limit: int = 20, offset: int = 0):
+    """Search a user's messages and replies, best matches first, with highlighted snippets"""
+    with chat_session(db, user_id) as chat_db:
+        return _search_chat_messages(chat_db, user_id, query, limit, offset)
+
+def _search_chat_messages(db: Session, user_id: int, query: str, limit: int, offset: int):
+    dialect = db.get_bind().dialect.name
+    params = {"user_id": user_id, "limit": limit, "offset": offset}
+
+    if dialect == "sqlite" and _has_sqlite_fts(db):
+        params["query"] = _fts5_query(user_id, query)
+        if not params["query"]:
+            return []
+        sql = """
+            SELECT m.id, m.timestamp,
+                   snippet(chat_messages_fts, 0, '<mark>', '</mark>', '…', 16) AS message_snippet,
+                   snippet(chat_messages_fts, 1, '<mark>', '</mark>', '…', 16) AS response_snippet,
+                   -bm25(chat_messages_fts, 1.0, 1.0, 0.0) AS rank
+            FROM chat_messages_fts
+            JOIN chat_messages m ON m.id = chat_messages_fts.rowid
+            WHERE chat_messages_fts MATCH :query AND m.user_id = :user_id
+            ORDER BY rank DESC
+            LIMIT :limit OFFSET :offset
+        """
+    elif dialect == "postgresql":
+        params["query"] = query
+        options = "StartSel=<mark>, StopSel=</mark>, MaxWords=24, MinWords=8"
+        sql = f"""
+            SELECT id, timestamp,
+                   ts_headline('english', message, q, '{options}') AS message_snippet,
+                   ts_headline('english', response, q, '{options}') AS response_snippet,
+                   ts_rank({_PG_DOCUMENT}, q) AS rank
+            FROM chat_messages, websearch_to_tsquery('english', :query) AS q
+            WHERE user_id = :user_id AND {_PG_DOCUMENT} @@ q
+            ORDER BY rank DESC, id DESC
+            LIMIT :limit OFFSET :offset
+        """
+    else:
+        # No full-text index available: unranked substring scan
+        params["query"] = _like_pattern(query)
+        sql = """
+            SELECT id, timestamp, message AS message_snippet, response AS response_snippet, 0 AS rank
+            FROM chat_messages
+            WHERE user_id = :user_id AND (message LIKE :query ESCAPE '\\' OR response LIKE :query ESCAPE '\\')
+            ORDER BY id DESC
+            LIMIT :limit OFFSET :offset
+        """
+
+    # Typed columns so SQLite hands back datetimes rather than strings
+    stmt = text(sql).columns(id=Integer, timestamp=DateTime)
+    return db.execute(stmt, params).mappings().all()
+
+# ============ MOOD ROLLUP OPERATIONS ============
+
+_MOOD_COUNTERS = [
+    "message_count", "scored_count", "compound_sum",
+    "normal_count", "moderate_count", "severe_count", "crisis_count"
+]
+
+def _mood_counts(score: float = None, severity: str = None, tier: str = None) -> dict:
+    """Rollup counters contributed by one message"""
+    return {
+        "message_count": 1,
+        "scored_count": 0 if score is None else 1,
+        "compound_sum": score or 0.0,
+        "compound_min": score,
+        "normal_count": 1 if severity == "normal" else 0,
+        "moderate_count": 1 if severity == "moderate" else 0,
+        "severe_count": 1 if severity == "severe" else 0,
+        "crisis_count": 1 if tier == "crisis" else 0,
+    }
+
+def _add_mood_counts(total: dict, counts: dict):
+    for name in _MOOD_COUNTERS:
+        total[name] += counts[name]
+    if counts["compound_min"] is not None and (
+        total["compound_min"] is None or counts["compound_min"] < total["compound_min"]
+    ):
+        total["compound_min"] = counts["compound_min"]
+
+def _bump_mood_rollup(db: Session, user_id: int, day: date, score: float = None,
+                      severity: str = None, tier: str = None):
+    """Fold one message into the user's daily rollup"""
+    _merge_mood_rollup(db, {"user_id": user_id, "day": day, **_mood_counts(score, severity, tier)})
+
+def _merge_mood_rollup(db: Session, values: dict):
+    """Add counters to a (user_id, day) rollup with a single upsert"""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as upsert
+        least = func.least
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as upsert
+        least = func.min
+    else:
+        _merge_mood_rollup_portable(db, values)
+        return
+
+    stmt = upsert(MoodDailyRollup).values(**values)
+    rollup, new = MoodDailyRollup, stmt.excluded
+    set_ = {name: getattr(rollup, name) + getattr(new, name) for name in _MOOD_COUNTERS}
+    set_["compound_min"] = least(
+        func.coalesce(rollup.compound_min, new.compound_min),
+        func.coalesce(new.compound_min, rollup.compound_min)
+    )
+    db.execute(stmt.on_conflict_do_update(index_elements=["user_id", "day"], set_=set_))
+
+def _merge_mood_rollup_portable(db: Session, values: dict):
+    """UPDATE, else INSERT, for databases without an upsert; losing the insert race retries the UPDATE"""
+    rollup = MoodDailyRollup
+    set_ = {name: getattr(rollup, name) + values[name] for name in _MOOD_COUNTERS}
+    if values["compound_min"] is not None:
+        set_["compound_min"] = case(
+            (rollup.compound_min.is_(None) | (rollup.compound_min > values["compound_min"]), values["compound_min"]),
+            else_=rollup.compound_min
+        )
+    bump = (
+        update(rollup)
+        .where(rollup.user_id == values["user_id"], rollup.day == values["day"])
+        .values(**set_)
+    )
+    if db.execute(bump).rowcount:
+        return
+    try:
+        with db.begin_nested():
+            db.execute(insert(rollup).values(**values))
+    except IntegrityError:
+        db.execute(bump)
+
+def get_mood_timeline(db: Session, user_id: int, start_day: date = None, end_day: date = None):
+    """Get a user's daily mood rollups, oldest first"""
+    with chat_session(db, user_id) as chat_db:
+        query = chat_db.query(MoodDailyRollup).filter(MoodDailyRollup.user_id == user_id)
+        if start_day:
+            query = query.filter(MoodDailyRollup.day >= start_day)
+        if end_day:
+            query = query.filter(MoodDailyRollup.day <= end_day)
+        return query.order_by(MoodDailyRollup.day).all()
+
+def rebuild_mood_rollups(db: Session, user_id: int = None) -> int:
+    """
+    Recompute rollups from the stored per-message scores (e.g. after a
+    backfill), reading archived batches as well as hot rows. Returns the
+    number of user-days.
+    """
+    if user_id is not None:
+        with chat_session(db, user_id) as chat_db:
+            return _rebuild_mood_rollups(chat_db, user_id)
+    if not CHAT_SHARD_URLS:
+        return _rebuild_mood_rollups(db, None)
+
+    total = 0
+    for shard_session in shard_sessions:
+        with shard_session() as shard_db:
+            total += _rebuild_mood_rollups(shard_db, None)
+    return total
+
+def _rebuild_mood_rollups(db: Session, user_id: int = None) -> int:
+    def count_if(condition):
+        return func.sum(case((condition, 1), else_=0))
+
+    day = func.date(ChatMessage.timestamp)
+    aggregate = (
+        db.query(
+            ChatMessage.user_id,
+            day,
+            func.count(ChatMessage.id),
+            func.count(ChatMessage.sentiment_score),
+            func.coalesce(func.sum(ChatMessage.sentiment_score), 0.0),
+            func.min(ChatMessage.sentiment_score),
+            count_if(ChatMessage.severity == "normal"),
+            count_if(ChatMessage.severity == "moderate"),
+            count_if(ChatMessage.severity == "severe"),
+            count_if(ChatMessage.tier == "crisis"),
+        )
+        .filter(ChatMessage.timestamp.isnot(None))
+        .group_by(ChatMessage.user_id, day)
+    )
+    clear = delete(MoodDailyRollup)
+    archived = db.query(ChatMessageArchive)
+    if user_id is not None:
+        aggregate = aggregate.filter(ChatMessage.user_id == user_id)
+        clear = clear.where(MoodDailyRollup.user_id == user_id)
+        archived = archived.filter(ChatMessageArchive.user_id == user_id)
+
+    db.execute(clear)
+    db.execute(
+        insert(MoodDailyRollup).from_select(
+            [
+                "user_id", "day", "message_count", "scored_count", "compound_sum",
+                "compound_min", "normal_count", "moderate_count", "severe_count", "crisis_count"
+            ],
+            aggregate.statement
+        )
     )
 
+    # Archived messages are no longer in chat_messages; fold their batches back in
+    from .archive import decode_batch
+    archived_days = {}
+    for batch in archived.yield_per(4):
+        for row in decode_batch(batch):
+            if not row["timestamp"]:
+                continue
+            counts = _mood_counts(row["sentiment_score"], row["severity"], row["tier"])
+            key = (batch.user_id, date.fromisoformat(row["timestamp"][:10]))
+            if key in archived_days:
+                _add_mood_counts(archived_days[key], counts)
+            else:
+                archived_days[key] = counts
+    for (archived_user_id, day), counts in archived_days.items():
+        _merge_mood_rollup(db, {"user_id": archived_user_id, "day": day, **counts})
+    db.commit()
+
+    days = db.query(func.count()).select_from(MoodDailyRollup)
+    if user_id is not None:
+        days = days.filter(MoodDailyRollup.user_id == user_id)
+    return days.scalar()
+
+# ============ DATA VERSIONS ============
+
+# Kept on each chat database and bumped whenever existing messages are
+# rewritten or moved (sentiment backfill, archiving), so history ETags change
+CHAT_DATA_VERSION = "chat_data"
+# Kept on the main database and bumped by src.reshard before it moves anyone,
+# since moved users get new message ids; served as the history epoch
+SHARD_LAYOUT_VERSION = "shard_layout"
+
+def get_data_version(db: Session, name: str) -> int:
+    """Current value of a counter; 0 if it was never bumped"""
+    return db.execute(select(DataVersion.version).where(DataVersion.name == name)).scalar() or 0
+
+def bump_data_version(db: Session, name: str):
+    """Increment a counter in the caller's transaction, creating it on first use"""
+    bump = (
+        update(DataVersion)
+        .where(DataVersion.name == name)
+        .values(version=DataVersion.version + 1, updated_at=datetime.utcnow())
+    )
+    if db.execute(bump).rowcount:
+        return
+    try:
+        with db.begin_nested():
+            db.execute(insert(DataVersion).values(name=name, version=1, updated_at=datetime.utcnow()))
+    except IntegrityError:
+        db.execute(bump)
+
 # ============ PASSWORD RESET TOKEN OPERATIONS ============
 
 def create_reset_token(db: Session, email: str, token: str, expires_at: datetime):
@@ -0,0 +1,395 @@
+# src/emotion.py
+"""
+Vectorized multi-emotion lexicon engine.
+
+Each text is tokenized once; tokens are mapped to rows of a compact float32
+matrix (one column per emotion plus valence, negator and booster columns)
+and every lookup, negation window and per-text sum runs as a NumPy array
+operation across the whole batch. Polarity uses VADER's normalization and
+thresholds so results drop into the same routing as SentimentAnalyzer.
+
+Word valences, negators and boosters are read from the installed
+vaderSentiment package (about 7,200 single words), so polarity follows
+VADER's vocabulary. Emotion categories come from EMOTION_TAGS and, when
+NRC_EMOTION_LEXICON points at the word-level NRC Emotion Lexicon file
+(not shipped with the repo because of its license), from NRC as well.
+"""
+import os
+import re
+from typing import List
+
+import numpy as np
+import vaderSentiment
+from vaderSentiment.vaderSentiment import BOOSTER_DICT, NEGATE
+
+VADER_LEXICON_PATH = os.path.join(os.path.dirname(vaderSentiment.__file__), "vader_lexicon.txt")
+# e.g. NRC-Emotion-Lexicon-Wordlevel-v0.92.txt ("word<TAB>emotion<TAB>0|1" per line)
+NRC_EMOTION_LEXICON = os.getenv("NRC_EMOTION_LEXICON", "")
+
+EMOTIONS = ("joy", "sadness", "fear", "anger", "disgust", "surprise", "trust", "anticipation")
+
+# Hand-tagged emotions for common student vocabulary; merged with NRC when configured
+EMOTION_TAGS = """
+happy          joy
+happier        joy
+happiest       joy
+happiness      joy
+glad           joy
+joy            joy
+joyful         joy
+delighted      joy
+cheerful       joy
+excited        joy anticipation
+exciting       joy anticipation
+thrilled       joy surprise
+great          joy
+good           joy
+nice           joy
+awesome        joy
+amazing        joy surprise
+wonderful      joy
+fantastic      joy
+love           joy trust
+loved          joy trust
+lovely         joy
+enjoy          joy
+enjoyed        joy
+fun            joy
+laugh          joy
+smile          joy
+proud          joy
+grateful       joy trust
+thankful       joy trust
+thanks         joy trust
+blessed        joy
+relieved       joy
+relief         joy
+calm           joy trust
+peaceful       joy trust
+content        joy
+satisfied      joy
+hopeful        anticipation joy
+hope           anticipation joy
+optimistic     anticipation joy
+confident      trust joy
+motivated      anticipation joy
+best           joy
+better         joy
+win            joy
+won            joy
+success        joy
+succeeded      joy
+passed         joy
+celebrate      joy
+beautiful      joy
+brilliant      joy
+perfect        joy
+friend         trust joy
+friends        trust joy
+support        trust
+supported      trust
+trust          trust
+safe           trust
+helpful        trust
+kind           trust joy
+care           trust
+caring         trust
+sad            sadness
+sadness        sadness
+unhappy        sadness
+depressed      sadness
+depression     sadness
+down           sadness
+miserable      sadness
+lonely         sadness
+alone          sadness
+cry            sadness
+crying         sadness
+cried          sadness
+tears          sadness
+heartbroken    sadness
+grief          sadness
+grieving       sadness
+loss           sadness
+lost           sadness
+miss           sadness
+missed         sadness
+hopeless       sadness fear
+worthless      sadness
+empty          sadness
+hurt           sadness
+hurts          sadness
+pain           sadness
+painful        sadness
+broken         sadness
+tired          sadness
+exhausted      sadness
+disappointed   sadness
+disappointing  sadness
+failed         sadness
+fail           sadness
+failure        sadness
+failing        sadness
+regret         sadness
+sorry          sadness
+gloomy         sadness
+bad            sadness
+awful          sadness disgust
+terrible       sadness fear
+horrible       sadness fear disgust
+worst          sadness
+reject         sadness
+rejected       sadness
+ashamed        sadness
+guilty         sadness
+useless        sadness
+unwanted       sadness
+dead           sadness fear
+die            sadness fear
+death          sadness fear
+afraid         fear
+scared         fear
+scary          fear
+fear           fear
+fearful        fear
+terrified      fear
+terrifying     fear
+frightened     fear
+anxious        fear
+anxiety        fear
+worried        fear
+worry          fear
+worrying       fear
+nervous        fear
+panic          fear
+panicking      fear
+stressed       fear
+stress         fear
+stressful      fear
+overwhelmed    fear sadness
+tense          fear
+uneasy         fear
+insecure       fear
+threatened     fear
+danger         fear
+dangerous      fear
+unsafe         fear
+dread          fear
+dreading       fear
+pressure       fear
+doubt          fear
+uncertain      fear
+confused       fear surprise
+struggle       fear sadness
+struggling     fear sadness
+difficult      fear
+hard           fear
+problem        fear
+trouble        fear
+angry          anger
+anger          anger
+mad            anger
+furious        anger
+annoyed        anger
+annoying       anger
+irritated      anger
+frustrated     anger
+frustrating    anger
+frustration    anger
+hate           anger disgust
+hated          anger disgust
+rage           anger
+resent         anger
+unfair         anger
+outraged       anger
+yell           anger
+yelled         anger
+fight          anger
+fighting       anger
+argue          anger
+argument       anger
+blame          anger
+stupid         anger disgust
+idiot          anger disgust
+jealous        anger
+bitter         anger sadness
+disgust        disgust
+disgusted      disgust
+disgusting     disgust
+gross          disgust
+sick           disgust
+nasty          disgust
+hateful        disgust anger
+toxic          disgust
+wow            surprise
+surprised      surprise
+surprise       surprise
+shocked        surprise fear
+shock          surprise fear
+unexpected     surprise
+sudden         surprise
+suddenly       surprise
+unbelievable   surprise
+bored          sadness
+boring         sadness
+lazy           sadness
+excite         anticipation joy
+ready          anticipation
+"""
+
+NEGATION_SCALAR = -0.74  # same dampening VADER applies to negated words
+BOOSTER_SCALAR = 1.3
+NEGATION_WINDOW = 3
+NORMALIZATION_ALPHA = 15
+
+TOKEN_RE = re.compile(r"[a-z]+(?:'[a-z]+)?")
+
+def _normalize(word: str) -> str:
+    """Apply the tokenizer's contraction rewrite so lexicon words match tokens"""
+    return word.lower().replace("n't", "nt")
+
+NEGATORS = sorted({_normalize(word) for word in NEGATE if TOKEN_RE.fullmatch(_normalize(word))})
+
+# Multiplier change for the word after a booster ("very") or dampener ("slightly")
+BOOSTERS = {
+    _normalize(word): (BOOSTER_SCALAR - 1.0) * (1 if scalar > 0 else -1)
+    for word, scalar in BOOSTER_DICT.items()
+    if TOKEN_RE.fullmatch(_normalize(word))
+}
+
+def load_vader_valences(path: str = VADER_LEXICON_PATH) -> dict:
+    """Valence (-4..+4) of every single-word entry in VADER's lexicon"""
+    valences = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            word, valence = line.split("\t")[:2]
+            word = _normalize(word)
+            if TOKEN_RE.fullmatch(word):
+                valences[word] = float(valence)
+    return valences
+
+def load_nrc_emotions(path: str) -> dict:
+    """word -> set of emotions from the NRC Emotion Lexicon word-level file"""
+    emotions = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            parts = line.strip().split("\t")
+            if len(parts) == 3 and parts[1] in EMOTIONS and parts[2] == "1":
+                emotions.setdefault(parts[0], set()).add(parts[1])
+    return emotions
+
+class EmotionLexiconEngine:
+    """Array-backed emotion lexicon with batched scoring"""
+
+    def __init__(self, emotion_tags: str = EMOTION_TAGS, valences: dict = None,
+                 nrc_path: str = NRC_EMOTION_LEXICON):
+        valences = load_vader_valences() if valences is None else valences
+        emotions = load_nrc_emotions(nrc_path) if nrc_path else {}
+        for word, *tags in (line.split() for line in emotion_tags.strip().splitlines() if line.strip()):
+            emotions.setdefault(word, set()).update(tags)
+
+        words = sorted(set(valences) | set(emotions) | set(NEGATORS) | set(BOOSTERS))
+        # Row 0 is the all-zero row for out-of-vocabulary tokens
+        self.vocab = {word: i + 1 for i, word in enumerate(words)}
+
+        n_emotions = len(EMOTIONS)
+        self.valence_col = n_emotions
+        self.negator_col = n_emotions + 1
+        self.booster_col = n_emotions + 2
+        self.matrix = np.zeros((len(words) + 1, n_emotions + 3), dtype=np.float32)
+
+        emotion_index = {name: i for i, name in enumerate(EMOTIONS)}
+        for word, valence in valences.items():
+            self.matrix[self.vocab[word], self.valence_col] = valence
+        for word, tags in emotions.items():
+            for emotion in tags:
+                self.matrix[self.vocab[word], emotion_index[emotion]] = 1.0
+        for word in NEGATORS:
+            self.matrix[self.vocab[word], self.negator_col] = 1.0
+        for word, change in BOOSTERS.items():
+            self.matrix[self.vocab[word], self.booster_col] = change
+
+    def _token_ids(self, texts: List[str]):
+        """
+        Tokenize every text once. Each text is prefixed with NEGATION_WINDOW
+        out-of-vocabulary sentinels, so no text is empty and negation/booster
+        windows never reach into the previous text.
+        """
+        vocab_get = self.vocab.get
+        padding = [0] * NEGATION_WINDOW
+        ids, lengths = [], []
+        for text in texts:
+            tokens = TOKEN_RE.findall(text.lower().replace("n't", "nt"))
+            ids.extend(padding)
+            ids.extend(vocab_get(token, 0) for token in tokens)
+            lengths.append(len(tokens) + NEGATION_WINDOW)
+        return np.array(ids, dtype=np.intp), lengths
+
+    def score_arrays(self, texts: List[str]):
+        """Return (emotion_totals [n, E], polarity [n]) for a batch of texts"""
+        ids, lengths = self._token_ids(texts)
+        rows = self.matrix[ids]
+
+        # Negators within the NEGATION_WINDOW tokens before each token, via a running sum
+        negators = np.cumsum(rows[:, self.negator_col])
+        window = negators.copy()
+        window[NEGATION_WINDOW:] -= negators[:-NEGATION_WINDOW]
+        negated = np.zeros(len(ids), dtype=np.float32)
+        negated[1:] = window[:-1] > 0
+        boost = np.ones(len(ids), dtype=np.float32)
+        boost[1:] += rows[:-1, self.booster_col]
+
+        # Emotions are dropped when negated; valence is flipped and dampened like VADER
+        rows[:, :self.valence_col] *= (boost * (1.0 - negated))[:, None]
+        rows[:, self.valence_col] *= boost * (1.0 + (NEGATION_SCALAR - 1.0) * negated)
+
+        if len(lengths) == 1:
+            totals = rows[:, :self.valence_col + 1].sum(axis=0, keepdims=True)
+        else:
+            starts = np.zeros(len(lengths), dtype=np.intp)
+            np.cumsum(lengths[:-1], out=starts[1:])
+            totals = np.add.reduceat(rows[:, :self.valence_col + 1], starts, axis=0)
+
+        valence = totals[:, self.valence_col]
+        polarity = valence / np.sqrt(valence * valence + NORMALIZATION_ALPHA)  # always within (-1, 1)
+        return totals[:, :self.valence_col], polarity
+
+class EmotionLexiconAnalyzer:
+    """Drop-in alternative to SentimentAnalyzer that also reports per-emotion scores"""
+
+    def __init__(self, engine: EmotionLexiconEngine = None):
+        self.engine = engine or EmotionLexiconEngine()
+
+    def analyze(self, text: str) -> dict:
+        return self.analyze_batch([text])[0]
+
+    def analyze_batch(self, texts: List[str]) -> List[dict]:
+        emotions, polarity = self.engine.score_arrays(texts)
+        totals = emotions.sum(axis=1, keepdims=True)
+        shares = np.divide(emotions, totals, out=np.zeros_like(emotions), where=totals > 0)
+
+        results = []
+        for share_row, total, compound in zip(shares.tolist(), totals[:, 0].tolist(), polarity.tolist()):
+            # Same thresholds as SentimentAnalyzer so routing behaves identically
+            if compound >= 0.05:
+                sentiment = "positive"
+            elif compound <= -0.05:
+                sentiment = "negative"
+            else:
+                sentiment = "neutral"
+
+            severity = "normal"
+            if sentiment == "negative":
+                if compound <= -0.75:
+                    severity = "severe"
+                elif compound <= -0.4:
+                    severity = "moderate"
+
+            results.append({
+                "sentiment": sentiment,
+                "severity": severity,
+                "score": round(compound, 4),
+                "emotions": {name: round(v, 4) for name, v in zip(EMOTIONS, share_row)},
+                "dominant_emotion": EMOTIONS[share_row.index(max(share_row))] if total > 0 else None
+            })
+        return results
@@ -0,0 +1,114 @@
+# src/export.py
+"""
+Streaming export of a user's chat history as NDJSON or CSV.
+
+Archived batches are emitted first (they are the oldest), then the hot rows.
+Rows are read through a server-side cursor (yield_per), encoded into ~64 KB
+chunks and optionally gzipped on the fly, so memory use stays flat no matter
+how many messages the account has.
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from typing import Iterator, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from .archive import ARCHIVE_COLUMNS, iter_archived_rows
+from .database import ChatMessage, to_naive_utc
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+# Same columns as the archive payload so both sources produce identical records
+EXPORT_COLUMNS = ARCHIVE_COLUMNS
+EXPORT_FIELDS = [column.key for column in EXPORT_COLUMNS]
+
+CHUNK_BYTES = 64 * 1024
+FETCH_ROWS = 1000
+
+# ============ ROW SOURCE ============
+
+def iter_chat_rows(db: Session, user_id: int, start: Optional[datetime] = None,
+                   end: Optional[datetime] = None) -> Iterator[dict]:
+    """Yield a user's messages oldest first as plain dicts, FETCH_ROWS at a time"""
+    start, end = to_naive_utc(start), to_naive_utc(end)
+    yield from iter_archived_rows(db, user_id, start, end)
+
+    stmt = (
+        select(*EXPORT_COLUMNS)
+        .where(ChatMessage.user_id == user_id)
+        .order_by(ChatMessage.id)
+    )
+    if start:
+        stmt = stmt.where(ChatMessage.timestamp >= start)
+    if end:
+        stmt = stmt.where(ChatMessage.timestamp < end)
+
+    result = db.execute(stmt, execution_options={"stream_results": True, "yield_per": FETCH_ROWS})
+    for row in result:
+        record = row._asdict()
+        if record["timestamp"] is not None:
+            record["timestamp"] = record["timestamp"].isoformat()
+        yield record
+
+# ============ ENCODERS ============
+
+def encode_ndjson(records: Iterator[dict]) -> Iterator[bytes]:
+    """One JSON object per line, flushed in CHUNK_BYTES pieces"""
+    buffer, size = [], 0
+    for record in records:
+        line = json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n"
+        buffer.append(line)
+        size += len(line)
+        if size >= CHUNK_BYTES:
+            yield b"".join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield b"".join(buffer)
+
+def encode_csv(records: Iterator[dict]) -> Iterator[bytes]:
+    """CSV with a header row, flushed in CHUNK_BYTES pieces"""
+    text = io.StringIO()
+    writer = csv.DictWriter(text, fieldnames=EXPORT_FIELDS)
+    writer.writeheader()
+    for record in records:
+        writer.writerow(record)
+        if text.tell() >= CHUNK_BYTES:
+            yield text.getvalue().encode("utf-8")
+            text.seek(0)
+            text.truncate()
+    if text.tell():
+        yield text.getvalue().encode("utf-8")
+
+def gzip_chunks(chunks: Iterator[bytes], level: int = 6) -> Iterator[bytes]:
+    """Compress a byte stream into a single gzip member as it is produced"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+# ============ EXPORT ============
+
+def stream_chat_export(session_factory, user_id: int, fmt: str = "ndjson", compress: bool = False,
+                       start: Optional[datetime] = None, end: Optional[datetime] = None) -> Iterator[bytes]:
+    """
+    Produce the export body. Opens its own session because the response is
+    streamed after the request's dependency-managed session has been closed.
+    """
+    encode = encode_csv if fmt == "csv" else encode_ndjson
+    db = session_factory()
+    try:
+        chunks = encode(iter_chat_rows(db, user_id, start, end))
+        if compress:
+            chunks = gzip_chunks(chunks)
+        yield from chunks
+    finally:
+        db.close()
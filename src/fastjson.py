@@ -0,0 +1,36 @@
+# src/fastjson.py
+"""
+Lean JSON encoding for large responses.
+
+Uses orjson when it is installed (several times faster than the standard
+library, encodes datetimes natively and writes bytes directly) and falls
+back to json otherwise. Endpoints return FastJSONResponse directly, which
+skips response_model validation and jsonable_encoder's extra copy of the
+data; the response_model is still used for the API docs.
+"""
+import json
+from datetime import date, datetime
+
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:  # standard library fallback produces the same JSON, just slower
+    orjson = None
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {value.__class__.__name__} is not JSON serializable")
+
+def dumps(content) -> bytes:
+    """Encode to UTF-8 JSON bytes; naive datetimes become ISO 8601 strings"""
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return dumps(content)
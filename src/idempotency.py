@@ -0,0 +1,144 @@
+# src/idempotency.py
+"""
+Idempotency-Key support for /chat.
+
+The first request with a given key claims it by inserting a row; the
+primary key on (user_id, key) makes the claim atomic across threads and
+worker processes. It then runs the LLM call and stores the reply on the
+row. A repeat of the key returns the stored reply without calling the
+model again, or, while the original is still running, waits up to
+IDEMPOTENCY_WAIT_SECONDS for it to finish. If the original fails, its
+claim is released so the retry runs for real. A claim left behind by a
+crashed worker is taken over after IDEMPOTENCY_LEASE_SECONDS.
+
+Keys are kept for IDEMPOTENCY_TTL_HOURS; the maintenance scheduler
+(src/maintenance.py) purges expired rows.
+"""
+import hashlib
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy import delete, insert, select, tuple_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .database import IdempotencyKey
+
+IDEMPOTENCY_TTL_HOURS = float(os.getenv("IDEMPOTENCY_TTL_HOURS", "24"))
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "60"))
+IDEMPOTENCY_LEASE_SECONDS = float(os.getenv("IDEMPOTENCY_LEASE_SECONDS", "180"))
+MAX_KEY_LENGTH = 255
+
+def request_hash(user_id: int, message: str) -> str:
+    """What a key is bound to; the history is left out since clients rebuild it on retry"""
+    return hashlib.sha256(f"{user_id}\n{message}".encode("utf-8")).hexdigest()
+
+def _try_claim(db: Session, user_id: int, key: str, fingerprint: str) -> Optional[IdempotencyKey]:
+    """Claim the key; None if this request now owns it, else the existing row"""
+    now = datetime.utcnow()
+    try:
+        db.execute(insert(IdempotencyKey).values(
+            user_id=user_id, key=key, request_hash=fingerprint, claimed_at=now, created_at=now
+        ))
+        db.commit()
+        return None
+    except IntegrityError:
+        db.rollback()
+
+    row = db.get(IdempotencyKey, (user_id, key), populate_existing=True)
+    if row is None:
+        return _try_claim(db, user_id, key, fingerprint)  # released or purged in between
+
+    expired = row.created_at < now - timedelta(hours=IDEMPOTENCY_TTL_HOURS)
+    abandoned = row.status == "in_progress" and row.claimed_at < now - timedelta(seconds=IDEMPOTENCY_LEASE_SECONDS)
+    if expired or abandoned:
+        # Only one of several concurrent takeovers matches the old claimed_at
+        taken = db.execute(
+            update(IdempotencyKey)
+            .where(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key,
+                   IdempotencyKey.claimed_at == row.claimed_at)
+            .values(request_hash=fingerprint, status="in_progress", reply=None, message_id=None,
+                    claimed_at=now, created_at=now)
+        ).rowcount
+        db.commit()
+        if taken:
+            return None
+        row = db.get(IdempotencyKey, (user_id, key), populate_existing=True)
+        if row is None:
+            return _try_claim(db, user_id, key, fingerprint)
+    return row
+
+def begin(db: Session, user_id: int, key: str, message: str) -> Optional[str]:
+    """
+    Start handling a request with an Idempotency-Key. Returns the stored
+    reply for a repeat, or None when this request owns the key and must
+    call complete() or release().
+    """
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Idempotency-Key must be 1-{MAX_KEY_LENGTH} characters.")
+    fingerprint = request_hash(user_id, message)
+
+    deadline = time.monotonic() + IDEMPOTENCY_WAIT_SECONDS
+    delay = 0.05
+    while True:
+        row = _try_claim(db, user_id, key, fingerprint)
+        if row is None:
+            return None
+        if row.request_hash != fingerprint:
+            db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Idempotency-Key was already used for a different message."
+            )
+        if row.status == "completed":
+            reply = row.reply
+            db.rollback()
+            return reply
+
+        # Still running elsewhere; end the transaction so the next read sees its commit
+        db.rollback()
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="A request with this Idempotency-Key is still being processed.",
+                headers={"Retry-After": "5"}
+            )
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, 0.5)
+
+def complete(db: Session, user_id: int, key: str, reply: str, message_id: int = None):
+    """Store the reply so repeats of the key get it"""
+    db.execute(
+        update(IdempotencyKey)
+        .where(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key)
+        .values(status="completed", reply=reply, message_id=message_id)
+    )
+    db.commit()
+
+def release(db: Session, user_id: int, key: str):
+    """Give up an in-progress claim after a failure so a retry runs again"""
+    db.rollback()
+    db.execute(
+        delete(IdempotencyKey)
+        .where(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key,
+               IdempotencyKey.status == "in_progress")
+    )
+    db.commit()
+
+def purge_expired(db: Session, batch_size: int = 500) -> int:
+    """Delete up to batch_size keys older than the retention period"""
+    cutoff = datetime.utcnow() - timedelta(hours=IDEMPOTENCY_TTL_HOURS)
+    expired = (
+        select(IdempotencyKey.user_id, IdempotencyKey.key)
+        .where(IdempotencyKey.created_at < cutoff)
+        .limit(batch_size)
+    )
+    purged = db.execute(
+        delete(IdempotencyKey).where(tuple_(IdempotencyKey.user_id, IdempotencyKey.key).in_(expired))
+    ).rowcount
+    db.commit()
+    return purged
@@ -0,0 +1,103 @@
+# src/lifecycle.py
+"""
+In-flight request tracking and graceful drain for shutdowns and redeploys.
+
+On SIGTERM (Render/Docker redeploys, StopServer.sh) the server first enters
+a drain phase: readiness reports false, new chat requests get 503 with
+Retry-After, and in-flight LLM calls and their DB writes are given up to
+DRAIN_GRACE_SECONDS to finish. Only then is uvicorn's own shutdown triggered.
+"""
+import os
+import signal
+import threading
+import time
+
+DRAIN_GRACE_SECONDS = float(os.getenv("DRAIN_GRACE_SECONDS", "30"))
+DRAIN_RETRY_AFTER_SECONDS = int(os.getenv("DRAIN_RETRY_AFTER_SECONDS", "5"))
+
+class DrainController:
+    """Counts in-flight requests and refuses new ones once draining starts"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._draining = False
+        self.drain_started_at = None
+
+    @property
+    def draining(self) -> bool:
+        return self._draining
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def try_enter(self) -> bool:
+        """Register a new request; False if the server is draining"""
+        with self._cond:
+            if self._draining:
+                return False
+            self._in_flight += 1
+            return True
+
+    def exit(self):
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def begin_drain(self) -> bool:
+        """Stop admitting requests; False if a drain was already under way"""
+        with self._cond:
+            if self._draining:
+                return False
+            self._draining = True
+            self.drain_started_at = time.monotonic()
+            return True
+
+    def wait_idle(self, timeout: float) -> bool:
+        """Block until no requests are in flight; False if the grace period ran out"""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._in_flight == 0, timeout)
+
+    def drain(self, grace: float = DRAIN_GRACE_SECONDS) -> bool:
+        """Begin draining (if not already) and wait for in-flight requests"""
+        self.begin_drain()
+        if self._in_flight == 0:
+            return True
+        print(f"Draining: waiting up to {grace:.0f}s for {self._in_flight} in-flight request(s)")
+        finished = self.wait_idle(grace)
+        if finished:
+            print("Drain complete")
+        else:
+            print(f"Drain grace period expired with {self._in_flight} request(s) still running")
+        return finished
+
+    def install_signal_handlers(self, grace: float = DRAIN_GRACE_SECONDS):
+        """
+        Wrap the server's SIGTERM/SIGINT handlers (uvicorn installs its own
+        before the startup event runs) so the drain happens before the
+        server starts shutting down. A second signal skips the drain.
+        """
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            previous = signal.getsignal(sig)
+            if not callable(previous):
+                continue
+
+            def handler(signum, frame, previous=previous):
+                if not self.begin_drain():
+                    previous(signum, frame)
+                    return
+
+                def drain_then_exit():
+                    self.drain(grace)
+                    previous(signum, frame)
+
+                threading.Thread(target=drain_then_exit, name="drain", daemon=True).start()
+
+            try:
+                signal.signal(sig, handler)
+            except ValueError:
+                # Not on the main thread (e.g. under a test client); shutdown_event still drains
+                return
+
+drain_controller = DrainController()
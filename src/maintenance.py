@@ -0,0 +1,253 @@
+# src/maintenance.py
+"""
+Scheduled in-process maintenance for the token and account tables.
+
+Every MAINTENANCE_INTERVAL_SECONDS a background thread runs each job:
+
+    reset_tokens       password reset tokens that are used or expired
+    unverified_users   accounts never verified within MAINTENANCE_UNVERIFIED_DAYS
+                       (accounts that have chat data are kept)
+    idempotency_keys   /chat Idempotency-Keys past their retention
+
+Jobs delete in batches of MAINTENANCE_BATCH_SIZE rows, one short
+transaction each, and stop when MAINTENANCE_MAX_SECONDS is used up; the
+rest waits for the next run. A lease row in maintenance_locks makes sure
+only one worker process runs a job at a time. The last report (rows
+purged and time taken per job) is served at /health/maintenance.
+
+Run once by hand with: python -m src.maintenance [--job reset_tokens]
+"""
+import argparse
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, delete, update, insert, distinct, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .database import (
+    SessionLocal,
+    User,
+    PasswordResetToken,
+    ChatMessage,
+    ChatMessageArchive,
+    MaintenanceLock,
+    chat_session,
+    shard_for_user,
+    init_db,
+)
+from . import idempotency
+
+MAINTENANCE_ENABLED = os.getenv("MAINTENANCE_ENABLED", "1") == "1"
+MAINTENANCE_INTERVAL_SECONDS = float(os.getenv("MAINTENANCE_INTERVAL_SECONDS", "3600"))
+MAINTENANCE_BATCH_SIZE = int(os.getenv("MAINTENANCE_BATCH_SIZE", "500"))
+MAINTENANCE_MAX_SECONDS = float(os.getenv("MAINTENANCE_MAX_SECONDS", "10"))
+MAINTENANCE_BATCH_PAUSE_SECONDS = float(os.getenv("MAINTENANCE_BATCH_PAUSE_SECONDS", "0.01"))
+MAINTENANCE_UNVERIFIED_DAYS = float(os.getenv("MAINTENANCE_UNVERIFIED_DAYS", "7"))
+
+# Identifies this process in maintenance_locks
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+# ============ DB LOCK ============
+
+def acquire_lock(db: Session, name: str, lease_seconds: float, owner: str = WORKER_ID) -> bool:
+    """Take the named lease, or an expired one; False if another worker holds it"""
+    now = datetime.utcnow()
+    expires_at = now + timedelta(seconds=lease_seconds)
+    try:
+        db.execute(insert(MaintenanceLock).values(name=name, owner=owner, expires_at=expires_at))
+        db.commit()
+        return True
+    except IntegrityError:
+        db.rollback()
+    taken = db.execute(
+        update(MaintenanceLock)
+        .where(MaintenanceLock.name == name, MaintenanceLock.expires_at < now)
+        .values(owner=owner, expires_at=expires_at)
+    ).rowcount
+    db.commit()
+    return bool(taken)
+
+def release_lock(db: Session, name: str, owner: str = WORKER_ID):
+    db.rollback()
+    db.execute(delete(MaintenanceLock).where(MaintenanceLock.name == name, MaintenanceLock.owner == owner))
+    db.commit()
+
+# ============ JOBS ============
+# Each job is a generator that deletes one batch per step, commits, and yields the rows deleted
+
+def purge_reset_tokens(db: Session, batch_size: int):
+    while True:
+        ids = db.execute(
+            select(PasswordResetToken.id)
+            .where(or_(PasswordResetToken.used == True, PasswordResetToken.expires_at < datetime.utcnow()))
+            .limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            return
+        deleted = db.execute(delete(PasswordResetToken).where(PasswordResetToken.id.in_(ids))).rowcount
+        db.commit()
+        yield deleted
+
+def _users_with_chat_data(db: Session, user_ids: list) -> set:
+    by_shard = {}
+    for user_id in user_ids:
+        by_shard.setdefault(shard_for_user(user_id), []).append(user_id)
+    found = set()
+    for ids in by_shard.values():
+        with chat_session(db, ids[0]) as chat_db:
+            for model in (ChatMessage, ChatMessageArchive):
+                found.update(chat_db.execute(
+                    select(distinct(model.user_id)).where(model.user_id.in_(ids))
+                ).scalars())
+    return found
+
+def purge_unverified_users(db: Session, batch_size: int):
+    cutoff = datetime.utcnow() - timedelta(days=MAINTENANCE_UNVERIFIED_DAYS)
+    last_id = 0
+    while True:
+        ids = db.execute(
+            select(User.id)
+            .where(User.is_verified == False, User.created_at < cutoff, User.id > last_id)
+            .order_by(User.id)
+            .limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            return
+        last_id = ids[-1]
+        keep = _users_with_chat_data(db, ids)
+        doomed = [user_id for user_id in ids if user_id not in keep]
+        deleted = 0
+        if doomed:
+            # Re-checked in the DELETE so an account verified in the meantime survives
+            deleted = db.execute(
+                delete(User).where(User.id.in_(doomed), User.is_verified == False)
+            ).rowcount
+        db.commit()
+        yield deleted
+
+def purge_idempotency_keys(db: Session, batch_size: int):
+    while True:
+        deleted = idempotency.purge_expired(db, batch_size)
+        if not deleted:
+            return
+        yield deleted
+
+JOBS = {
+    "reset_tokens": purge_reset_tokens,
+    "unverified_users": purge_unverified_users,
+    "idempotency_keys": purge_idempotency_keys,
+}
+
+# ============ RUNNING ============
+
+def run_job(name: str, job, session_factory=SessionLocal, batch_size: int = MAINTENANCE_BATCH_SIZE,
+            max_seconds: float = MAINTENANCE_MAX_SECONDS) -> dict:
+    """Run one job under its lock and time budget; returns its report"""
+    report = {"rows": 0, "batches": 0, "seconds": 0.0, "complete": False, "skipped": None}
+    lock_name = f"maintenance:{name}"
+    started = time.perf_counter()
+    db = session_factory()
+    try:
+        if not acquire_lock(db, lock_name, lease_seconds=max_seconds + 60):
+            report["skipped"] = "locked by another worker"
+            return report
+        try:
+            batches = job(db, batch_size)
+            while True:
+                try:
+                    deleted = next(batches)
+                except StopIteration:
+                    report["complete"] = True
+                    break
+                report["rows"] += deleted
+                report["batches"] += 1
+                if time.perf_counter() - started >= max_seconds:
+                    break
+                time.sleep(MAINTENANCE_BATCH_PAUSE_SECONDS)  # let request writes in between batches
+        finally:
+            release_lock(db, lock_name)
+    except Exception as e:
+        db.rollback()
+        report["error"] = str(e)
+    finally:
+        db.close()
+        report["seconds"] = round(time.perf_counter() - started, 3)
+    return report
+
+def run_maintenance(jobs: list = None, session_factory=SessionLocal, batch_size: int = MAINTENANCE_BATCH_SIZE,
+                    max_seconds: float = MAINTENANCE_MAX_SECONDS) -> dict:
+    """Run the given jobs (default: all) and print what each did"""
+    reports = {}
+    for name in jobs or JOBS:
+        report = reports[name] = run_job(name, JOBS[name], session_factory, batch_size, max_seconds)
+        if report["skipped"]:
+            print(f"Maintenance {name}: skipped ({report['skipped']})")
+        elif "error" in report:
+            print(f"Maintenance {name}: failed after {report['seconds']:.2f}s: {report['error']}")
+        else:
+            note = "" if report["complete"] else " (time budget reached, continuing next run)"
+            print(f"Maintenance {name}: purged {report['rows']} rows in {report['batches']} batches, "
+                  f"{report['seconds']:.2f}s{note}")
+    return reports
+
+# ============ SCHEDULER ============
+
+class MaintenanceState:
+    """Last maintenance run, reported by /health/maintenance"""
+
+    def __init__(self):
+        self.enabled = MAINTENANCE_ENABLED
+        self.last_run = None
+        self.reports = {}
+
+    def as_dict(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "interval_seconds": MAINTENANCE_INTERVAL_SECONDS,
+            "last_run": self.last_run.isoformat() if self.last_run else None,
+            "jobs": self.reports,
+        }
+
+maintenance_state = MaintenanceState()
+_stop = threading.Event()
+
+def _schedule(interval: float):
+    # A random first delay spreads the workers of one deploy apart
+    if _stop.wait(random.uniform(30, 90)):
+        return
+    while True:
+        maintenance_state.reports = run_maintenance()
+        maintenance_state.last_run = datetime.utcnow()
+        if _stop.wait(interval):
+            return
+
+def start_maintenance():
+    """Start the maintenance thread next to the server (no-op when disabled)"""
+    if not MAINTENANCE_ENABLED:
+        return
+    _stop.clear()
+    threading.Thread(
+        target=_schedule, args=(MAINTENANCE_INTERVAL_SECONDS,), name="maintenance", daemon=True
+    ).start()
+
+def stop_maintenance():
+    _stop.set()
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the maintenance jobs once")
+    parser.add_argument("--job", action="append", choices=list(JOBS), help="job to run (default: all)")
+    parser.add_argument("--batch-size", type=int, default=MAINTENANCE_BATCH_SIZE)
+    parser.add_argument("--max-seconds", type=float, default=MAINTENANCE_MAX_SECONDS, help="time budget per job")
+    args = parser.parse_args()
+
+    init_db()
+    run_maintenance(args.job, batch_size=args.batch_size, max_seconds=args.max_seconds)
+
+if __name__ == "__main__":
+    main()
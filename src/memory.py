@@ -0,0 +1,329 @@
+# src/memory.py
+"""
+Long-term semantic memory over a user's past conversations.
+
+Every saved user message is embedded and appended to that user's vector
+index on disk (float32 matrix files plus a file of message ids, read
+through np.memmap). At chat time the new message is embedded, scored
+against every stored row and the top-k past turns are added to the prompt. The last
+MEMORY_SKIP_RECENT rows are left out because the client already sends
+the recent conversation. Messages moved to the archive are blanked out of
+the index (src.archive calls MemoryIndex.remove), so recall only returns
+hot rows. Off unless MEMORY_ENABLED=1.
+
+Embeddings come from a local sentence-transformers model when
+MEMORY_EMBEDDER names one and the package is installed, otherwise from a
+hashed bag of words and bigrams (no model, no network). Indexes live under
+MEMORY_INDEX_DIR in a directory per embedder, so switching embedders
+starts clean. Rebuild them from the database (e.g. after src.reshard,
+which renumbers messages, or on a fresh disk) with the server stopped:
+
+    python -m src.memory --rebuild [--user-id 42]
+"""
+import argparse
+import os
+import threading
+import time
+import zlib
+
+import numpy as np
+from sqlalchemy import select, distinct
+
+from .database import ChatMessage, chat_session, init_db, shard_sessions
+from .emotion import TOKEN_RE
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are still serialized within the process
+    fcntl = None
+
+try:
+    from sentence_transformers import SentenceTransformer
+except ImportError:  # the hashed embedder needs nothing beyond numpy
+    SentenceTransformer = None
+
+MEMORY_ENABLED = os.getenv("MEMORY_ENABLED", "0") == "1"
+MEMORY_INDEX_DIR = os.getenv("MEMORY_INDEX_DIR", "./memory_index")
+MEMORY_EMBEDDER = os.getenv("MEMORY_EMBEDDER", "hashing")  # or a sentence-transformers model name
+MEMORY_DIM = int(os.getenv("MEMORY_DIM", "256"))  # hashed embedder only
+MEMORY_TOP_K = int(os.getenv("MEMORY_TOP_K", "3"))
+MEMORY_MIN_SCORE = float(os.getenv("MEMORY_MIN_SCORE", "0.25"))
+MEMORY_SKIP_RECENT = int(os.getenv("MEMORY_SKIP_RECENT", "10"))
+MEMORY_BLOCK_ROWS = int(os.getenv("MEMORY_BLOCK_ROWS", "4096"))
+
+STOPWORDS = frozenset("""
+a about am an and are as at be been but by can could did do does for from had has have he her him his
+how i i'm im if in is it it's its just me my of on or our she so that the their them then there they
+this to was we were what when which who will with would you your
+""".split())
+
+# ============ EMBEDDERS ============
+
+class HashingEmbedder:
+    """Signed feature hashing of words and word pairs into a fixed-size unit vector"""
+
+    def __init__(self, dim: int = MEMORY_DIM):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def _features(self, text: str):
+        words = [w for w in TOKEN_RE.findall(text.lower()) if w not in STOPWORDS]
+        for word in words:
+            yield word, 1.0
+        for first, second in zip(words, words[1:]):
+            yield f"{first} {second}", 0.5
+
+    def embed(self, texts: list) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, weight in self._features(text):
+                h = zlib.crc32(feature.encode("utf-8"))
+                vectors[row, h % self.dim] += weight if (h >> 31) & 1 else -weight
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+class SentenceEmbedder:
+    """A local sentence-transformers model, run on the CPU"""
+
+    def __init__(self, model_name: str):
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self.name = model_name.replace("/", "_")
+
+    def embed(self, texts: list) -> np.ndarray:
+        vectors = self.model.encode(texts, normalize_embeddings=True, convert_to_numpy=True)
+        return vectors.astype(np.float32, copy=False)
+
+def load_embedder(name: str = MEMORY_EMBEDDER):
+    if name != "hashing":
+        if SentenceTransformer is not None:
+            return SentenceEmbedder(name)
+        print(f"sentence-transformers is not installed; using hashed embeddings instead of {name}")
+    return HashingEmbedder()
+
+# ============ PER-USER INDEX ============
+
+class MemoryIndex:
+    """
+    Per-user vector files searched through np.memmap.
+
+    <user>.rows holds every vector row-major and <user>.ids the matching
+    message ids; both are append-only apart from rows blanked by remove().
+    Every MEMORY_BLOCK_ROWS rows are
+    also copied column-major into <user>.cols, so a search over hashed
+    embeddings (only a few non-zero dimensions per query) reads just those
+    columns instead of the whole matrix. The .cols file is a derived copy:
+    an incomplete block is ignored and rewritten.
+    """
+
+    def __init__(self, root: str = MEMORY_INDEX_DIR, embedder=None, block_rows: int = MEMORY_BLOCK_ROWS):
+        self.embedder = embedder or load_embedder()
+        self.root = os.path.join(root, self.embedder.name)
+        self.block_rows = block_rows
+        self._lock = threading.Lock()
+
+    def _paths(self, user_id: int):
+        base = os.path.join(self.root, str(user_id % 1000), str(user_id))
+        return base + ".rows", base + ".ids", base + ".cols"
+
+    def count(self, user_id: int) -> int:
+        """Rows that have both a vector and an id (a crash between the two appends loses the row)"""
+        rows_path, ids_path, _ = self._paths(user_id)
+        if not os.path.exists(ids_path):
+            return 0
+        return min(os.path.getsize(rows_path) // (self.embedder.dim * 4), os.path.getsize(ids_path) // 8)
+
+    def _sealed_blocks(self, cols_path: str, rows: int) -> int:
+        if not os.path.exists(cols_path):
+            return 0
+        block_bytes = self.embedder.dim * self.block_rows * 4
+        return min(os.path.getsize(cols_path) // block_bytes, rows // self.block_rows)
+
+    def _seal(self, user_id: int, rows: int):
+        """Copy any newly completed blocks into the column-major file"""
+        rows_path, _, cols_path = self._paths(user_id)
+        sealed, target = self._sealed_blocks(cols_path, rows), rows // self.block_rows
+        if target <= sealed:
+            return
+        vectors = np.memmap(rows_path, dtype=np.float32, mode="r", shape=(rows, self.embedder.dim))
+        with open(cols_path, "ab") as cols_file:
+            cols_file.truncate(sealed * self.embedder.dim * self.block_rows * 4)
+            for block in range(sealed, target):
+                start = block * self.block_rows
+                cols_file.write(np.ascontiguousarray(vectors[start:start + self.block_rows].T).tobytes())
+
+    def add(self, user_id: int, message_ids: list, texts: list):
+        """Embed texts and append them to the user's index"""
+        if not texts:
+            return
+        vectors = self.embedder.embed(texts)
+        ids = np.asarray(message_ids, dtype=np.int64)
+        rows_path, ids_path, _ = self._paths(user_id)
+        os.makedirs(os.path.dirname(rows_path), exist_ok=True)
+
+        with self._lock, open(rows_path, "ab") as rows_file, open(ids_path, "ab") as ids_file:
+            if fcntl is not None:
+                fcntl.flock(rows_file, fcntl.LOCK_EX)  # other worker processes append to the same files
+            try:
+                # Drop a partial row left by an interrupted append so rows stay aligned
+                rows = self.count(user_id)
+                rows_file.truncate(rows * self.embedder.dim * 4)
+                ids_file.truncate(rows * 8)
+                rows_file.write(vectors.tobytes())
+                rows_file.flush()
+                ids_file.write(ids.tobytes())
+                ids_file.flush()
+                self._seal(user_id, rows + len(ids))
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(rows_file, fcntl.LOCK_UN)
+
+    def remove(self, user_id: int, message_ids: list) -> int:
+        """
+        Blank out the rows of messages that left the hot table (archived) and
+        return how many were found. Zero vectors score 0, below any useful
+        min_score; their ids become -1 and are never returned.
+        """
+        rows_path, ids_path, cols_path = self._paths(user_id)
+        if not message_ids or not os.path.exists(ids_path):
+            return 0
+        with self._lock, open(rows_path, "r+b") as rows_file:
+            if fcntl is not None:
+                fcntl.flock(rows_file, fcntl.LOCK_EX)
+            try:
+                rows = self.count(user_id)
+                if not rows:
+                    return 0
+                ids = np.memmap(ids_path, dtype=np.int64, mode="r+", shape=(rows,))
+                hits = np.flatnonzero(np.isin(ids, np.asarray(message_ids, dtype=np.int64)))
+                if not len(hits):
+                    return 0
+                dim = self.embedder.dim
+                vectors = np.memmap(rows_path, dtype=np.float32, mode="r+", shape=(rows, dim))
+                vectors[hits] = 0
+                vectors.flush()
+                sealed = self._sealed_blocks(cols_path, rows)
+                in_blocks = hits[hits < sealed * self.block_rows]
+                if len(in_blocks):
+                    cols = np.memmap(cols_path, dtype=np.float32, mode="r+", shape=(sealed, dim, self.block_rows))
+                    cols[in_blocks // self.block_rows, :, in_blocks % self.block_rows] = 0
+                    cols.flush()
+                ids[hits] = -1
+                ids.flush()
+                return len(hits)
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(rows_file, fcntl.LOCK_UN)
+
+    def search(self, user_id: int, text: str, k: int = MEMORY_TOP_K, skip_recent: int = 0,
+               min_score: float = MEMORY_MIN_SCORE) -> list:
+        """(message_id, score) for the k rows most similar to text, best first"""
+        rows = self.count(user_id) - skip_recent
+        query = self.embedder.embed([text])[0]
+        active = np.flatnonzero(query)
+        if rows <= 0 or k <= 0 or not len(active):
+            return []
+        dim = self.embedder.dim
+        rows_path, ids_path, cols_path = self._paths(user_id)
+
+        scores = np.empty(rows, dtype=np.float32)
+        sealed_rows = self._sealed_blocks(cols_path, rows) * self.block_rows
+        if sealed_rows:
+            cols = np.memmap(cols_path, dtype=np.float32, mode="r",
+                             shape=(sealed_rows // self.block_rows, dim, self.block_rows))
+            if len(active) < dim // 4:
+                scores[:sealed_rows] = (query[active] @ cols[:, active, :]).reshape(-1)
+            else:
+                scores[:sealed_rows] = (query @ cols).reshape(-1)
+        if rows > sealed_rows:
+            tail = np.memmap(rows_path, dtype=np.float32, mode="r", offset=sealed_rows * dim * 4,
+                             shape=(rows - sealed_rows, dim))
+            scores[sealed_rows:] = tail @ query
+
+        top = np.argpartition(-scores, k - 1)[:k] if rows > k else np.arange(rows)
+        top = top[np.argsort(-scores[top])]
+        ids = np.memmap(ids_path, dtype=np.int64, mode="r", shape=(rows,))
+        return [(int(ids[i]), float(scores[i])) for i in top if scores[i] >= min_score and ids[i] >= 0]
+
+    def rebuild(self, db, user_id: int, batch_size: int = 1000) -> int:
+        """Re-embed every hot message of a user and swap in the new index; returns rows indexed"""
+        rows_path, ids_path, cols_path = self._paths(user_id)
+        os.makedirs(os.path.dirname(rows_path), exist_ok=True)
+
+        indexed = 0
+        with chat_session(db, user_id) as chat_db, \
+                open(rows_path + ".tmp", "wb") as rows_file, open(ids_path + ".tmp", "wb") as ids_file:
+            result = chat_db.execute(
+                select(ChatMessage.id, ChatMessage.message)
+                .where(ChatMessage.user_id == user_id)
+                .order_by(ChatMessage.id),
+                execution_options={"stream_results": True, "yield_per": batch_size}
+            )
+            for partition in result.partitions():
+                rows_file.write(self.embedder.embed([row.message or "" for row in partition]).tobytes())
+                ids_file.write(np.asarray([row.id for row in partition], dtype=np.int64).tobytes())
+                indexed += len(partition)
+
+        with self._lock:
+            if os.path.exists(cols_path):
+                os.remove(cols_path)
+            os.replace(rows_path + ".tmp", rows_path)
+            os.replace(ids_path + ".tmp", ids_path)
+            self._seal(user_id, indexed)
+        return indexed
+
+# ============ PROMPT CONTEXT ============
+
+def recall(db, user_id: int, text: str, index: "MemoryIndex" = None, k: int = MEMORY_TOP_K) -> list:
+    """The user's past turns most relevant to text, oldest first, as ChatMessage rows"""
+    index = index or memory_index
+    # Over-fetch: rows archived before remove() existed, or deleted since, still have vectors
+    hits = index.search(user_id, text, 2 * k, skip_recent=MEMORY_SKIP_RECENT)
+    if not hits:
+        return []
+    with chat_session(db, user_id) as chat_db:
+        found = {
+            row.id: row
+            for row in chat_db.query(ChatMessage).filter(
+                ChatMessage.user_id == user_id, ChatMessage.id.in_([message_id for message_id, _ in hits])
+            )
+        }
+    best = [found[message_id] for message_id, _ in hits if message_id in found][:k]
+    return sorted(best, key=lambda row: row.id)
+
+def format_memories(rows: list, max_reply_chars: int = 300) -> str:
+    if not rows:
+        return ""
+    lines = ["Relevant things the user said in earlier conversations:"]
+    for row in rows:
+        day = row.timestamp.date().isoformat() if row.timestamp else "earlier"
+        reply = (row.response or "")[:max_reply_chars]
+        lines.append(f"- ({day}) User: {row.message}\n  Assistant: {reply}")
+    return "\n".join(lines) + "\n"
+
+memory_index = MemoryIndex() if MEMORY_ENABLED else None
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the long-term memory vector indexes from the database")
+    parser.add_argument("--rebuild", action="store_true", required=True)
+    parser.add_argument("--user-id", type=int, help="only this user (default: every user)")
+    args = parser.parse_args()
+
+    init_db()
+    index = memory_index or MemoryIndex()
+    started = time.perf_counter()
+    users, rows = 0, 0
+    for factory in shard_sessions:
+        with factory() as db:
+            if args.user_id is not None:
+                user_ids = [args.user_id] if factory is shard_sessions[0] else []
+            else:
+                user_ids = db.execute(select(distinct(ChatMessage.user_id))).scalars().all()
+            for user_id in user_ids:
+                rows += index.rebuild(db, user_id)  # chat_session routes to the user's shard
+                users += 1
+    print(f"Indexed {rows} messages for {users} users in {time.perf_counter() - started:.1f}s "
+          f"({index.embedder.name}, {index.root})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+# src/migrate.py
+"""
+One-off schema migration for the main database and every chat shard.
+
+Creates missing tables and columns (as the server does on startup) and
+then the indexes added to existing tables since they were created, which
+the server only reports. Run it once per deploy, before starting the
+workers. Index statements use IF NOT EXISTS, and on Postgres they are built
+CONCURRENTLY, so it is safe to run against a live database and to repeat.
+
+Run with: python -m src.migrate [--dry-run]
+"""
+import argparse
+import time
+
+from .database import (
+    engine,
+    shard_engines,
+    CHAT_TABLES,
+    upgrade_schema,
+    missing_indexes,
+    create_missing_indexes
+)
+
+def target_engines() -> list:
+    """(engine, tables) for the main database and each distinct chat shard"""
+    targets = [(engine, None)]
+    for shard_engine in shard_engines:
+        if shard_engine is not engine:
+            targets.append((shard_engine, CHAT_TABLES))
+    return targets
+
+def main():
+    parser = argparse.ArgumentParser(description="Create missing tables, columns and indexes")
+    parser.add_argument("--dry-run", action="store_true", help="only list the indexes that would be created")
+    args = parser.parse_args()
+
+    for db_engine, tables in target_engines():
+        url = db_engine.url.render_as_string(hide_password=True)
+        if args.dry_run:
+            with db_engine.connect() as conn:
+                missing = missing_indexes(conn)
+            print(f"{url}: {', '.join(missing) or 'no missing indexes'}")
+            continue
+
+        started = time.perf_counter()
+        upgrade_schema(db_engine, tables=tables)
+        created = create_missing_indexes(db_engine)
+        print(f"{url}: {len(created)} indexes created in {time.perf_counter() - started:.1f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+# src/profiling.py
+"""
+On-demand sampling profiler for individual requests.
+
+A request is profiled when it carries X-Profile: <PROFILE_ADMIN_TOKEN>, or
+at random for PROFILE_SAMPLE_RATE of requests under PROFILE_PATH_PREFIX.
+While it runs, a sampler thread reads the stacks of the threads serving it
+every PROFILE_INTERVAL_MS. The threads are the event loop, which parses and
+validates the request (samples where it is idle are dropped), and the
+worker thread that runs the endpoint. Two files are written to PROFILE_DIR:
+
+    <id>.speedscope.json   open at https://www.speedscope.app
+    <id>.summary.json      wall time per stage and per package
+
+Stages are marked in the code with `with stage("name"):`. The package
+breakdown credits each sample to the innermost frame outside the standard
+library (pydantic, langchain_core, google, sqlalchemy, vaderSentiment, the
+app's own modules, ...), so a Gemini call and a slow query show up under
+their own library. Other requests served by the event loop while a request
+is profiled also appear in its samples.
+
+With neither setting present the middleware is not installed, and stage()
+returns a shared no-op context manager after one ContextVar lookup.
+"""
+import contextlib
+import contextvars
+import hmac
+import json
+import os
+import random
+import sys
+import sysconfig
+import threading
+import time
+import uuid
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", "./profiles")
+PROFILE_ADMIN_TOKEN = os.getenv("PROFILE_ADMIN_TOKEN", "")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))  # 0.01 = 1% of requests
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_PATH_PREFIX = os.getenv("PROFILE_PATH_PREFIX", "/chat")
+
+PROFILING_ENABLED = bool(PROFILE_ADMIN_TOKEN) or PROFILE_SAMPLE_RATE > 0
+
+_STDLIB = sysconfig.get_paths()["stdlib"]
+# Where an idle event loop sits: waiting for sockets, or (under a test client) for the portal's future
+_IDLE_FILES = tuple(os.path.join(_STDLIB, name) for name in ("selectors.py", "threading.py"))
+_APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_active = contextvars.ContextVar("active_profile", default=None)
+_stage_path = contextvars.ContextVar("stage_path", default="")
+_NULL_STAGE = contextlib.nullcontext()
+
+# ============ REQUEST PROFILE ============
+
+class RequestProfile:
+    """Stack samples and stage timings for one request"""
+
+    def __init__(self, name: str, interval_ms: float = PROFILE_INTERVAL_MS):
+        self.id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.name = name
+        self.interval = interval_ms / 1000
+        self.stages = {}  # "route.llm" -> total ms
+        self.threads = {}  # thread id -> label
+        self.loop_thread = None  # idle samples of this thread are dropped
+        self.samples = {}  # thread id -> [(stack of frame indexes, weight ms)]
+        self.frames = []
+        self._frame_index = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler = None
+        self.started = None
+        self.total_ms = None
+
+    def watch_current_thread(self, label: str = None):
+        ident = threading.get_ident()
+        if ident not in self.threads:
+            with self._lock:
+                self.threads[ident] = label or threading.current_thread().name
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._sampler = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+        self._sampler.start()
+
+    def stop(self):
+        self._stop.set()
+        self._sampler.join()
+        self.total_ms = (time.perf_counter() - self.started) * 1000
+
+    def _frame(self, code) -> int:
+        key = (getattr(code, "co_qualname", code.co_name), code.co_filename, code.co_firstlineno)
+        index = self._frame_index.get(key)
+        if index is None:
+            index = self._frame_index[key] = len(self.frames)
+            self.frames.append(key)
+        return index
+
+    def _run(self):
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            weight = (now - last) * 1000
+            last = now
+            with self._lock:
+                threads = list(self.threads)
+            current = sys._current_frames()
+            for ident in threads:
+                frame = current.get(ident)
+                stack = []
+                while frame is not None:
+                    stack.append(self._frame(frame.f_code))
+                    frame = frame.f_back
+                if not stack:
+                    continue
+                if ident == self.loop_thread and self.frames[stack[0]][1].startswith(_IDLE_FILES):
+                    continue
+                self.samples.setdefault(ident, []).append((stack[::-1], weight))
+
+    # ============ OUTPUT ============
+
+    def _package(self, filename: str):
+        """Package name for a frame's file, or None for the standard library"""
+        if filename.startswith(_APP_DIR):
+            return "app:" + os.path.basename(filename)
+        for marker in ("site-packages" + os.sep, "dist-packages" + os.sep):
+            if marker in filename:
+                return filename.split(marker, 1)[1].split(os.sep, 1)[0].removesuffix(".py")
+        if filename.startswith(_STDLIB) or filename.startswith("<"):
+            return None
+        return os.path.basename(filename)
+
+    def package_breakdown(self) -> dict:
+        """ms per package, crediting each sample to its innermost non-stdlib frame"""
+        totals = {}
+        for samples in self.samples.values():
+            for stack, weight in samples:
+                package = None
+                for index in reversed(stack):
+                    package = self._package(self.frames[index][1])
+                    if package:
+                        break
+                key = package or "python"
+                totals[key] = totals.get(key, 0.0) + weight
+        return {k: round(v, 1) for k, v in sorted(totals.items(), key=lambda item: -item[1])}
+
+    def speedscope(self) -> dict:
+        profiles = []
+        for ident, samples in self.samples.items():
+            profiles.append({
+                "type": "sampled",
+                "name": f"{self.name} [{self.threads.get(ident, ident)}]",
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": round(sum(weight for _, weight in samples), 3),
+                "samples": [stack for stack, _ in samples],
+                "weights": [round(weight, 3) for _, weight in samples],
+            })
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": [{"name": name, "file": file, "line": line} for name, file, line in self.frames]},
+            "profiles": profiles,
+            "name": self.name,
+            "exporter": "Emotion-Aware-AI-Chatbot src.profiling",
+        }
+
+    def summary(self, status_code: int = None) -> dict:
+        top_level = sum(ms for name, ms in self.stages.items() if "." not in name)
+        return {
+            "id": self.id,
+            "request": self.name,
+            "status_code": status_code,
+            "total_ms": round(self.total_ms, 1),
+            "stages_ms": {name: round(ms, 1) for name, ms in self.stages.items()},
+            # Outside every stage: body parsing and validation, dependencies, serialization, middleware
+            "unstaged_ms": round(max(self.total_ms - top_level, 0.0), 1),
+            "packages_ms": self.package_breakdown(),
+            "samples": sum(len(samples) for samples in self.samples.values()),
+            "interval_ms": self.interval * 1000,
+        }
+
+    def save(self, directory: str = None, status_code: int = None) -> str:
+        directory = directory or PROFILE_DIR
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, self.id)
+        with open(base + ".speedscope.json", "w", encoding="utf-8") as f:
+            json.dump(self.speedscope(), f, separators=(",", ":"))
+        with open(base + ".summary.json", "w", encoding="utf-8") as f:
+            json.dump(self.summary(status_code), f, indent=2)
+        return base
+
+# ============ STAGES ============
+
+@contextlib.contextmanager
+def _timed_stage(profile: RequestProfile, name: str):
+    path = f"{_stage_path.get()}.{name}" if _stage_path.get() else name
+    token = _stage_path.set(path)
+    profile.watch_current_thread()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = (time.perf_counter() - start) * 1000
+        _stage_path.reset(token)
+        with profile._lock:
+            profile.stages[path] = profile.stages.get(path, 0.0) + elapsed
+
+def stage(name: str):
+    """Time a block as a named stage of the request being profiled; a no-op otherwise"""
+    profile = _active.get()
+    if profile is None:
+        return _NULL_STAGE
+    return _timed_stage(profile, name)
+
+@contextlib.contextmanager
+def profiling(name: str):
+    """Profile the enclosed block, run from the event loop, and any thread entering a stage"""
+    profile = RequestProfile(name)
+    token = _active.set(profile)
+    profile.watch_current_thread("event loop")
+    profile.loop_thread = threading.get_ident()
+    profile.start()
+    try:
+        yield profile
+    finally:
+        profile.stop()
+        _active.reset(token)
+
+# ============ MIDDLEWARE ============
+
+def should_profile(request) -> bool:
+    if PROFILE_ADMIN_TOKEN:
+        supplied = request.headers.get("X-Profile", "")
+        if supplied and hmac.compare_digest(supplied.encode(), PROFILE_ADMIN_TOKEN.encode()):
+            return True
+    return PROFILE_SAMPLE_RATE > 0 and request.url.path.startswith(PROFILE_PATH_PREFIX) \
+        and random.random() < PROFILE_SAMPLE_RATE
+
+async def profile_requests(request, call_next):
+    """HTTP middleware; only registered when PROFILING_ENABLED"""
+    if not should_profile(request):
+        return await call_next(request)
+
+    with profiling(f"{request.method} {request.url.path}") as profile:
+        response = await call_next(request)
+    try:
+        base = profile.save(status_code=response.status_code)
+        print(f"Profiled {profile.name} in {profile.total_ms:.0f} ms -> {base}.speedscope.json")
+    except OSError as e:
+        print(f"Could not write profile {profile.id}: {e}")
+    response.headers["X-Profile-Id"] = profile.id
+    return response
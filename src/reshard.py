@@ -0,0 +1,178 @@
+# src/reshard.py
+"""
+Move chat data from one shard layout to another.
+
+Every user whose shard changes under the new layout has their messages,
+archived batches and mood rollups copied to the new shard and then deleted
+from the old one. Run it with the server stopped, then restart with the new
+CHAT_SHARD_URLS. To shard an existing single database, leave CHAT_SHARD_URLS
+unset and --from defaults to DATABASE_URL.
+
+Message ids are assigned by the target database, so moved users get new ids
+in the same order. Before moving anyone the shard layout version on the
+main database is bumped; the server reports it as the history epoch, so
+clients drop their cursors and resync. Rebuild the long-term memory indexes, which refer to
+message ids, with python -m src.memory --rebuild. Archived batches are
+unpacked into hot rows on the target; run python -m src.archive
+afterwards to archive them again.
+
+An interrupted run can simply be repeated. Each copy first clears any
+partial copy on the target, and source rows are only deleted after the
+target has committed.
+
+Run with: python -m src.reshard --to "sqlite:///chat0.db,sqlite:///chat1.db,sqlite:///chat2.db"
+          [--from URLS] [--batch-size 1000] [--dry-run]
+"""
+import argparse
+import time
+from datetime import datetime
+
+from sqlalchemy import select, insert, delete, union
+from sqlalchemy.orm import Session, sessionmaker
+
+from .archive import decode_batch
+from .database import (
+    DATABASE_URL,
+    CHAT_SHARD_URLS,
+    Base,
+    ChatMessage,
+    ChatMessageArchive,
+    DataVersion,
+    MoodDailyRollup,
+    SHARD_LAYOUT_VERSION,
+    bump_data_version,
+    create_db_engine,
+    init_chat_shard,
+    shard_for_user,
+)
+
+CHAT_MODELS = [ChatMessage, ChatMessageArchive, MoodDailyRollup]
+# Every message column except the id, which the target assigns
+COPY_COLUMNS = [column for column in ChatMessage.__table__.columns if column.key != "id"]
+
+def parse_urls(value: str) -> list:
+    return [url.strip() for url in value.split(",") if url.strip()]
+
+def chat_user_ids(db: Session) -> list:
+    """Every user with any chat data on this database"""
+    stmt = union(*(select(model.user_id) for model in CHAT_MODELS))
+    return sorted(db.execute(stmt).scalars().all())
+
+# ============ MOVING ONE USER ============
+
+def copy_user(src: Session, dst: Session, user_id: int, batch_size: int = 1000) -> int:
+    """Replace user_id's chat data on dst with a copy from src; returns messages copied"""
+    for model in CHAT_MODELS:
+        dst.execute(delete(model).where(model.user_id == user_id))
+
+    copied = 0
+    # Archived rows first: they are the oldest, so the new ids keep the original order
+    pending = []
+    batches = src.query(ChatMessageArchive).filter(ChatMessageArchive.user_id == user_id)
+    for archive_batch in batches.order_by(ChatMessageArchive.first_message_id).yield_per(4):
+        for row in decode_batch(archive_batch):
+            row.pop("id")
+            if row["timestamp"]:
+                row["timestamp"] = datetime.fromisoformat(row["timestamp"])
+            pending.append({**row, "user_id": user_id})
+        if len(pending) >= batch_size:
+            dst.execute(insert(ChatMessage), pending)
+            copied += len(pending)
+            pending = []
+    if pending:
+        dst.execute(insert(ChatMessage), pending)
+        copied += len(pending)
+
+    hot = src.execute(
+        select(*COPY_COLUMNS).where(ChatMessage.user_id == user_id).order_by(ChatMessage.id),
+        execution_options={"stream_results": True, "yield_per": batch_size}
+    )
+    for partition in hot.partitions():
+        dst.execute(insert(ChatMessage), [dict(row._mapping) for row in partition])
+        copied += len(partition)
+
+    rollups = src.execute(
+        select(MoodDailyRollup.__table__).where(MoodDailyRollup.user_id == user_id)
+    ).mappings().all()
+    if rollups:
+        dst.execute(insert(MoodDailyRollup), [dict(row) for row in rollups])
+
+    dst.commit()
+    return copied
+
+def bump_layout_version(db: Session):
+    """Record a new shard layout on the main database"""
+    Base.metadata.create_all(db.get_bind(), tables=[DataVersion.__table__])
+    bump_data_version(db, SHARD_LAYOUT_VERSION)
+    db.commit()
+
+def delete_user(db: Session, user_id: int):
+    for model in CHAT_MODELS:
+        db.execute(delete(model).where(model.user_id == user_id))
+    db.commit()
+
+# ============ RESHARDING ============
+
+def reshard(from_urls: list, to_urls: list, batch_size: int = 1000, dry_run: bool = False,
+            primary_url: str = DATABASE_URL) -> dict:
+    """
+    Move every user whose shard differs between the layouts; returns totals.
+    primary_url is the main database, where the layout version is kept.
+    """
+    engines = {url: create_db_engine(url) for url in dict.fromkeys([primary_url] + from_urls + to_urls)}
+    sessions = {url: sessionmaker(bind=db_engine) for url, db_engine in engines.items()}
+    if not dry_run:
+        for url in dict.fromkeys(to_urls):
+            init_chat_shard(engines[url])
+
+    totals = {"moved_users": 0, "messages": 0}
+    all_users = set()
+    try:
+        for source_url in dict.fromkeys(from_urls):
+            with sessions[source_url]() as src:
+                for user_id in chat_user_ids(src):
+                    all_users.add(user_id)
+                    target_url = to_urls[shard_for_user(user_id, len(to_urls))]
+                    if target_url == source_url:
+                        continue
+                    totals["moved_users"] += 1
+                    if dry_run:
+                        continue
+                    if totals["moved_users"] == 1:
+                        # Before any ids change, so a crash part-way still invalidates client cursors
+                        with sessions[primary_url]() as db:
+                            bump_layout_version(db)
+                    with sessions[target_url]() as dst:
+                        totals["messages"] += copy_user(src, dst, user_id, batch_size)
+                    delete_user(src, user_id)
+    finally:
+        for db_engine in engines.values():
+            db_engine.dispose()
+    totals["users"] = len(all_users)
+    return totals
+
+def main():
+    parser = argparse.ArgumentParser(description="Move chat data to a new shard layout")
+    parser.add_argument("--from", dest="from_urls", default=",".join(CHAT_SHARD_URLS) or DATABASE_URL,
+                        help="current comma-separated shard URLs (default: CHAT_SHARD_URLS or DATABASE_URL)")
+    parser.add_argument("--to", dest="to_urls", required=True, help="new comma-separated shard URLs, in order")
+    parser.add_argument("--batch-size", type=int, default=1000, help="messages per insert")
+    parser.add_argument("--dry-run", action="store_true", help="only report how many users would move")
+    args = parser.parse_args()
+
+    from_urls, to_urls = parse_urls(args.from_urls), parse_urls(args.to_urls)
+    started = time.perf_counter()
+    totals = reshard(from_urls, to_urls, args.batch_size, args.dry_run)
+    elapsed = time.perf_counter() - started
+
+    verb = "Would move" if args.dry_run else "Moved"
+    print(f"{verb} {totals['moved_users']} of {totals['users']} users "
+          f"({len(from_urls)} -> {len(to_urls)} shards)")
+    if not args.dry_run:
+        print(f"Copied {totals['messages']} messages in {elapsed:.1f}s "
+              f"({totals['messages'] / max(elapsed, 1e-9):.0f} messages/s)")
+        print("Restart the server with CHAT_SHARD_URLS set to the new list, "
+              "then run python -m src.memory --rebuild")
+
+if __name__ == "__main__":
+    main()
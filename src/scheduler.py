@@ -0,0 +1,121 @@
+# src/scheduler.py
+"""
+Priority scheduling for LLM calls.
+
+At most LLM_MAX_CONCURRENCY model calls run at once. When every slot is
+busy, waiting calls are ordered by priority class instead of arrival, so a
+distressed user isn't stuck behind casual chatter. Each class has an aging
+delay: a waiting call is served as if it had arrived that many seconds
+later, which means a low-priority call never waits more than its delay
+behind higher-priority work that arrived after it.
+
+Classes, from a message's routing outcome:
+    high      severe negative sentiment or crisis keywords
+    elevated  moderate negative sentiment or serious keywords
+    normal    everything else
+"""
+import heapq
+import itertools
+import os
+import statistics
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+
+# Seconds each class is held back relative to "high" while waiting for a slot
+PRIORITY_DELAYS = {
+    "high": 0.0,
+    "elevated": float(os.getenv("LLM_AGING_ELEVATED_SECONDS", "2")),
+    "normal": float(os.getenv("LLM_AGING_NORMAL_SECONDS", "6")),
+}
+
+WAIT_SAMPLES = 1000  # recent waits kept per class for percentiles
+
+def priority_for(outcome: dict) -> str:
+    """Priority class for a classify_message outcome"""
+    if outcome.get("severity") == "severe" or outcome.get("mental_health_level") == "crisis":
+        return "high"
+    if outcome.get("severity") == "moderate" or outcome.get("mental_health_level") == "serious":
+        return "elevated"
+    return "normal"
+
+class PriorityScheduler:
+    """Concurrency limit with an aged priority queue for the waiters"""
+
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY, delays: dict = None, clock=time.monotonic):
+        self.max_concurrency = max(max_concurrency, 1)
+        self.delays = dict(delays or PRIORITY_DELAYS)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._heap = []  # (virtual deadline, sequence, priority, granted event)
+        self._seq = itertools.count()
+        self._active = 0
+        self._queued = {name: 0 for name in self.delays}
+        self._served = {name: 0 for name in self.delays}
+        self._max_wait = {name: 0.0 for name in self.delays}
+        self._waits = {name: deque(maxlen=WAIT_SAMPLES) for name in self.delays}
+
+    def acquire(self, priority: str = "normal") -> float:
+        """Block until a slot is free for this call; returns seconds waited"""
+        if priority not in self.delays:
+            raise ValueError(f"Unknown priority class: {priority}")
+        enqueued = self._clock()
+        with self._lock:
+            if self._active < self.max_concurrency and not self._heap:
+                self._active += 1
+                self._record(priority, 0.0)
+                return 0.0
+            granted = threading.Event()
+            heapq.heappush(self._heap, (enqueued + self.delays[priority], next(self._seq), priority, granted))
+            self._queued[priority] += 1
+
+        granted.wait()
+        waited = self._clock() - enqueued
+        with self._lock:
+            self._record(priority, waited)
+        return waited
+
+    def release(self):
+        """Hand the slot to the most urgent waiter, or free it"""
+        with self._lock:
+            if self._heap:
+                _, _, priority, granted = heapq.heappop(self._heap)
+                self._queued[priority] -= 1
+                granted.set()  # the slot passes straight on, so _active is unchanged
+            else:
+                self._active -= 1
+
+    @contextmanager
+    def slot(self, priority: str = "normal"):
+        self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def _record(self, priority: str, waited: float):
+        self._served[priority] += 1
+        self._max_wait[priority] = max(self._max_wait[priority], waited)
+        self._waits[priority].append(waited)
+
+    def metrics(self) -> dict:
+        """Queue depth and wait times (ms) per priority class"""
+        with self._lock:
+            classes = {}
+            for name in self.delays:
+                waits = sorted(self._waits[name])
+                p95 = waits[min(len(waits) - 1, int(len(waits) * 0.95))] if waits else 0.0
+                classes[name] = {
+                    "queued": self._queued[name],
+                    "served": self._served[name],
+                    "wait_p50_ms": round(statistics.median(waits) * 1000, 1) if waits else 0.0,
+                    "wait_p95_ms": round(p95 * 1000, 1),
+                    "wait_max_ms": round(self._max_wait[name] * 1000, 1),
+                    "aging_delay_s": self.delays[name],
+                }
+            return {"max_concurrency": self.max_concurrency, "active": self._active, "classes": classes}
+
+llm_scheduler = PriorityScheduler()
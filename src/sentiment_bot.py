@@ -5,6 +5,15 @@ from langchain_core.prompts import PromptTemplate
 from dotenv import load_dotenv
 import os
 
+try:
+    from .emotion import EmotionLexiconAnalyzer
+    from .scheduler import llm_scheduler, priority_for
+    from .profiling import stage
+except ImportError:  # imported as a top-level module by chat.py
+    from emotion import EmotionLexiconAnalyzer
+    from scheduler import llm_scheduler, priority_for
+    from profiling import stage
+
 # 1. Load environment variables
 load_dotenv()
 
@@ -15,6 +24,9 @@ if not GOOGLE_API_KEY:
 
 os.environ["GOOGLE_API_KEY"] = GOOGLE_API_KEY
 
+# "vader" (default) or "emotion" for the NumPy multi-emotion lexicon engine
+SENTIMENT_ENGINE = os.getenv("SENTIMENT_ENGINE", "vader")
+
 
 # 2. VADER-based sentiment analyzer
 class SentimentAnalyzer:
@@ -69,8 +81,14 @@ def check_mental_health_concerns(user_input: str) -> str:
         return "serious"
     return "none"
 
-# 4. Initialize sentiment analyzer
+# 4. Initialize sentiment analyzers
 sentiment_analyzer = SentimentAnalyzer()
+emotion_analyzer = EmotionLexiconAnalyzer()
+
+ANALYZERS = {
+    "vader": sentiment_analyzer,
+    "emotion": emotion_analyzer,
+}
 
 # 5. Models for routed responses
 #positive_model = ChatGroq(model="llama-3.3-70b-versatile", temperature=0.7)
@@ -118,31 +136,61 @@ If you need immediate help:
 
 You don't have to go through this alone. Reaching out is a sign of strength."""
 
-# 8. Main routing function
-def route_by_sentiment(user_input: str) -> str:
+# 8. Routing classification
+def classify_message(user_input: str, engine: str = None) -> dict:
     """
-    Main entry point for the chatbot to process user input and return a response.
-    Used by chat.py and can be used by frontend applications.
+    Work out how a message will be routed without calling a model.
+    Returns the analyzer output plus the mental-health level and the routing tier
+    ("crisis", "serious", "positive", "negative" or "neutral").
+    engine selects the analyzer ("vader" or "emotion"); defaults to SENTIMENT_ENGINE.
     """
-    # Step 1: Check for mental health crisis keywords first
+    analyzer = ANALYZERS.get(engine or SENTIMENT_ENGINE)
+    if analyzer is None:
+        raise ValueError(f"Unknown sentiment engine: {engine or SENTIMENT_ENGINE}")
+
     mental_health_level = check_mental_health_concerns(user_input)
+    analysis = analyzer.analyze(user_input)
+
     if mental_health_level in ["crisis", "serious"]:
-        print(f"Mental health concern detected: {mental_health_level}")
-        return MENTAL_HEALTH_RESPONSE
+        tier = mental_health_level
+    else:
+        tier = analysis["sentiment"]
 
-    # Step 2: Analyze sentiment using VADER
-    analysis = sentiment_analyzer.analyze(user_input)
-    sentiment = analysis["sentiment"]
-    severity = analysis["severity"]
-    score = analysis["score"]
+    return {
+        **analysis,
+        "mental_health_level": mental_health_level,
+        "tier": tier
+    }
 
+# 9. Main routing function
+def route_message(user_input: str, engine: str = None, memory: str = "", context: str = "") -> dict:
+    """
+    Route a message and return the reply together with the routing outcome
+    (sentiment, severity, score and tier) so callers can persist it.
+    memory (recalled past turns) and context (the recent conversation) are
+    given to the model but not to the sentiment and mental-health
+    classification, which only sees the user's message.
+    """
+    with stage("classify"):
+        outcome = classify_message(user_input, engine)
+    sentiment = outcome["sentiment"]
+    severity = outcome["severity"]
+    score = outcome["score"]
+    mental_health_level = outcome["mental_health_level"]
+
+    # Step 1: Check for mental health crisis keywords first
+    if mental_health_level in ["crisis", "serious"]:
+        print(f"Mental health concern detected: {mental_health_level}")
+        return {**outcome, "reply": MENTAL_HEALTH_RESPONSE}
+
+    # Step 2: Sentiment was analyzed (VADER or emotion lexicon) during classification
     print(f"Detected sentiment: {sentiment} (severity: {severity}, score: {score:.2f})")
 
     # Step 3: Only trigger mental health response if BOTH severe AND contains concerning language
     # This prevents false positives like "I did bad on my exam"
     if severity == "severe" and sentiment == "negative" and mental_health_level == "serious":
         print("Severe emotional distress detected - providing mental health resources")
-        return MENTAL_HEALTH_RESPONSE
+        return {**outcome, "reply": MENTAL_HEALTH_RESPONSE}
 
     # Step 4: Route to appropriate model based on sentiment
     if sentiment == "positive":
@@ -152,8 +200,21 @@ def route_by_sentiment(user_input: str) -> str:
     else:
         chain = neutral_prompt | neutral_model
 
-    # Step 5: Generate and return response
-    response = chain.invoke({"user_input": user_input})
-    
-    # Return the content string (not the response object)
-    return response.content
\ No newline at end of file
+    # Step 5: Generate the response, waiting for a model slot by priority when all are busy
+    with stage("llm_queue"):
+        llm_scheduler.acquire(priority_for(outcome))
+    try:
+        with stage("llm"):
+            response = chain.invoke({"user_input": memory + context + user_input})
+    finally:
+        llm_scheduler.release()
+
+    # Keep the content string (not the response object)
+    return {**outcome, "reply": response.content}
+
+def route_by_sentiment(user_input: str, engine: str = None) -> str:
+    """
+    Main entry point for the chatbot to process user input and return a response.
+    Used by chat.py and can be used by frontend applications.
+    """
+    return route_message(user_input, engine)["reply"]
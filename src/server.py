@@ -1,15 +1,46 @@
 # src/server.py
 import os
+from itertools import islice
+from datetime import datetime, timedelta
 from typing import List, Optional
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Request, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel, EmailStr
 from sqlalchemy.orm import Session
 from dotenv import load_dotenv
 
-from .sentiment_bot import route_by_sentiment
-from .database import get_db, init_db, save_chat_message, get_user_by_id
+from .sentiment_bot import route_message
+from .archive import read_archived_messages, iter_archived_rows
+from .lifecycle import drain_controller, DRAIN_GRACE_SECONDS, DRAIN_RETRY_AFTER_SECONDS
+from .warmup import warmup_state, start_warmup, stop_warmup
+from .scheduler import llm_scheduler
+from .memory import memory_index, recall, format_memories
+from .profiling import PROFILING_ENABLED, profile_requests, stage
+from . import idempotency
+from .maintenance import maintenance_state, start_maintenance, stop_maintenance
+from .fastjson import FastJSONResponse
+from .export import EXPORT_FORMATS, stream_chat_export
+from .database import (
+    get_db,
+    chat_session,
+    chat_sessionmaker,
+    init_db,
+    shutdown_db,
+    save_chat_message,
+    get_user_by_id,
+    get_user_chat_history_rows,
+    get_chat_messages_after,
+    get_latest_chat_message_id,
+    get_data_version,
+    to_naive_utc,
+    get_mood_timeline,
+    CHAT_DATA_VERSION,
+    SHARD_LAYOUT_VERSION,
+    HISTORY_COLUMNS,
+    search_chat_messages
+)
 from .auth import (
     authenticate_user,
     register_user,
@@ -32,14 +63,47 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Idempotent-Replayed"],
 )
 
+# Track in-flight chat requests so shutdowns can drain them
+@app.middleware("http")
+async def track_in_flight_chats(request: Request, call_next):
+    if request.method != "POST" or not request.url.path.startswith("/chat"):
+        return await call_next(request)
+
+    if not drain_controller.try_enter():
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"detail": "Server is restarting. Please retry shortly."},
+            headers={"Retry-After": str(DRAIN_RETRY_AFTER_SECONDS)}
+        )
+    try:
+        return await call_next(request)
+    finally:
+        drain_controller.exit()
+
+# Opt-in per-request profiling; not installed at all unless configured
+if PROFILING_ENABLED:
+    app.middleware("http")(profile_requests)
+
 # Initialize database on startup
 @app.on_event("startup")
 async def startup_event():
     init_db()
+    start_warmup()
+    start_maintenance()
+    drain_controller.install_signal_handlers(DRAIN_GRACE_SECONDS)
     print("Server started successfully")
 
+@app.on_event("shutdown")
+def shutdown_event():
+    # Normally already drained by the signal handler; covers other shutdown paths
+    drain_controller.drain(DRAIN_GRACE_SECONDS)
+    stop_warmup()
+    stop_maintenance()
+    shutdown_db()
+
 # ============ REQUEST/RESPONSE MODELS ============
 
 class RegisterRequest(BaseModel):
@@ -83,9 +147,24 @@ class ChatResponse(BaseModel):
 class ChatHistoryResponse(BaseModel):
     messages: List[dict]
 
+class ChatDeltaResponse(BaseModel):
+    messages: List[dict]
+    latest_id: Optional[int] = None
+    has_more: bool = False
+    epoch: int = 0
+
+class ChatSearchResponse(BaseModel):
+    results: List[dict]
+    limit: int
+    offset: int
+
 class MessageResponse(BaseModel):
     message: str
 
+class MoodTimelineResponse(BaseModel):
+    user_id: int
+    days: List[dict]
+
 # ============ AUTHENTICATION ENDPOINTS ============
 
 @app.post("/auth/register", response_model=MessageResponse, status_code=status.HTTP_201_CREATED)
@@ -182,97 +261,344 @@ def reset_password_endpoint(req: ResetPasswordRequest, db: Session = Depends(get
 def resend_verification(email: EmailStr, db: Session = Depends(get_db)):
     """Resend verification email"""
     from .database import get_user_by_email
-    
+
     user = get_user_by_email(db, email)
     if not user:
         return MessageResponse(message="If that email exists, verification email sent.")
-    
+
     if user.is_verified:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already verified"
         )
-    
+
     token = create_verification_token(email)
     send_verification_email(email, token)
-    
+
     return MessageResponse(message="Verification email sent.")
 
 # ============ CHAT ENDPOINTS ============
 
+# Browsers must revalidate every time; the ETag makes that a cheap 304
+HISTORY_CACHE_CONTROL = "private, no-cache"
+HISTORY_FIELDS = tuple(column.key for column in HISTORY_COLUMNS)
+
+def _history_page(db: Session, user_id: int, limit: int, before_id: Optional[int] = None) -> List[dict]:
+    """
+    Newest-first page of hot rows, continued from the compressed archive.
+    Rows are column tuples zipped straight into dicts; timestamps are left
+    as datetimes for the encoder.
+    """
+    rows = get_user_chat_history_rows(db, user_id, limit, before_id)
+    messages = [dict(zip(HISTORY_FIELDS, row)) for row in rows]
+
+    # Past the hot rows: continue the page from the compressed archive
+    if len(messages) < limit:
+        cursor = messages[-1]["id"] if messages else before_id
+        archived = read_archived_messages(db, user_id, limit - len(messages), cursor)
+        messages.extend({key: row[key] for key in HISTORY_FIELDS} for row in archived)
+    return messages
+
+def get_chat_db(user_id: int, db: Session = Depends(get_db)):
+    """Dependency: session on the database holding user_id's chat data"""
+    with chat_session(db, user_id) as chat_db:
+        yield chat_db
+
+def get_chat_sessionmaker(user_id: int):
+    """Dependency: session factory for the database holding user_id's chat data"""
+    return chat_sessionmaker(user_id)
+
+def _history_epoch(db: Session) -> int:
+    """
+    Shard layout version. Message ids are per shard and get reassigned when a
+    user is resharded, so clients drop their cursor whenever it changes.
+    """
+    return get_data_version(db, SHARD_LAYOUT_VERSION)
+
+def _history_etag(chat_db: Session, user_id: int, latest_id: Optional[int], epoch: int) -> str:
+    """
+    Version tag for a user's history; the same tag is used by every history
+    URL. New messages change the newest id; rewrites of existing rows (a
+    sentiment backfill, archiving) bump the chat database's data version.
+    """
+    data_version = get_data_version(chat_db, CHAT_DATA_VERSION)
+    return f'W/"h{user_id}-{latest_id or 0}-v{data_version}-e{epoch}"'
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = [tag.strip() for tag in header.split(",")]
+    return "*" in tags or etag in tags or etag.removeprefix("W/") in tags
+
+def _not_modified(etag: str) -> Response:
+    headers = {"ETag": etag, "Cache-Control": HISTORY_CACHE_CONTROL}
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
 @app.get("/chat/history/{user_id}", response_model=ChatHistoryResponse)
-def get_chat_history(user_id: int, limit: int = 100, db: Session = Depends(get_db)):
-    """Get chat history for a user"""
+def get_chat_history(user_id: int, request: Request, limit: int = 100, before_id: Optional[int] = None,
+                     db: Session = Depends(get_db), chat_db: Session = Depends(get_chat_db)):
+    """Get chat history for a user, newest first; pass before_id to page further back"""
     # Verify user exists
     user = get_user_by_id(db, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found.")
-    
+
     try:
-        from .database import get_user_chat_history
-        messages = get_user_chat_history(db, user_id, limit)
-        
-        # Format messages for frontend
-        formatted_messages = [
+        latest_id = get_latest_chat_message_id(chat_db, user_id)
+        etag = _history_etag(chat_db, user_id, latest_id, _history_epoch(db))
+        if _etag_matches(request, etag):
+            return _not_modified(etag)
+
+        # Encoded directly (no pydantic pass): this is the hot path for large limits
+        headers = {"ETag": etag, "Cache-Control": HISTORY_CACHE_CONTROL}
+        return FastJSONResponse({"messages": _history_page(chat_db, user_id, limit, before_id)}, headers=headers)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/chat/history/{user_id}/delta", response_model=ChatDeltaResponse)
+def get_chat_history_delta(user_id: int, request: Request,
+                           after_id: Optional[int] = None, since: Optional[datetime] = None,
+                           limit: int = 200, db: Session = Depends(get_db),
+                           chat_db: Session = Depends(get_chat_db)):
+    """
+    Messages newer than after_id (or the since timestamp), oldest first.
+    Without either, returns the most recent `limit` messages to seed a client.
+    Send the last ETag as If-None-Match to get 304 when nothing has changed.
+    """
+    if limit < 1 or limit > 1000:
+        raise HTTPException(status_code=400, detail="limit must be between 1 and 1000.")
+
+    user = get_user_by_id(db, user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found.")
+
+    try:
+        latest_id = get_latest_chat_message_id(chat_db, user_id)
+        epoch = _history_epoch(db)
+        etag = _history_etag(chat_db, user_id, latest_id, epoch)
+        if _etag_matches(request, etag):
+            return _not_modified(etag)
+
+        since = to_naive_utc(since)
+
+        if after_id is None and since is None:
+            messages = list(reversed(_history_page(chat_db, user_id, limit)))
+            has_more = False
+        else:
+            since_iso = since.isoformat() if since else None
+            archived = (
+                {key: row[key] for key in HISTORY_FIELDS}
+                for row in iter_archived_rows(chat_db, user_id, start=since, after_id=after_id)
+                if since_iso is None or (row["timestamp"] or "") > since_iso
+            )
+            # Archived rows always have lower ids than hot rows, so they come first
+            messages = list(islice(archived, limit + 1))
+            if len(messages) <= limit:
+                hot = get_chat_messages_after(chat_db, user_id, after_id, since, limit + 1 - len(messages))
+                messages.extend(dict(zip(HISTORY_FIELDS, row)) for row in hot)
+            has_more = len(messages) > limit
+            messages = messages[:limit]
+
+        headers = {"ETag": etag, "Cache-Control": HISTORY_CACHE_CONTROL}
+        return FastJSONResponse(
+            {"messages": messages, "latest_id": latest_id, "has_more": has_more, "epoch": epoch},
+            headers=headers
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/chat/search", response_model=ChatSearchResponse)
+def search_chat(user_id: int, q: str, limit: int = 20, offset: int = 0, db: Session = Depends(get_db)):
+    """Full-text search over a user's chat history, best matches first"""
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="Search query cannot be empty.")
+
+    user = get_user_by_id(db, user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found.")
+
+    limit = min(max(limit, 1), 100)
+    offset = max(offset, 0)
+
+    try:
+        rows = search_chat_messages(db, user_id, q, limit=limit, offset=offset)
+        results = [
             {
-                "id": msg.id,
-                "message": msg.message,
-                "response": msg.response,
-                "sentiment": msg.sentiment,
-                "timestamp": msg.timestamp.isoformat() if msg.timestamp else None
+                "id": row["id"],
+                "message": row["message_snippet"],
+                "response": row["response_snippet"],
+                "rank": row["rank"],
+                "timestamp": row["timestamp"].isoformat() if row["timestamp"] else None
             }
-            for msg in messages
+            for row in rows
         ]
-        
-        return ChatHistoryResponse(messages=formatted_messages)
+        return ChatSearchResponse(results=results, limit=limit, offset=offset)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/chat/export/{user_id}")
+def export_chat_history(
+    user_id: int,
+    format: str = "ndjson",
+    gzip: bool = False,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    db: Session = Depends(get_db),
+    chat_factory=Depends(get_chat_sessionmaker)
+):
+    """Stream a user's full chat history as NDJSON or CSV, optionally gzipped"""
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported format. Use one of: {', '.join(EXPORT_FORMATS)}"
+        )
+
+    user = get_user_by_id(db, user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found.")
+
+    filename = f"chat-history-{user_id}.{format}"
+    media_type = EXPORT_FORMATS[format]
+    if gzip:
+        filename += ".gz"
+        media_type = "application/gzip"
+
+    return StreamingResponse(
+        stream_chat_export(chat_factory, user_id, format, gzip, start, end),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
 @app.post("/chat", response_model=ChatResponse)
-def chat(req: ChatRequest, db: Session = Depends(get_db)):
-    """Send a chat message with chat memory"""
+def chat(req: ChatRequest, request: Request, response: Response, db: Session = Depends(get_db)):
+    """Send a chat message with chat memory; an Idempotency-Key header makes retries safe"""
     msg = (req.message or "").strip()
     if not msg:
         raise HTTPException(status_code=400, detail="Message cannot be empty.")
-    
+
     # Verify user exists
-    user = get_user_by_id(db, req.user_id)
+    with stage("user_lookup"):
+        user = get_user_by_id(db, req.user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found.")
-    
+
+    # A repeated Idempotency-Key gets the original reply instead of a second LLM call
+    idempotency_key = request.headers.get("Idempotency-Key")
+    if idempotency_key is not None:
+        stored_reply = idempotency.begin(db, req.user_id, idempotency_key, msg)
+        if stored_reply is not None:
+            response.headers["Idempotent-Replayed"] = "true"
+            return ChatResponse(reply=stored_reply)
+
+    saved = None
     try:
         # Build context from chat history
-        context = ""
-        if req.chat_history:
-            context = "\nRecent conversation:\n"
-            for hist_msg in req.chat_history[-10:]:  # Last 10 messages
-                role_label = "User" if hist_msg.role == "user" else "Assistant"
-                context += f"{role_label}: {hist_msg.content}\n"
-            context += f"\nCurrent message: {msg}\n"
+        with stage("context"):
+            context = ""
+            if req.chat_history:
+                context = "\nRecent conversation:\n"
+                for hist_msg in req.chat_history[-10:]:  # Last 10 messages
+                    role_label = "User" if hist_msg.role == "user" else "Assistant"
+                    context += f"{role_label}: {hist_msg.content}\n"
+                context += f"\nCurrent message: {msg}\n"
         
-        # Get response with context
-        prompt_with_context = context + msg if context else msg
-        reply = route_by_sentiment(prompt_with_context)
+        # Recall relevant turns from earlier conversations
+        with stage("memory_recall"):
+            memory = format_memories(recall(db, req.user_id, msg, memory_index)) if memory_index else ""
+
+        # Get response with context; the stored outcome classifies msg alone, so
+        # earlier turns (e.g. a crisis-resources reply) don't leak into this row
+        with stage("route"):
+            outcome = route_message(msg, memory=memory, context=context)
+        reply = outcome["reply"]
         
-        # Save to database
-        save_chat_message(
-            db=db,
-            user_id=req.user_id,
-            message=msg,
-            response=reply,
-            sentiment="auto"
-        )
+        # Save to database along with how the message was routed
+        with stage("save"):
+            saved = save_chat_message(
+                db=db,
+                user_id=req.user_id,
+                message=msg,
+                response=reply,
+                sentiment=outcome["sentiment"],
+                severity=outcome["severity"],
+                score=outcome["score"],
+                tier=outcome["tier"]
+            )
+        if memory_index:
+            try:
+                with stage("memory_index"):
+                    memory_index.add(req.user_id, [saved.id], [msg])
+            except OSError as e:  # the message is saved; a rebuild can index it later
+                print(f"Memory index update failed for user {req.user_id}: {e}")
+        if idempotency_key is not None:
+            try:
+                idempotency.complete(db, req.user_id, idempotency_key, reply, saved.id)
+            except Exception as e:
+                # Keep the claim: releasing it would let a retry call the LLM and save the message again
+                print(f"Idempotency-Key completion failed for user {req.user_id}: {e}")
         
         return ChatResponse(reply=reply)
     except Exception as e:
+        if idempotency_key is not None and saved is None:
+            idempotency.release(db, req.user_id, idempotency_key)
         raise HTTPException(status_code=500, detail=str(e))
 
+# ============ ANALYTICS ENDPOINTS ============
+
+@app.get("/analytics/mood/{user_id}", response_model=MoodTimelineResponse)
+def get_mood_analytics(user_id: int, days: int = 90, db: Session = Depends(get_db)):
+    """Get a user's daily mood trend from the precomputed rollups"""
+    user = get_user_by_id(db, user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found.")
+
+    start_day = (datetime.utcnow() - timedelta(days=max(days, 1) - 1)).date()
+    rollups = get_mood_timeline(db, user_id, start_day=start_day)
+
+    formatted_days = [
+        {
+            "day": r.day.isoformat(),
+            "message_count": r.message_count,
+            "mean_score": r.compound_sum / r.scored_count if r.scored_count else None,
+            "min_score": r.compound_min,
+            "severity": {
+                "normal": r.normal_count,
+                "moderate": r.moderate_count,
+                "severe": r.severe_count
+            },
+            "crisis_count": r.crisis_count
+        }
+        for r in rollups
+    ]
+
+    return MoodTimelineResponse(user_id=user_id, days=formatted_days)
+
 # ============ HEALTH CHECK ============
 
 @app.get("/health")
 def health_check():
     return {"status": "healthy", "message": "Server is running"}
 
+@app.get("/health/ready")
+def readiness_check():
+    """Ready to receive traffic once warm-up has finished; 503 while warming up or draining"""
+    body = {"in_flight": drain_controller.in_flight, "warmup": warmup_state.as_dict()}
+    if drain_controller.draining or not warmup_state.ready:
+        body["status"] = "draining" if drain_controller.draining else "warming_up"
+        return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content=body)
+    return {"status": "ready", **body}
+
+@app.get("/health/maintenance")
+def maintenance_report():
+    """Rows purged and time taken by each maintenance job in the last run"""
+    return maintenance_state.as_dict()
+
+@app.get("/health/llm-queue")
+def llm_queue_metrics():
+    """LLM slot usage and queue-wait times per priority class"""
+    return llm_scheduler.metrics()
+
 # Mount static files (frontend)
 app.mount(
     "/",
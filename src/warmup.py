@@ -0,0 +1,133 @@
+# src/warmup.py
+"""
+Startup warm-up so the first requests after a deploy aren't slow.
+
+Runs in a background thread started next to init_db: pre-opens pooled DB
+connections, runs both sentiment analyzers and the prompt templates once,
+and makes a free count_tokens call on each Gemini model so its client,
+gRPC channel and TLS session are established. /health/ready reports ready
+only after this finishes. With WARMUP_KEEPALIVE_SECONDS set, the model
+connections and DB pool are pinged periodically so they don't go cold
+between bursts of traffic.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from google.ai.generativelanguage_v1beta.types import Content, Part
+from sqlalchemy import text
+from sqlalchemy.pool import QueuePool
+
+from .database import engine, shard_engines
+from .sentiment_bot import (
+    classify_message,
+    positive_prompt, negative_prompt, neutral_prompt,
+    positive_model, negative_model, neutral_model,
+)
+
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "1") == "1"
+WARMUP_DB_CONNECTIONS = int(os.getenv("WARMUP_DB_CONNECTIONS", "4"))
+WARMUP_MODEL_TIMEOUT_SECONDS = float(os.getenv("WARMUP_MODEL_TIMEOUT_SECONDS", "10"))
+WARMUP_KEEPALIVE_SECONDS = float(os.getenv("WARMUP_KEEPALIVE_SECONDS", "0"))  # 0 = off
+
+MODELS = {
+    "positive": positive_model,
+    "negative": negative_model,
+    "neutral": neutral_model,
+}
+
+class WarmupState:
+    """Outcome of the warm-up, reported by /health/ready"""
+
+    def __init__(self):
+        self.ready = not WARMUP_ENABLED
+        self.duration_ms = None
+        self.steps = {}  # step name -> last duration in ms, or the error message
+
+    def as_dict(self) -> dict:
+        return {"ready": self.ready, "duration_ms": self.duration_ms, "steps": self.steps}
+
+warmup_state = WarmupState()
+_stop = threading.Event()
+
+# ============ STEPS ============
+
+def warm_db_pool(connections: int = WARMUP_DB_CONNECTIONS):
+    """Check out several connections at once on each database so the pools keep them open"""
+    for db_engine in {id(e): e for e in [engine, *shard_engines]}.values():
+        if isinstance(db_engine.pool, QueuePool):
+            count = min(connections, db_engine.pool.size())
+        else:
+            count = 1  # per-thread or non-pooling pools have nothing to keep open
+        held = []
+        try:
+            for _ in range(max(1, count)):
+                conn = db_engine.connect()
+                held.append(conn)
+                conn.execute(text("SELECT 1"))
+        finally:
+            for conn in held:
+                conn.close()
+
+def warm_analyzers():
+    """Load lexicons and run both engines plus the prompt templates once"""
+    for engine_name in ("vader", "emotion"):
+        classify_message("Warming up, I feel good today", engine_name)
+    for prompt in (positive_prompt, negative_prompt, neutral_prompt):
+        prompt.invoke({"user_input": "warm up"})
+
+def warm_model(model):
+    """Free count_tokens RPC: builds the channel and TLS session without generating"""
+    model.client.count_tokens(
+        model=model.model,
+        contents=[Content(parts=[Part(text="warm up")])],
+        retry=None,  # one attempt; the default retry policy ignores timeout and runs for 60s
+        timeout=WARMUP_MODEL_TIMEOUT_SECONDS,
+    )
+
+def _timed(name: str, fn, *args):
+    start = time.perf_counter()
+    try:
+        fn(*args)
+        warmup_state.steps[name] = round((time.perf_counter() - start) * 1000, 1)
+    except Exception as e:
+        # A slow or unreachable dependency must not keep the instance out of rotation forever
+        warmup_state.steps[name] = f"error: {e.__class__.__name__}: {str(e)[:200]}"
+
+# ============ RUNNER ============
+
+def run_warmup():
+    """Run every warm-up step; model calls go out in parallel"""
+    start = time.perf_counter()
+    _timed("db_pool", warm_db_pool)
+    _timed("analyzers", warm_analyzers)
+    with ThreadPoolExecutor(max_workers=len(MODELS)) as pool:
+        for name, model in MODELS.items():
+            pool.submit(_timed, f"model_{name}", warm_model, model)
+
+    warmup_state.duration_ms = round((time.perf_counter() - start) * 1000, 1)
+    warmup_state.ready = True
+    print(f"Warm-up finished in {warmup_state.duration_ms:.0f} ms: {warmup_state.steps}")
+
+def keep_warm(interval: float):
+    """Ping the models and DB pool every interval seconds until shutdown"""
+    while not _stop.wait(interval):
+        for name, model in MODELS.items():
+            _timed(f"keepalive_model_{name}", warm_model, model)
+        _timed("keepalive_db_pool", warm_db_pool, 1)
+
+def start_warmup():
+    """Kick off warm-up (and the optional keep-warm loop) without blocking startup"""
+    if not WARMUP_ENABLED:
+        return
+
+    def worker():
+        run_warmup()
+        if WARMUP_KEEPALIVE_SECONDS > 0:
+            keep_warm(WARMUP_KEEPALIVE_SECONDS)
+
+    threading.Thread(target=worker, name="warmup", daemon=True).start()
+
+def stop_warmup():
+    _stop.set()
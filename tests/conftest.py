@@ -0,0 +1,65 @@
+"""
+Shared fixtures: a throwaway SQLite database per test, a helper to seed it
+with chat messages, and an API client whose get_db uses that database.
+"""
+import os
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from src.database import Base, ChatMessage, User, get_db
+
+
+@pytest.fixture
+def db_factory(tmp_path):
+    """Session factory for a fresh file database with every table created"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def add_messages(db_factory):
+    """
+    Insert `count` chat messages for a user. message and response are format
+    strings over the row number i; timestamp, if given, maps i to a datetime.
+    """
+    def add(count, user_id=1, message="message {i}", response="response {i}", timestamp=None, **fields):
+        with db_factory.kw["bind"].begin() as conn:
+            for start in range(0, count, 50000):
+                rows = []
+                for i in range(start, min(start + 50000, count)):
+                    row = {"user_id": user_id, "message": message.format(i=i),
+                           "response": response.format(i=i), **fields}
+                    if timestamp is not None:
+                        row["timestamp"] = timestamp(i)
+                    rows.append(row)
+                conn.execute(insert(ChatMessage), rows)
+
+    return add
+
+
+@pytest.fixture
+def api_client(db_factory):
+    """TestClient for the app with get_db and chat data on db_factory's database and one user, id 1"""
+    from src.server import app, get_chat_sessionmaker
+
+    with db_factory.kw["bind"].begin() as conn:
+        conn.execute(insert(User), [{"username": "kim", "email": "kim@example.com", "hashed_password": "x"}])
+
+    def override_get_db():
+        db = db_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_chat_sessionmaker] = lambda: db_factory
+    yield TestClient(app)
+    app.dependency_overrides.clear()
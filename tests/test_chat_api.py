@@ -77,3 +77,73 @@ def test_auth_endpoints_exist():
     })
     # Should not return 404 (endpoint exists)
     assert response.status_code != 404, "Login endpoint should exist"
+
+
+def test_chat_rejected_while_draining(monkeypatch):
+    """New chats get 503 with Retry-After and readiness fails once a drain begins"""
+    from src.lifecycle import drain_controller
+    from src.warmup import warmup_state
+
+    monkeypatch.setattr(warmup_state, "ready", True)
+    assert client.get("/health/ready").status_code == 200
+
+    monkeypatch.setattr(drain_controller, "_draining", True)
+    response = client.post("/chat", json={"message": "Hello", "user_id": 1, "chat_history": []})
+    assert response.status_code == 503
+    assert "Retry-After" in response.headers
+    assert client.get("/health/ready").json()["status"] == "draining"
+    # Non-chat endpoints keep working during the drain
+    assert client.get("/health").status_code == 200
+
+
+def test_ready_waits_for_warmup(monkeypatch):
+    """Readiness reports warming_up until the startup warm-up has finished"""
+    from src.warmup import warmup_state
+
+    monkeypatch.setattr(warmup_state, "ready", False)
+    response = client.get("/health/ready")
+    assert response.status_code == 503
+    assert response.json()["status"] == "warming_up"
+
+
+def test_llm_queue_metrics():
+    """Queue-wait metrics are reported for every priority class"""
+    response = client.get("/health/llm-queue")
+    assert response.status_code == 200
+    data = response.json()
+    assert set(data["classes"]) == {"high", "elevated", "normal"}
+    assert data["active"] >= 0
+
+
+def test_saved_outcome_classifies_only_the_new_message(api_client, db_factory, monkeypatch):
+    """Earlier turns reach the model but not the sentiment and tier stored for the message"""
+    from langchain_core.messages import AIMessage
+    from langchain_core.runnables import RunnableLambda
+    from src import sentiment_bot, server
+    from src.database import ChatMessage
+
+    prompts = []
+
+    def fake_model(prompt):
+        prompts.append(prompt.to_string())
+        return AIMessage(content="It opens at 8am.")
+
+    for name in ("positive_model", "negative_model", "neutral_model"):
+        monkeypatch.setattr(sentiment_bot, name, RunnableLambda(fake_model))
+    monkeypatch.setattr(server, "memory_index", None)
+
+    msg = "thanks, what time does the library open?"
+    response = api_client.post("/chat", json={"message": msg, "user_id": 1, "chat_history": [
+        {"role": "user", "content": "I can't go on like this"},
+        {"role": "assistant", "content": sentiment_bot.MENTAL_HEALTH_RESPONSE},
+    ]})
+    assert response.status_code == 200
+    assert response.json()["reply"] == "It opens at 8am."
+    assert "988 Suicide & Crisis Lifeline" in prompts[0] and msg in prompts[0]
+
+    expected = sentiment_bot.classify_message(msg)
+    with db_factory() as db:
+        saved = db.query(ChatMessage).one()
+    assert saved.tier == expected["tier"] != "crisis"
+    assert (saved.sentiment, saved.severity) == (expected["sentiment"], expected["severity"])
+    assert abs(saved.sentiment_score - expected["score"]) < 1e-9
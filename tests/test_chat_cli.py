@@ -0,0 +1,101 @@
+"""
+Tests for the chat CLI's JSONL batch mode.
+"""
+import json
+import threading
+import time
+
+import pytest
+
+from src import chat
+
+
+class FakeRouter:
+    """Stands in for route_message; later prompts finish first so ordering is exercised"""
+
+    def __init__(self):
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def __call__(self, message):
+        with self.lock:
+            self.calls.append(message)
+        number = int(message.split()[-1])
+        time.sleep(0.02 * (5 - number % 5))
+        if message == "fail 3":
+            raise RuntimeError("model unavailable")
+        tier = "crisis" if number == 4 else "neutral"
+        return {"reply": f"re: {message}", "tier": tier, "sentiment": "neutral", "severity": "normal", "score": 0.0}
+
+
+@pytest.fixture
+def router(monkeypatch):
+    fake = FakeRouter()
+    monkeypatch.setattr(chat, "route_message", fake)
+    return fake
+
+
+def write_prompts(path, lines):
+    path.write_text("".join(line + "\n" for line in lines), encoding="utf-8")
+
+
+def read_results(path):
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+def test_results_are_written_in_input_order_with_a_summary(tmp_path, router, capsys):
+    prompts, output = tmp_path / "prompts.jsonl", tmp_path / "results.jsonl"
+    lines = [json.dumps({"id": f"p{i}", "message": f"prompt {i}"}) for i in range(10)]
+    lines[3] = json.dumps({"id": "p3", "prompt": "fail 3"})
+    write_prompts(prompts, lines)
+
+    chat.run_batch(str(prompts), str(output), concurrency=4)
+
+    results = read_results(output)
+    assert [r["index"] for r in results] == list(range(10))
+    assert [r["id"] for r in results] == [f"p{i}" for i in range(10)]
+    assert results[0]["reply"] == "re: prompt 0"
+    assert results[3]["error"] == "model unavailable" and results[3]["reply"] is None
+    assert results[4]["crisis"] is True
+
+    summary = capsys.readouterr().out
+    assert "Processed 10 items" in summary and "1 errors" in summary
+    assert "Latency p50" in summary
+    assert "neutral=8" in summary and "crisis=1" in summary and "error=1" in summary
+
+
+def test_malformed_lines_get_an_error_result_in_place(tmp_path, router):
+    prompts, output = tmp_path / "prompts.jsonl", tmp_path / "results.jsonl"
+    write_prompts(prompts, [
+        json.dumps({"message": "prompt 0"}),
+        '{"message": "prompt 1"',
+        "",
+        '["not", "an", "object"]',
+        json.dumps({"message": "prompt 2"}),
+    ])
+
+    chat.run_batch(str(prompts), str(output), concurrency=2)
+
+    results = read_results(output)
+    assert [r["index"] for r in results] == [0, 1, 2, 3]
+    assert results[1]["error"].startswith("line 2: invalid JSON")
+    assert results[2]["error"] == "line 4: expected a JSON object"
+    assert [r["reply"] for r in results] == ["re: prompt 0", None, None, "re: prompt 2"]
+    assert len(router.calls) == 2
+
+
+def test_resume_drops_a_partial_line_and_continues(tmp_path, router):
+    prompts, output = tmp_path / "prompts.jsonl", tmp_path / "results.jsonl"
+    write_prompts(prompts, [json.dumps({"message": f"prompt {i}"}) for i in range(6)])
+    chat.run_batch(str(prompts), str(output), concurrency=3)
+    complete = output.read_text(encoding="utf-8").splitlines(keepends=True)
+
+    # Interrupted while writing the fourth result
+    output.write_text("".join(complete[:3]) + complete[3][:20], encoding="utf-8")
+    router.calls.clear()
+
+    chat.run_batch(str(prompts), str(output), concurrency=3, resume=True)
+
+    results = read_results(output)
+    assert [r["index"] for r in results] == list(range(6))
+    assert sorted(router.calls) == ["prompt 3", "prompt 4", "prompt 5"]
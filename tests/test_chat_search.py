@@ -0,0 +1,88 @@
+"""
+Tests for full-text search over chat history: the FTS5 index and its triggers,
+query sanitizing, ranking and paging through /chat/search, and the LIKE fallback.
+"""
+import pytest
+from sqlalchemy import delete, update
+
+from src.database import ChatMessage, upgrade_schema
+
+
+@pytest.fixture
+def fts(db_factory):
+    """Adds the FTS5 table and its sync triggers to the test database"""
+    upgrade_schema(db_factory.kw["bind"])
+    return db_factory
+
+
+def search(client, q, **params):
+    response = client.get("/chat/search", params={"user_id": 1, "q": q, **params})
+    assert response.status_code == 200, response.text
+    return response.json()["results"]
+
+
+def ids(results):
+    return [r["id"] for r in results]
+
+
+def test_triggers_keep_the_index_in_sync(api_client, fts, add_messages):
+    add_messages(3, message="note {i} about the calculus exam", response="good luck")
+    assert sorted(ids(search(api_client, "calculus"))) == [1, 2, 3]
+
+    with fts() as db:
+        db.execute(update(ChatMessage).where(ChatMessage.id == 1).values(message="a note about biology"))
+        db.execute(delete(ChatMessage).where(ChatMessage.id == 2))
+        db.commit()
+
+    assert ids(search(api_client, "calculus")) == [3]
+    assert ids(search(api_client, "biology")) == [1]
+
+
+def test_results_stay_within_one_user_and_operators_are_neutralized(api_client, fts, add_messages):
+    add_messages(2, message="my roommate plays loud music {i}")
+    add_messages(2, user_id=2, message="roommate OR music NEAR everything {i}")
+
+    assert sorted(ids(search(api_client, "roommate"))) == [1, 2]
+    for q in ['roommate OR everything', 'user_id:2', 'roommate" OR "everything', 'NEAR(roommate music)',
+              'music*', '{message}: roommate', '(((']:
+        assert set(ids(search(api_client, q))) <= {1, 2}, q
+    assert search(api_client, "everything") == []
+    assert search(api_client, "***") == []
+
+
+def test_results_are_ranked_paged_and_highlighted(api_client, fts, add_messages):
+    add_messages(1, message="exam", response="the exam was hard, another exam on monday, exam week")
+    add_messages(4, message="an exam next week and other unrelated things said at length {i}")
+    add_messages(1, message="nothing relevant here")
+
+    everything = search(api_client, "exam", limit=10)
+    assert ids(everything)[0] == 1
+    assert len(everything) == 5
+    assert [r["rank"] for r in everything] == sorted((r["rank"] for r in everything), reverse=True)
+
+    pages = search(api_client, "exam", limit=2) + search(api_client, "exam", limit=2, offset=2)
+    assert ids(pages) == ids(everything)[:4]
+
+    top = everything[0]
+    assert top["message"] == "<mark>exam</mark>"
+    assert top["response"].count("<mark>exam</mark>") == 3
+    assert top["timestamp"]
+
+
+def test_search_endpoint_validates_its_input(api_client, fts):
+    assert api_client.get("/chat/search", params={"user_id": 1, "q": "  "}).status_code == 400
+    assert api_client.get("/chat/search", params={"user_id": 2, "q": "exam"}).status_code == 404
+    response = api_client.get("/chat/search", params={"user_id": 1, "q": "exam", "limit": 1000, "offset": -5})
+    assert (response.json()["limit"], response.json()["offset"]) == (100, 0)
+
+
+def test_like_fallback_matches_percent_and_underscore_literally(api_client, add_messages):
+    # db_factory alone has no FTS table, so search falls back to LIKE
+    add_messages(1, message="I got 100% on the quiz")
+    add_messages(1, message="I got 1000 points")
+    add_messages(1, message="saved as exam_notes.txt")
+    add_messages(1, message="saved as examXnotes.txt")
+
+    assert ids(search(api_client, "100%")) == [1]
+    assert ids(search(api_client, "exam_notes")) == [3]
+    assert ids(search(api_client, "notes")) == [4, 3]
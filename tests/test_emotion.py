@@ -0,0 +1,49 @@
+"""
+Tests for the NumPy emotion lexicon engine.
+"""
+from src.emotion import EMOTIONS, EmotionLexiconAnalyzer, EmotionLexiconEngine
+
+analyzer = EmotionLexiconAnalyzer()
+
+
+def test_emotion_scores_and_polarity():
+    """Distinguishes anxiety from anger and returns the SentimentAnalyzer fields"""
+    anxious = analyzer.analyze("I'm so anxious and scared about my exam")
+    angry = analyzer.analyze("I'm furious, my roommate is so annoying")
+
+    for result in (anxious, angry):
+        assert set(result) >= {"sentiment", "severity", "score", "emotions", "dominant_emotion"}
+        assert set(result["emotions"]) == set(EMOTIONS)
+    assert anxious["dominant_emotion"] == "fear"
+    assert angry["dominant_emotion"] == "anger"
+    assert anxious["sentiment"] == angry["sentiment"] == "negative"
+    assert analyzer.analyze("What time is it?")["sentiment"] == "neutral"
+
+
+def test_negation_flips_polarity():
+    """A negator shortly before a word flips and dampens its valence"""
+    assert analyzer.analyze("I am happy")["score"] > 0
+    assert analyzer.analyze("I am not happy")["score"] < 0
+    assert analyzer.analyze("I am not happy")["emotions"]["joy"] == 0
+
+
+def test_batch_matches_single():
+    """Batched scoring gives the same result as scoring one text at a time"""
+    texts = ["not", "so happy", "", "I don't hate it", "sad and lonely", "wow"]
+    assert analyzer.analyze_batch(texts) == [analyzer.analyze(t) for t in texts]
+
+
+def test_words_outside_the_emotion_tags_still_carry_valence():
+    """Valences come from VADER's full lexicon, not just the tagged words"""
+    for text in ["I'm devastated", "I'm so upset", "today was a disaster", "I'm in agony",
+                 "everything sucks", "I feel like a burden"]:
+        assert analyzer.analyze(text)["sentiment"] == "negative", text
+
+
+def test_nrc_lexicon_adds_emotions(tmp_path):
+    """Words in an NRC word-level file get their emotions without a valence of their own"""
+    nrc = tmp_path / "nrc.txt"
+    nrc.write_text("thunder\tfear\t1\nthunder\tjoy\t0\nthunder\tnegative\t1\n", encoding="utf-8")
+    result = EmotionLexiconAnalyzer(EmotionLexiconEngine(nrc_path=str(nrc))).analyze("thunder")
+    assert result["dominant_emotion"] == "fear"
+    assert analyzer.analyze("thunder")["dominant_emotion"] is None
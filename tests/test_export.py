@@ -0,0 +1,83 @@
+"""
+Tests for the streaming chat history export.
+The memory test seeds a table and checks that peak allocation stays bounded
+while the whole export is consumed. Set EXPORT_TEST_ROWS=1000000 to check
+the bound at full scale (about three minutes).
+"""
+import csv
+import gzip
+import io
+import json
+import os
+import tracemalloc
+from datetime import datetime, timedelta
+
+from src.archive import archive_messages
+from src.export import stream_chat_export
+
+# Buffering the whole export would need about 23 MB at the default row count
+EXPORT_TEST_ROWS = int(os.getenv("EXPORT_TEST_ROWS", "20000"))
+PEAK_LIMIT_BYTES = 8 * 1024 * 1024
+MESSAGE = "message number {i}, with a comma"
+RESPONSE = "response number {i}"
+
+
+def test_export_ndjson_and_csv(db_factory, add_messages):
+    """NDJSON and CSV exports contain every row in order"""
+    add_messages(250, message=MESSAGE, response=RESPONSE, sentiment="neutral")
+
+    ndjson = b"".join(stream_chat_export(db_factory, 1, "ndjson"))
+    lines = [json.loads(line) for line in ndjson.splitlines()]
+    assert len(lines) == 250
+    assert lines[0]["message"] == "message number 0, with a comma"
+    assert [r["id"] for r in lines] == sorted(r["id"] for r in lines)
+
+    body = b"".join(stream_chat_export(db_factory, 1, "csv", compress=True))
+    rows = list(csv.DictReader(io.StringIO(gzip.decompress(body).decode("utf-8"))))
+    assert len(rows) == 250
+    assert rows[-1]["response"] == "response number 249"
+
+    assert b"".join(stream_chat_export(db_factory, 2, "ndjson")) == b""
+
+
+def test_export_peak_memory_is_bounded(db_factory, add_messages):
+    """Exporting EXPORT_TEST_ROWS rows keeps peak allocation under a fixed bound"""
+    add_messages(EXPORT_TEST_ROWS, message=MESSAGE, response=RESPONSE, sentiment="neutral")
+
+    tracemalloc.start()
+    try:
+        total_bytes = 0
+        for chunk in stream_chat_export(db_factory, 1, "ndjson", compress=True):
+            total_bytes += len(chunk)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert total_bytes > 0
+    assert peak < PEAK_LIMIT_BYTES, f"Peak allocation {peak / 1e6:.1f} MB exceeds bound"
+
+
+def test_export_endpoint(api_client, db_factory, add_messages):
+    """Checks the format, user and date filters (offsets converted to UTC) across archived and hot rows"""
+    day = datetime(2025, 1, 1)
+    add_messages(24, message="jan 1 {i}", timestamp=lambda i: day + timedelta(hours=i))
+    archive_messages(db_factory, older_than_days=1, batch_size=5)
+    add_messages(24, message="jan 2 {i}", timestamp=lambda i: day + timedelta(days=1, hours=i))
+
+    assert api_client.get("/chat/export/1?format=xml").status_code == 400
+    assert api_client.get("/chat/export/2").status_code == 404
+
+    response = api_client.get("/chat/export/1", params={"format": "csv", "gzip": "true"})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/gzip"
+    assert response.headers["content-disposition"] == 'attachment; filename="chat-history-1.csv.gz"'
+    rows = list(csv.DictReader(io.StringIO(gzip.decompress(response.content).decode("utf-8"))))
+    assert len(rows) == 48
+
+    # 18:00 UTC on Jan 1 up to 02:00 UTC on Jan 2, given in other offsets
+    response = api_client.get("/chat/export/1", params={
+        "start": "2025-01-01T20:00:00+02:00", "end": "2025-01-02T05:00:00+03:00"
+    })
+    assert response.headers["content-disposition"] == 'attachment; filename="chat-history-1.ndjson"'
+    messages = [json.loads(line)["message"] for line in response.content.splitlines()]
+    assert messages == [f"jan 1 {i}" for i in range(18, 24)] + ["jan 2 0", "jan 2 1"]
@@ -0,0 +1,83 @@
+"""
+Tests for delta sync of chat history and its ETag / If-None-Match handling.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import update
+
+from src.archive import archive_messages
+from src.database import CHAT_DATA_VERSION, ChatMessage, bump_data_version
+
+
+@pytest.fixture
+def client(api_client, add_messages):
+    """API client over 30 messages, one per day, the newest yesterday"""
+    now = datetime.utcnow()
+    add_messages(30, timestamp=lambda i: now - timedelta(days=30 - i))
+    return api_client
+
+
+def test_delta_returns_only_newer_messages_and_304_when_unchanged(client, db_factory):
+    seed = client.get("/chat/history/1/delta?limit=10")
+    assert seed.status_code == 200
+    data = seed.json()
+    assert [m["message"] for m in data["messages"]] == [f"message {i}" for i in range(20, 30)]
+    etag = seed.headers["ETag"]
+
+    unchanged = client.get(f"/chat/history/1/delta?after_id={data['latest_id']}",
+                           headers={"If-None-Match": etag})
+    assert unchanged.status_code == 304
+    assert unchanged.content == b""
+
+    with db_factory() as db:
+        db.add(ChatMessage(user_id=1, message="new one", response="reply"))
+        db.commit()
+
+    changed = client.get(f"/chat/history/1/delta?after_id={data['latest_id']}",
+                         headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert [m["message"] for m in changed.json()["messages"]] == ["new one"]
+    assert changed.headers["ETag"] != etag
+
+    full = client.get("/chat/history/1")
+    assert full.status_code == 200
+    assert client.get("/chat/history/1", headers={"If-None-Match": full.headers["ETag"]}).status_code == 304
+
+
+def test_delta_pages_through_archived_messages(client, db_factory):
+    archive_messages(db_factory, older_than_days=10, batch_size=8)
+
+    page = client.get("/chat/history/1/delta?after_id=5&limit=15").json()
+    assert [m["id"] for m in page["messages"]] == list(range(6, 21))
+    assert page["has_more"] is True
+
+    rest = client.get(f"/chat/history/1/delta?after_id={page['messages'][-1]['id']}&limit=15").json()
+    assert [m["id"] for m in rest["messages"]] == list(range(21, 31))
+    assert rest["has_more"] is False
+
+    since = (datetime.utcnow() - timedelta(days=3, hours=12)).isoformat() + "Z"
+    recent = client.get("/chat/history/1/delta", params={"since": since}).json()
+    assert [m["message"] for m in recent["messages"]] == ["message 27", "message 28", "message 29"]
+
+
+def test_rescoring_or_archiving_changes_the_etag(client, db_factory):
+    first = client.get("/chat/history/1")
+    etag = first.headers["ETag"]
+    assert first.json()["messages"][0]["sentiment"] is None
+
+    # What a sentiment backfill window does: rewrite rows and bump the version together
+    with db_factory() as db:
+        db.execute(update(ChatMessage).values(sentiment="negative"))
+        bump_data_version(db, CHAT_DATA_VERSION)
+        db.commit()
+
+    rescored = client.get("/chat/history/1", headers={"If-None-Match": etag})
+    assert rescored.status_code == 200
+    assert rescored.json()["messages"][0]["sentiment"] == "negative"
+    etag = rescored.headers["ETag"]
+
+    archive_messages(db_factory, older_than_days=10)
+    archived = client.get("/chat/history/1/delta?limit=5", headers={"If-None-Match": etag})
+    assert archived.status_code == 200
+    assert archived.headers["ETag"] != etag
@@ -0,0 +1,150 @@
+"""
+Tests for Idempotency-Key handling on /chat, including concurrent duplicates.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import func, select
+
+from src import idempotency, server
+from src.database import ChatMessage, IdempotencyKey
+
+
+class FakeRouter:
+    """Stands in for route_message: counts LLM calls and can be slowed down or made to fail"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = 0
+        self.fail = False
+        self.lock = threading.Lock()
+
+    def __call__(self, user_input, engine=None, memory="", context=""):
+        with self.lock:
+            self.calls += 1
+            call = self.calls
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("model unavailable")
+        return {"reply": f"reply {call}", "sentiment": "neutral", "severity": "normal", "score": 0.0, "tier": "neutral"}
+
+
+@pytest.fixture
+def setup(api_client, db_factory, monkeypatch):
+    router = FakeRouter()
+    monkeypatch.setattr(server, "route_message", router)
+    monkeypatch.setattr(server, "memory_index", None)
+    return api_client, db_factory, router
+
+
+def post(client, message="hello there", key="key-1"):
+    headers = {"Idempotency-Key": key} if key else {}
+    return client.post("/chat", json={"message": message, "user_id": 1}, headers=headers)
+
+
+def saved_messages(factory):
+    with factory() as db:
+        return db.execute(select(func.count(ChatMessage.id))).scalar()
+
+
+def test_repeated_key_replays_the_stored_reply(setup):
+    client, factory, router = setup
+    first = post(client)
+    second = post(client)
+
+    assert first.json() == second.json() == {"reply": "reply 1"}
+    assert "Idempotent-Replayed" not in first.headers
+    assert second.headers["Idempotent-Replayed"] == "true"
+    assert router.calls == 1
+    assert saved_messages(factory) == 1
+
+    # Without a key, or with a new one, the message is processed again
+    assert post(client, key=None).json() == {"reply": "reply 2"}
+    assert post(client, key="key-2").json() == {"reply": "reply 3"}
+    assert saved_messages(factory) == 3
+
+
+def test_concurrent_duplicates_wait_for_the_original(setup):
+    client, factory, router = setup
+    router.delay = 0.5
+
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        responses = list(pool.map(lambda _: post(client, key="burst"), range(6)))
+
+    assert [r.status_code for r in responses] == [200] * 6
+    assert {r.json()["reply"] for r in responses} == {"reply 1"}
+    assert sum(r.headers.get("Idempotent-Replayed") == "true" for r in responses) == 5
+    assert router.calls == 1
+    assert saved_messages(factory) == 1
+
+
+def test_failed_original_releases_the_key(setup):
+    client, factory, router = setup
+    router.fail = True
+    assert post(client).status_code == 500
+
+    router.fail = False
+    retry = post(client)
+    assert retry.status_code == 200
+    assert "Idempotent-Replayed" not in retry.headers
+    assert router.calls == 2
+    assert saved_messages(factory) == 1
+
+
+def test_failure_after_saving_keeps_the_claim(setup, monkeypatch):
+    client, factory, router = setup
+
+    def broken_complete(*args, **kwargs):
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(idempotency, "complete", broken_complete)
+    monkeypatch.setattr(idempotency, "IDEMPOTENCY_WAIT_SECONDS", 0.2)
+    first = post(client)
+    assert first.status_code == 200
+    assert first.json() == {"reply": "reply 1"}
+
+    # The retry must not run the model or save the message a second time
+    assert post(client).status_code == 409
+    assert router.calls == 1
+    assert saved_messages(factory) == 1
+
+
+def test_key_reused_for_a_different_message_is_rejected(setup):
+    client, _, router = setup
+    assert post(client, message="first message").status_code == 200
+    assert post(client, message="something else").status_code == 422
+    assert post(client, key="x" * 300).status_code == 400
+    assert router.calls == 1
+
+
+def test_waiting_duplicate_gives_up_with_409(setup, monkeypatch):
+    client, factory, router = setup
+    monkeypatch.setattr(idempotency, "IDEMPOTENCY_WAIT_SECONDS", 0.2)
+    with factory() as db:
+        db.add(IdempotencyKey(user_id=1, key="stuck", request_hash=idempotency.request_hash(1, "hello there")))
+        db.commit()
+
+    response = post(client, key="stuck")
+    assert response.status_code == 409
+    assert "Retry-After" in response.headers
+    assert router.calls == 0
+
+    # Once the lease runs out the claim is taken over and the message processed
+    monkeypatch.setattr(idempotency, "IDEMPOTENCY_LEASE_SECONDS", 0)
+    assert post(client, key="stuck").json() == {"reply": "reply 1"}
+
+
+def test_expired_keys_are_purged(setup):
+    client, factory, _ = setup
+    post(client, key="old")
+    post(client, key="new")
+    with factory() as db:
+        db.query(IdempotencyKey).filter(IdempotencyKey.key == "old").update(
+            {"created_at": datetime.utcnow() - timedelta(hours=idempotency.IDEMPOTENCY_TTL_HOURS + 1)}
+        )
+        db.commit()
+        assert idempotency.purge_expired(db) == 1
+        assert [row.key for row in db.query(IdempotencyKey)] == ["new"]
@@ -0,0 +1,94 @@
+"""
+Tests for the scheduled maintenance jobs and their cross-worker lock.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import insert, inspect, select
+
+from src.database import ChatMessage, IdempotencyKey, MaintenanceLock, PasswordResetToken, User
+from src.maintenance import acquire_lock, release_lock, run_maintenance
+
+
+@pytest.fixture
+def factory(db_factory):
+    """Users, reset tokens and idempotency keys, some past their retention"""
+    now = datetime.utcnow()
+    old = now - timedelta(days=30)
+    with db_factory.kw["bind"].begin() as conn:
+        conn.execute(insert(User), [
+            {"id": 1, "username": "verified", "email": "v@example.com", "hashed_password": "x",
+             "is_verified": True, "created_at": old},
+            {"id": 2, "username": "recent", "email": "r@example.com", "hashed_password": "x",
+             "is_verified": False, "created_at": now},
+            {"id": 3, "username": "has-chats", "email": "c@example.com", "hashed_password": "x",
+             "is_verified": False, "created_at": old},
+        ] + [
+            {"id": 10 + i, "username": f"stale{i}", "email": f"s{i}@example.com", "hashed_password": "x",
+             "is_verified": False, "created_at": old}
+            for i in range(5)
+        ])
+        conn.execute(insert(ChatMessage), [{"user_id": 3, "message": "hi", "response": "hello"}])
+        conn.execute(insert(PasswordResetToken), [
+            {"email": "v@example.com", "token": "valid", "expires_at": now + timedelta(hours=1), "used": False},
+            {"email": "v@example.com", "token": "used", "expires_at": now + timedelta(hours=1), "used": True},
+        ] + [
+            {"email": "v@example.com", "token": f"expired{i}", "expires_at": now - timedelta(hours=i + 1), "used": False}
+            for i in range(4)
+        ])
+        conn.execute(insert(IdempotencyKey), [
+            {"user_id": 1, "key": "old", "request_hash": "x", "created_at": old, "claimed_at": old},
+            {"user_id": 1, "key": "new", "request_hash": "x", "created_at": now, "claimed_at": now},
+        ])
+    return db_factory
+
+
+def test_jobs_purge_in_batches_and_report(factory):
+    reports = run_maintenance(session_factory=factory, batch_size=2)
+
+    assert reports["reset_tokens"]["rows"] == 5
+    assert reports["reset_tokens"]["batches"] == 3
+    assert reports["unverified_users"]["rows"] == 5
+    assert reports["idempotency_keys"]["rows"] == 1
+    for report in reports.values():
+        assert report["complete"] and report["skipped"] is None
+        assert report["seconds"] >= 0
+
+    with factory() as db:
+        assert db.execute(select(PasswordResetToken.token)).scalars().all() == ["valid"]
+        assert sorted(db.execute(select(User.id)).scalars()) == [1, 2, 3]
+        assert db.execute(select(IdempotencyKey.key)).scalars().all() == ["new"]
+        assert db.execute(select(MaintenanceLock)).first() is None  # locks released
+
+    # Nothing left to do on the next run
+    assert all(report["rows"] == 0 for report in run_maintenance(session_factory=factory).values())
+
+
+def test_time_budget_stops_after_a_batch(factory):
+    reports = run_maintenance(["reset_tokens"], session_factory=factory, batch_size=2, max_seconds=0)
+    assert reports["reset_tokens"]["rows"] == 2
+    assert reports["reset_tokens"]["complete"] is False
+
+
+def test_lock_allows_one_worker_until_the_lease_expires(factory):
+    with factory() as db:
+        assert acquire_lock(db, "maintenance:reset_tokens", 60, owner="other-worker")
+        assert not acquire_lock(db, "maintenance:reset_tokens", 60, owner="me")
+
+    report = run_maintenance(["reset_tokens"], session_factory=factory)["reset_tokens"]
+    assert report["skipped"] == "locked by another worker"
+    assert report["rows"] == 0
+
+    with factory() as db:
+        db.query(MaintenanceLock).update({"expires_at": datetime.utcnow() - timedelta(seconds=1)})
+        db.commit()
+        assert acquire_lock(db, "maintenance:reset_tokens", 60, owner="me")
+        release_lock(db, "maintenance:reset_tokens", owner="me")
+        assert db.execute(select(MaintenanceLock)).first() is None
+
+
+def test_supporting_indexes_exist(factory):
+    inspector = inspect(factory.kw["bind"])
+    token_indexes = {index["name"] for index in inspector.get_indexes("password_reset_tokens")}
+    assert "ix_password_reset_tokens_expires_at" in token_indexes
+    assert "ix_users_verified_created" in {index["name"] for index in inspector.get_indexes("users")}
@@ -0,0 +1,139 @@
+"""
+Tests for long-term semantic memory: the per-user vector index and recall into /chat.
+"""
+import os
+import random
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import insert
+
+from src import server
+from src.archive import archive_messages
+from src.database import ChatMessage
+from src.memory import HashingEmbedder, MemoryIndex, recall
+
+PAST = [
+    "my roommate keeps throwing loud parties every weekend",
+    "I have a calculus exam on friday and I'm behind on homework",
+    "my dog Biscuit is getting old and slow",
+    "thinking about switching my major to biology",
+]
+
+
+def make_index(tmp_path):
+    return MemoryIndex(str(tmp_path / "memory"), HashingEmbedder(256))
+
+
+def test_search_ranks_the_related_turn_first(tmp_path):
+    index = make_index(tmp_path)
+    index.add(7, [10, 11], PAST[:2])
+    index.add(7, [12, 13], PAST[2:])  # appended incrementally
+    index.add(8, [99], ["calculus exam tomorrow"])  # another user's index is separate
+
+    assert index.count(7) == 4
+    hits = index.search(7, "how do I study for a calculus exam?", k=2)
+    assert hits[0][0] == 11
+    assert 99 not in [message_id for message_id, _ in hits]
+    assert index.search(7, "Biscuit the dog", k=1)[0][0] == 12
+    # Recent rows are skipped, and unrelated text clears no threshold
+    assert index.search(7, "Biscuit the dog", k=1, skip_recent=2) == []
+    assert index.search(7, "quantum chromodynamics lecture", k=3) == []
+
+
+def test_sealed_blocks_score_like_a_full_scan(tmp_path):
+    rng = random.Random(3)
+    words = "exam sleep roommate dog biology party calculus weekend family coffee library stress".split()
+    texts = [" ".join(rng.choices(words, k=6)) for _ in range(37)]
+    index = MemoryIndex(str(tmp_path / "memory"), HashingEmbedder(64), block_rows=8)
+    for i, text in enumerate(texts):
+        index.add(1, [i], [text])
+    _, _, cols_path = index._paths(1)
+    assert os.path.getsize(cols_path) == 4 * 64 * 8 * 4  # four complete blocks
+
+    vectors = index.embedder.embed(texts)
+    query = "calculus exam stress"
+    expected = vectors @ index.embedder.embed([query])[0]
+    for message_id, score in index.search(1, query, k=5, min_score=-1):
+        assert abs(score - expected[message_id]) < 1e-5
+
+    # A half-written block is ignored by searches and rewritten by the next append
+    with open(cols_path, "ab") as f:
+        f.write(b"\0" * 100)
+    assert len(index.search(1, query, k=37, min_score=-1)) == 37
+    for i in range(3):
+        index.add(1, [37 + i], [texts[i]])
+    assert os.path.getsize(cols_path) == 5 * 64 * 8 * 4
+
+    # Removed rows are blanked in both the sealed blocks and the row-major tail
+    assert index.remove(1, [0, 39, 1000]) == 2
+    remaining = [message_id for message_id, _ in index.search(1, query, k=40, min_score=-1)]
+    assert sorted(remaining) == list(range(1, 39))
+
+
+def test_interrupted_append_is_trimmed(tmp_path):
+    index = make_index(tmp_path)
+    index.add(1, [1], [PAST[0]])
+    rows_path, _, _ = index._paths(1)
+    with open(rows_path, "ab") as f:
+        f.write(b"\0" * 100)  # a vector write with no matching id
+    assert index.count(1) == 1
+
+    index.add(1, [2], [PAST[2]])
+    assert index.count(1) == 2
+    assert index.search(1, "my old dog Biscuit", k=1)[0][0] == 2
+
+
+@pytest.fixture
+def past_turns(db_factory, tmp_path):
+    """PAST saved for user 1, one day apart and a month old, and a memory index built from them"""
+    now = datetime.utcnow()
+    with db_factory.kw["bind"].begin() as conn:
+        conn.execute(insert(ChatMessage), [
+            {"user_id": 1, "message": text, "response": f"reply {i}", "timestamp": now - timedelta(days=30 - i)}
+            for i, text in enumerate(PAST)
+        ])
+    index = make_index(tmp_path)
+    with db_factory() as db:
+        assert index.rebuild(db, 1) == len(PAST)
+    return index
+
+
+def test_chat_recalls_past_turns_and_indexes_new_ones(api_client, past_turns, monkeypatch):
+    prompts = []
+
+    def fake_route(user_input, engine=None, memory="", context=""):
+        prompts.append(memory)
+        return {"reply": "ok", "sentiment": "neutral", "severity": "normal", "score": 0.0, "tier": "neutral"}
+
+    monkeypatch.setattr(server, "memory_index", past_turns)
+    monkeypatch.setattr(server, "route_message", fake_route)
+    monkeypatch.setattr("src.memory.MEMORY_SKIP_RECENT", 0)
+    response = api_client.post("/chat", json={"message": "the parties next door again, my roommate", "user_id": 1})
+    assert response.status_code == 200
+
+    assert "roommate keeps throwing loud parties" in prompts[0]
+    assert "reply 0" in prompts[0]
+    assert "calculus" not in prompts[0]
+    assert past_turns.count(1) == len(PAST) + 1
+
+
+def test_archived_turns_leave_the_index(db_factory, past_turns, monkeypatch):
+    monkeypatch.setattr("src.memory.MEMORY_SKIP_RECENT", 0)
+    monkeypatch.setattr("src.memory.memory_index", past_turns)
+    query = "loud parties, calculus homework, my old dog"
+    with db_factory() as db:
+        assert len(recall(db, 1, query, past_turns)) == 3
+
+        # Archived without the index hearing about it: recall skips the stale ids
+        monkeypatch.setattr("src.memory.memory_index", None)
+        assert archive_messages(db_factory, older_than_days=29)["rows"] == 2
+        assert [row.message for row in recall(db, 1, query, past_turns, k=2)] == [PAST[2]]
+
+        past_turns.remove(1, [1, 2])
+        assert {message_id for message_id, _ in past_turns.search(1, query, k=4, min_score=-1)} == {3, 4}
+
+        # Archiving with memory on removes the rows itself
+        monkeypatch.setattr("src.memory.memory_index", past_turns)
+        assert archive_messages(db_factory, older_than_days=28)["rows"] == 1
+        assert [message_id for message_id, _ in past_turns.search(1, query, k=4, min_score=-1)] == [4]
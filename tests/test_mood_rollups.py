@@ -0,0 +1,101 @@
+"""
+Tests for the per-user daily mood rollups.
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+from src.archive import archive_messages
+from src.database import Base, MoodDailyRollup, _add_chat_message, rebuild_mood_rollups
+
+MESSAGES = [
+    (0.5, "normal", "positive"),
+    (-0.7, "severe", "crisis"),
+    (None, None, None),
+    (-0.2, "moderate", "negative"),
+]
+
+
+def rollups_after_saving(tmp_path, monkeypatch, dialect_name=None):
+    engine = create_engine(f"sqlite:///{tmp_path / f'rollups-{dialect_name}.db'}")
+    Base.metadata.create_all(engine)
+    if dialect_name:
+        monkeypatch.setattr(engine.dialect, "name", dialect_name)
+    with sessionmaker(bind=engine)() as db:
+        for score, severity, tier in MESSAGES:
+            _add_chat_message(db, 1, "m", "r", score=score, severity=severity, tier=tier)
+            db.commit()
+        monkeypatch.undo()
+        return rollup_rows(db)
+
+
+def rollup_rows(db):
+    rows = db.execute(select(MoodDailyRollup).order_by(MoodDailyRollup.day)).scalars().all()
+    return [
+        {column.key: getattr(row, column.key) for column in MoodDailyRollup.__table__.columns}
+        for row in rows
+    ]
+
+
+def test_databases_without_upsert_get_the_same_rollups(tmp_path, monkeypatch):
+    upserted = rollups_after_saving(tmp_path, monkeypatch)
+    portable = rollups_after_saving(tmp_path, monkeypatch, dialect_name="mssql")
+
+    assert portable == upserted
+    [day] = portable
+    assert day["day"] == datetime.utcnow().date()
+    assert (day["message_count"], day["scored_count"], day["crisis_count"]) == (4, 3, 1)
+    assert day["compound_min"] == -0.7
+    assert abs(day["compound_sum"] - (-0.4)) < 1e-9
+
+
+def test_rebuild_keeps_the_days_of_archived_messages(db_factory):
+    now = datetime.utcnow()
+    with db_factory() as db:
+        for days_ago in range(300, 290, -1):
+            message = _add_chat_message(db, 1, "m", "r", score=-0.8, severity="severe", tier="negative")
+            message.timestamp = now - timedelta(days=days_ago)
+        _add_chat_message(db, 1, "m", "r", score=0.5, severity="normal", tier="positive")
+        db.commit()
+        assert rebuild_mood_rollups(db) == 11
+        before = rollup_rows(db)
+
+    assert archive_messages(db_factory, older_than_days=100)["rows"] == 10
+    with db_factory() as db:
+        assert rebuild_mood_rollups(db) == 11
+        assert rollup_rows(db) == before
+        assert rebuild_mood_rollups(db, user_id=1) == 11
+        assert rollup_rows(db) == before
+
+
+def test_mood_endpoint_reports_the_requested_window(api_client, add_messages, db_factory):
+    now = datetime.utcnow()
+    add_messages(2, sentiment_score=-0.6, severity="severe", tier="negative", timestamp=lambda i: now)
+    add_messages(1, sentiment_score=0.2, severity="normal", tier="positive", timestamp=lambda i: now)
+    add_messages(1, sentiment_score=-0.9, severity="severe", tier="crisis", timestamp=lambda i: now - timedelta(days=3))
+    add_messages(1, timestamp=lambda i: now - timedelta(days=3))  # never scored
+    add_messages(4, sentiment_score=0.5, severity="normal", tier="positive", timestamp=lambda i: now - timedelta(days=10))
+    with db_factory() as db:
+        assert rebuild_mood_rollups(db) == 3
+
+    data = api_client.get("/analytics/mood/1?days=5").json()
+    assert data["user_id"] == 1
+    older, today = data["days"]
+    assert older == {
+        "day": (now - timedelta(days=3)).date().isoformat(),
+        "message_count": 2,
+        "mean_score": -0.9,
+        "min_score": -0.9,
+        "severity": {"normal": 0, "moderate": 0, "severe": 1},
+        "crisis_count": 1,
+    }
+    assert today["day"] == now.date().isoformat()
+    assert today["message_count"] == 3 and today["crisis_count"] == 0
+    assert abs(today["mean_score"] - (-1.0 / 3)) < 1e-9
+    assert today["min_score"] == -0.6
+    assert today["severity"] == {"normal": 1, "moderate": 0, "severe": 2}
+
+    assert len(api_client.get("/analytics/mood/1").json()["days"]) == 3
+    assert [d["day"] for d in api_client.get("/analytics/mood/1?days=0").json()["days"]] == [today["day"]]
+    assert api_client.get("/analytics/mood/2").status_code == 404
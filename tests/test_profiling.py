@@ -0,0 +1,92 @@
+"""
+Tests for the on-demand request profiler.
+"""
+import json
+import os
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src import profiling
+from src.profiling import profile_requests, profiling as profile_block, stage
+
+
+def busy(ms):
+    end = time.perf_counter() + ms / 1000
+    while time.perf_counter() < end:
+        pass
+
+
+def make_app():
+    app = FastAPI()
+    app.middleware("http")(profile_requests)
+
+    @app.post("/chat")
+    def chat():
+        with stage("route"):
+            with stage("llm"):
+                busy(30)
+        with stage("save"):
+            busy(5)
+        return {"reply": "ok"}
+
+    @app.get("/health")
+    def health():
+        return {"status": "healthy"}
+
+    return app
+
+
+def test_stage_is_a_no_op_without_a_profile():
+    assert stage("route") is stage("save")
+    with stage("route"):
+        pass
+
+
+def test_profile_records_stages_and_writes_speedscope(tmp_path):
+    with profile_block("unit") as profile:
+        with stage("route"):
+            with stage("llm"):
+                busy(40)
+    base = profile.save(str(tmp_path), status_code=200)
+
+    summary = json.loads(open(base + ".summary.json").read())
+    assert set(summary["stages_ms"]) == {"route", "route.llm"}
+    assert summary["stages_ms"]["route.llm"] >= 35
+    assert summary["total_ms"] >= summary["stages_ms"]["route"]
+    assert summary["samples"] > 0
+    assert "test_profiling.py" in summary["packages_ms"]
+
+    speedscope = json.loads(open(base + ".speedscope.json").read())
+    frames = speedscope["shared"]["frames"]
+    assert any(frame["name"] == "busy" for frame in frames)
+    for sampled in speedscope["profiles"]:
+        assert sampled["type"] == "sampled"
+        assert len(sampled["samples"]) == len(sampled["weights"])
+        assert all(0 <= index < len(frames) for stack in sampled["samples"] for index in stack)
+
+
+def test_middleware_profiles_only_authorized_or_sampled_requests(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(profiling, "PROFILE_ADMIN_TOKEN", "s3cret")
+    monkeypatch.setattr(profiling, "PROFILE_SAMPLE_RATE", 0.0)
+    client = TestClient(make_app())
+
+    assert "X-Profile-Id" not in client.post("/chat").headers
+    assert "X-Profile-Id" not in client.post("/chat", headers={"X-Profile": "wrong"}).headers
+    assert os.listdir(tmp_path) == []
+
+    response = client.post("/chat", headers={"X-Profile": "s3cret"})
+    assert response.json() == {"reply": "ok"}
+    profile_id = response.headers["X-Profile-Id"]
+    assert sorted(os.listdir(tmp_path)) == [f"{profile_id}.speedscope.json", f"{profile_id}.summary.json"]
+    summary = json.loads((tmp_path / f"{profile_id}.summary.json").read_text())
+    assert summary["request"] == "POST /chat"
+    assert summary["status_code"] == 200
+    assert {"route", "route.llm", "save"} <= set(summary["stages_ms"])
+
+    # Sampling covers only paths under PROFILE_PATH_PREFIX
+    monkeypatch.setattr(profiling, "PROFILE_SAMPLE_RATE", 1.0)
+    assert "X-Profile-Id" in client.post("/chat").headers
+    assert "X-Profile-Id" not in client.get("/health").headers
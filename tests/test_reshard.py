@@ -0,0 +1,92 @@
+"""
+Tests for moving chat data between shard layouts.
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import sessionmaker
+
+from src.archive import archive_messages
+from src.export import iter_chat_rows
+from src.database import ChatMessage, ChatMessageArchive, MoodDailyRollup, init_chat_shard, shard_for_user
+from src.reshard import reshard
+
+USERS = range(1, 13)
+MESSAGES_PER_USER = 20
+
+
+def shard_urls(tmp_path, count):
+    return [f"sqlite:///{tmp_path / f'chat{i}.db'}" for i in range(count)]
+
+
+def seed(urls):
+    now = datetime.utcnow()
+    for index, url in enumerate(urls):
+        engine = create_engine(url)
+        init_chat_shard(engine)
+        with engine.begin() as conn:
+            for user_id in USERS:
+                if shard_for_user(user_id, len(urls)) != index:
+                    continue
+                conn.execute(insert(ChatMessage), [
+                    {
+                        "user_id": user_id,
+                        "message": f"user {user_id} message {i}",
+                        "response": "reply",
+                        "timestamp": now - timedelta(days=MESSAGES_PER_USER - i),
+                    }
+                    for i in range(MESSAGES_PER_USER)
+                ])
+                conn.execute(insert(MoodDailyRollup), [{"user_id": user_id, "day": now.date(), "message_count": 1}])
+        # Half of every user's history goes to the archive so both tiers are moved
+        archive_messages(sessionmaker(bind=engine), older_than_days=MESSAGES_PER_USER // 2, batch_size=4)
+        engine.dispose()
+
+
+def messages_by_user(urls):
+    """Each user's messages (archived and hot, oldest first), checking they sit on the right shard"""
+    found = {}
+    for index, url in enumerate(urls):
+        factory = sessionmaker(bind=create_engine(url))
+        with factory() as db:
+            user_ids = set(db.execute(select(ChatMessage.user_id)).scalars())
+            user_ids |= set(db.execute(select(ChatMessageArchive.user_id)).scalars())
+            rollups = set(db.execute(select(MoodDailyRollup.user_id)).scalars())
+            for user_id in user_ids:
+                assert shard_for_user(user_id, len(urls)) == index, f"user {user_id} on wrong shard"
+                assert user_id in rollups
+                found[user_id] = [row["message"] for row in iter_chat_rows(db, user_id)]
+    return found
+
+
+def test_reshard_two_to_three_moves_users_in_order(tmp_path):
+    old, new = shard_urls(tmp_path, 2), shard_urls(tmp_path, 3)
+    seed(old)
+
+    totals = reshard(old, new, batch_size=7, primary_url=old[0])
+    assert totals["users"] == len(USERS)
+    assert 0 < totals["moved_users"] < len(USERS)
+
+    found = messages_by_user(new)
+    assert sorted(found) == list(USERS)
+    for user_id in USERS:
+        assert found[user_id] == [f"user {user_id} message {i}" for i in range(MESSAGES_PER_USER)]
+
+    # Running it again is a no-op
+    assert reshard(new, new, primary_url=old[0])["moved_users"] == 0
+
+
+def test_moving_users_bumps_the_history_epoch(tmp_path, api_client, db_factory):
+    old, new = shard_urls(tmp_path, 2), shard_urls(tmp_path, 3)
+    seed(old)
+    primary_url = str(db_factory.kw["bind"].url)
+    assert api_client.get("/chat/history/1/delta").json()["epoch"] == 0
+
+    assert reshard(old, new, dry_run=True, primary_url=primary_url)["moved_users"] > 0
+    assert api_client.get("/chat/history/1/delta").json()["epoch"] == 0
+
+    reshard(old, new, primary_url=primary_url)
+    assert api_client.get("/chat/history/1/delta").json()["epoch"] == 1
+    # Nobody moves the second time, so cursors stay valid
+    reshard(new, new, primary_url=primary_url)
+    assert api_client.get("/chat/history/1/delta").json()["epoch"] == 1
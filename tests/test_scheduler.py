@@ -0,0 +1,101 @@
+"""
+Tests for priority scheduling of LLM calls.
+"""
+import threading
+import time
+
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+from src import sentiment_bot
+from src.scheduler import PriorityScheduler, priority_for
+
+
+def start_waiter(scheduler, priority, order):
+    """Queue a call in a thread; it records its priority once it gets the slot"""
+    def run():
+        with scheduler.slot(priority):
+            order.append(priority)
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+def wait_queued(scheduler, count):
+    deadline = time.monotonic() + 5
+    while sum(c["queued"] for c in scheduler.metrics()["classes"].values()) < count:
+        assert time.monotonic() < deadline, "waiters never queued"
+        time.sleep(0.001)
+
+
+def test_priority_for_uses_severity_and_mental_health_level():
+    assert priority_for({"severity": "severe", "mental_health_level": "none"}) == "high"
+    assert priority_for({"severity": "normal", "mental_health_level": "crisis"}) == "high"
+    assert priority_for({"severity": "moderate", "mental_health_level": "none"}) == "elevated"
+    assert priority_for({"severity": "normal", "mental_health_level": "serious"}) == "elevated"
+    assert priority_for({"severity": "normal", "mental_health_level": "none"}) == "normal"
+
+
+def test_waiters_are_served_by_priority_then_aged():
+    now = [0.0]
+    scheduler = PriorityScheduler(1, {"high": 0, "elevated": 2, "normal": 6}, clock=lambda: now[0])
+    order = []
+    scheduler.acquire("normal")  # occupy the only slot
+
+    # A normal call queued 10s ago has aged past a fresh high call; a fresh normal has not
+    threads = [start_waiter(scheduler, "normal", order)]
+    wait_queued(scheduler, 1)
+    now[0] = 10.0
+    for priority in ("normal", "elevated", "high"):
+        threads.append(start_waiter(scheduler, priority, order))
+        wait_queued(scheduler, len(threads))
+
+    scheduler.release()
+    for thread in threads:
+        thread.join(5)
+    assert order == ["normal", "high", "elevated", "normal"]
+
+    metrics = scheduler.metrics()
+    assert metrics["active"] == 0
+    assert metrics["classes"]["normal"]["served"] == 3
+    assert metrics["classes"]["normal"]["wait_max_ms"] == 10000.0
+
+
+def test_low_priority_is_not_starved_under_synthetic_load():
+    """A steady stream of high-priority calls that alone saturates the slots"""
+    scheduler = PriorityScheduler(2, {"high": 0, "elevated": 0.05, "normal": 0.1})
+    finished = []
+    lock = threading.Lock()
+
+    def call(priority):
+        with scheduler.slot(priority):
+            time.sleep(0.01)
+        with lock:
+            finished.append(priority)
+
+    threads = []
+    for i in range(120):
+        priority = "high" if i % 4 else ("elevated" if i % 8 == 0 else "normal")
+        threads.append(threading.Thread(target=call, args=(priority,)))
+        threads[-1].start()
+        time.sleep(0.003)  # arrivals outpace the two slots, so a queue builds up
+    for thread in threads:
+        thread.join(10)
+
+    assert len(finished) == 120
+    classes = scheduler.metrics()["classes"]
+    assert classes["high"]["wait_p50_ms"] < classes["elevated"]["wait_p50_ms"] < classes["normal"]["wait_p50_ms"]
+    # With strict priority every normal call would finish after all the high ones
+    assert finished.index("normal") < len(finished) // 2
+
+
+def test_route_message_waits_for_a_slot_by_priority(monkeypatch):
+    scheduler = PriorityScheduler(1)
+    monkeypatch.setattr(sentiment_bot, "llm_scheduler", scheduler)
+    monkeypatch.setattr(sentiment_bot, "negative_model", RunnableLambda(lambda _: AIMessage(content="ok")))
+
+    outcome = sentiment_bot.route_message("I failed my exam and I feel awful about it", engine="vader")
+
+    assert outcome["reply"] == "ok"
+    assert outcome["severity"] == "moderate"
+    assert scheduler.metrics()["classes"]["elevated"]["served"] == 1
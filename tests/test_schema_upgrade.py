@@ -0,0 +1,72 @@
+"""
+Tests for upgrading a database created before the newer columns and indexes.
+"""
+import multiprocessing
+import sqlite3
+
+import pytest
+from sqlalchemy import inspect
+
+from src.database import create_db_engine, create_missing_indexes, upgrade_schema
+
+OLD_SCHEMA = """
+CREATE TABLE users (id INTEGER PRIMARY KEY, username VARCHAR(50) NOT NULL UNIQUE,
+    email VARCHAR(100) NOT NULL UNIQUE, hashed_password VARCHAR(255) NOT NULL,
+    is_verified BOOLEAN, created_at DATETIME, updated_at DATETIME);
+CREATE TABLE chat_messages (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, message TEXT NOT NULL,
+    response TEXT NOT NULL, sentiment VARCHAR(20), timestamp DATETIME);
+CREATE TABLE password_reset_tokens (id INTEGER PRIMARY KEY, email VARCHAR(100) NOT NULL,
+    token VARCHAR(255) NOT NULL UNIQUE, expires_at DATETIME NOT NULL, used BOOLEAN, created_at DATETIME);
+"""
+
+
+def old_database(tmp_path):
+    path = tmp_path / "old.db"
+    with sqlite3.connect(path) as conn:
+        conn.executescript(OLD_SCHEMA)
+    return f"sqlite:///{path}"
+
+
+def upgrade_worker(url, barrier, results):
+    db_engine = create_db_engine(url)
+    barrier.wait()
+    try:
+        # What each server worker does on startup, then what a migration run does
+        upgrade_schema(db_engine)
+        create_missing_indexes(db_engine)
+        results.put("ok")
+    except Exception as e:
+        results.put(f"{type(e).__name__}: {e}")
+    finally:
+        db_engine.dispose()
+
+
+@pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="needs fork")
+def test_workers_upgrading_at_once_all_start(tmp_path):
+    url = old_database(tmp_path)
+
+    context = multiprocessing.get_context("fork")
+    barrier, results = context.Barrier(4), context.Queue()
+    workers = [context.Process(target=upgrade_worker, args=(url, barrier, results)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(60)
+
+    assert sorted(results.get(timeout=5) for _ in workers) == ["ok"] * 4
+    inspector = inspect(create_db_engine(url))
+    columns = {column["name"] for column in inspector.get_columns("chat_messages")}
+    assert {"severity", "sentiment_score", "tier"} <= columns
+    assert "ix_chat_messages_user_timestamp" in {index["name"] for index in inspector.get_indexes("chat_messages")}
+
+
+def test_startup_reports_missing_indexes_and_migration_creates_them(tmp_path):
+    db_engine = create_db_engine(old_database(tmp_path))
+
+    missing = upgrade_schema(db_engine)
+    assert {"ix_chat_messages_user_timestamp", "ix_users_verified_created"} <= set(missing)
+    assert upgrade_schema(db_engine) == missing
+
+    assert sorted(create_missing_indexes(db_engine)) == sorted(missing)
+    assert upgrade_schema(db_engine) == []
+    assert create_missing_indexes(db_engine) == []